@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+"""
+后台线程写日志 + 按消息键限频 / 去重
+
+* 业务线程只把 LogRecord 放入内存队列 (QueueHandler), 控制台与文件输出由 QueueListener 后台线程完成
+* 限频与去重在入队前完成, 被丢弃的记录不产生任何 I/O。通过 extra 传入:
+    log_key          消息键, 如 "heartbeat:DXYZ.US"
+    log_every        同一键最短输出间隔 (秒)
+    log_state        内容摘要 (如 (持仓状态, 现价)); 与上次输出相同则不重复输出
+    log_max_silence  log_state 未变化时最长静默时间 (秒), 到期仍输出一次证明进程存活
+  再次输出时在消息末尾注明期间省略了多少条
+* 可选 JSON lines 格式 (仅文件): 每行 {"ts", "level", "thread", "msg"[, "key", "suppressed"]}, 异常堆栈已并入 msg
+"""
+import json
+import queue
+import atexit
+import threading
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+TEXT_FORMAT = '%(asctime)s - [%(levelname)s] - %(threadName)s - %(message)s'
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.last = {}          # log_key -> (上次输出时间, 上次 log_state)
+        self.suppressed = {}    # log_key -> 省略条数
+        self.dropped = 0
+
+    def filter(self, record):
+        key = getattr(record, "log_key", None)
+        if key is None:
+            return True
+        every = getattr(record, "log_every", 0)
+        state = getattr(record, "log_state", None)
+        max_silence = getattr(record, "log_max_silence", None)
+        now = record.created
+
+        with self.lock:
+            last_time, last_state = self.last.get(key, (None, None))
+            if last_time is not None:
+                elapsed = now - last_time
+                duplicate = state is not None and state == last_state and \
+                    (max_silence is None or elapsed < max_silence)
+                if elapsed < every or duplicate:
+                    self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                    self.dropped += 1
+                    return False
+            self.last[key] = (now, state)
+            record.suppressed = self.suppressed.pop(key, 0)
+        return True
+
+
+class TextFormatter(logging.Formatter):
+    """普通文本格式, 末尾注明省略条数"""
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (期间省略 {suppressed} 条)" if suppressed else text
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        key = getattr(record, "log_key", None)
+        if key is not None:
+            entry["key"] = key
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            entry["suppressed"] = suppressed
+        return json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+
+class AsyncLogListener(QueueListener):
+    def stop(self):
+        """可重复调用 (信号处理与 atexit 都会调用)"""
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_logging(log_file, json_format=False, level=logging.INFO):
+    """配置根日志器: 业务线程只入队, 返回已启动的 QueueListener (退出时 stop() 刷出剩余日志)"""
+    console = logging.StreamHandler()
+    console.setFormatter(TextFormatter(TEXT_FORMAT))   # 控制台始终为可读文本
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(JsonLineFormatter() if json_format else TextFormatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    handler = QueueHandler(log_queue)
+    rate_filter = RateLimitFilter()
+    handler.addFilter(rate_filter)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+
+    listener = AsyncLogListener(log_queue, console, file_handler, respect_handler_level=True)
+    listener.rate_filter = rate_filter
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,321 @@
+#!/usr/bin/python3
+"""
+dxyz_dynamic 策略向量化回测
+
+规则与 strategy.dxyz_decide / dxyz_strategy_logic 完全一致:
+  * 空仓且不在冷却期, 日涨幅 (相对昨收) > 动量阈值且成交量达标 -> 以触发价买入
+  * 持仓后逐笔更新最高价; 跌破硬止损或按阶梯回撤超限 -> 以触发价卖出, 进入冷却期
+  * 买入 / 卖出所在的那笔报价不再做另一方向的判断 (与实盘循环相同)
+  * 价格 <= 0 的报价 (数据源异常) 整笔跳过, 与实盘循环一致; 数据结束时按最后一笔有效价格估值
+
+只在“笔与笔之间”循环交易次数, 每段持仓内的最高价、回撤、阶梯阈值都用 NumPy 整段计算,
+一年分钟线 (约 10 万根) 单标的回测在 1 秒以内。
+
+用法:
+  python backtest.py --synthetic 98280 --verify          # 合成一年分钟线, 并与逐笔参考实现比对
+  python backtest.py --csv bars.csv                      # 列: ts,price[,prev_close][,volume]
+  python backtest.py --ticks ticks --symbol DXYZ.US      # 读取 tick_recorder 记录的全部交易日
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from strategy import DXYZ_TRAILING_LADDER, dxyz_decide
+
+# 默认参数, 与 longport_autotrade.py 配置区保持一致
+DEFAULT_PARAMS = {
+    "stop_loss_pct": 0.06,
+    "momentum_threshold": 0.015,
+    "min_volume": 10000,
+    "cooldown_minutes": 30,
+    "slippage_pct": 0.01,
+    "budget": 1000,
+    "ladder": DXYZ_TRAILING_LADDER,
+}
+
+EXIT_STOP_LOSS = 1      # 硬止损
+EXIT_TRAILING = 2       # 阶梯移动止盈
+EXIT_END_OF_DATA = 3    # 数据结束仍持仓, 按最后价格估值
+
+
+# ==========================================
+# 1. 数据预处理
+# ==========================================
+
+def day_index(ts):
+    """按 UTC 日期给每笔数据编号 (美股常规时段在 UTC 下不跨日)"""
+    return (np.asarray(ts, dtype=np.float64) // 86400).astype(np.int64)
+
+
+def prev_close_from_days(ts, price):
+    """没有昨收列时, 用上一交易日最后一笔价格作为昨收; 第一天为 0 (不触发买入)"""
+    days = day_index(ts)
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    prev_close = np.zeros(len(price))
+    day_last = np.asarray(price, dtype=np.float64)[np.r_[starts[1:] - 1, len(price) - 1]]
+    for k in range(1, len(starts)):
+        end = starts[k + 1] if k + 1 < len(starts) else len(price)
+        prev_close[starts[k]:end] = day_last[k - 1]
+    return prev_close
+
+
+def cumulative_day_volume(ts, bar_volume):
+    """分钟线成交量 -> 当日累计成交量 (与 Finnhub quote 的 v 字段口径一致)"""
+    days = day_index(ts)
+    total = np.cumsum(np.asarray(bar_volume, dtype=np.float64))
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]])
+    offset = np.repeat(np.r_[0.0, total[starts[1:] - 1]], np.diff(np.r_[starts, len(total)]))
+    return total - offset
+
+
+def ladder_limits(max_pnl, ladder):
+    """逐元素的阶梯回撤上限; 未达任何一档为 NaN (与 NaN 比较恒为 False)"""
+    conditions = [max_pnl > threshold for threshold, _ in ladder]
+    choices = [limit for _, limit in ladder]
+    return np.select(conditions, choices, default=np.nan)
+
+
+# ==========================================
+# 2. 向量化回测
+# ==========================================
+
+def find_exit(price, entry_idx, entry_price, stop_loss_pct, ladder, first_window=256):
+    """从 entry_idx 的下一笔开始找第一笔卖出; 按倍增窗口整段计算, 返回 (下标, 原因) 或 (None, None)"""
+    n = len(price)
+    start = entry_idx + 1
+    running_high = entry_price
+    window = first_window
+    while start < n:
+        end = min(n, start + window)
+        seg = price[start:end]
+        highest = np.maximum.accumulate(np.maximum(seg, running_high))
+        pnl_pct = (seg - entry_price) / entry_price
+        max_pnl_pct = (highest - entry_price) / entry_price
+        drawdown_pct = (highest - seg) / highest
+
+        stop_hit = pnl_pct < -stop_loss_pct
+        trail_hit = drawdown_pct > ladder_limits(max_pnl_pct, ladder)
+        hits = np.flatnonzero(stop_hit | trail_hit)
+        if len(hits):
+            k = hits[0]
+            return start + k, (EXIT_STOP_LOSS if stop_hit[k] else EXIT_TRAILING)
+
+        running_high = highest[-1]
+        start = end
+        window *= 2
+    return None, None
+
+
+def run_backtest(ts, price, prev_close, volume=None, params=None):
+    """
+    返回 (trades, summary)
+    trades: 结构化数组, 每行一笔交易 (entry_idx, exit_idx, entry_price, exit_price, quantity, pnl, reason)
+    """
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    ts = np.asarray(ts, dtype=np.float64)
+    price = np.asarray(price, dtype=np.float64)
+    prev_close = np.asarray(prev_close, dtype=np.float64)
+    volume = np.zeros(len(price)) if volume is None else np.asarray(volume, dtype=np.float64)
+    valid = price > 0
+    if not valid.all():
+        # 价格为 0 的报价不参与任何判断 (否则会被当作 -100% 触发止损): 只在有效报价上回测, 下标映射回原数组
+        keep = np.flatnonzero(valid)
+        trades, summary = run_backtest(ts[keep], price[keep], prev_close[keep], volume[keep], p)
+        trades["entry_idx"] = keep[trades["entry_idx"]]
+        trades["exit_idx"] = keep[trades["exit_idx"]]
+        return trades, summary
+    n = len(price)
+
+    # 入场条件与持仓无关, 一次算出全部候选下标
+    with np.errstate(divide='ignore', invalid='ignore'):
+        day_change = np.where(prev_close != 0, (price - prev_close) / prev_close, 0.0)
+    volume_ok = (volume > p["min_volume"]) | (volume == 0.0)
+    candidates = np.flatnonzero((day_change > p["momentum_threshold"]) & volume_ok)
+
+    cooldown_seconds = p["cooldown_minutes"] * 60
+    records = []
+    search_from = 0
+    while True:
+        k = np.searchsorted(candidates, search_from)
+        # 资金不足 1 股的信号直接跳过 (实盘同样不下单, 也不进入冷却)
+        while k < len(candidates) and int(p["budget"] / price[candidates[k]]) < 1:
+            k += 1
+        if k >= len(candidates):
+            break
+        entry_idx = candidates[k]
+        entry_price = price[entry_idx]
+        quantity = int(p["budget"] / entry_price)
+
+        exit_idx, reason = find_exit(price, entry_idx, entry_price, p["stop_loss_pct"], p["ladder"])
+        if exit_idx is None:
+            exit_idx, reason = n - 1, EXIT_END_OF_DATA
+        records.append((entry_idx, exit_idx, entry_price, price[exit_idx], quantity, reason))
+        if reason == EXIT_END_OF_DATA:
+            break
+        # 卖出后冷却: ts < 卖出时间 + 冷却 的报价都不买入; 卖出那一笔本身也不买入
+        cooldown_end = ts[exit_idx] + cooldown_seconds
+        search_from = max(exit_idx + 1, np.searchsorted(ts, cooldown_end, side='left'))
+
+    return build_trades(records, p["slippage_pct"])
+
+
+def build_trades(records, slippage_pct):
+    dtype = [("entry_idx", "i8"), ("exit_idx", "i8"), ("entry_price", "f8"), ("exit_price", "f8"),
+             ("quantity", "i8"), ("pnl", "f8"), ("reason", "i1")]
+    trades = np.zeros(len(records), dtype=dtype)
+    if records:
+        arr = np.array(records, dtype=np.float64)
+        trades["entry_idx"] = arr[:, 0]
+        trades["exit_idx"] = arr[:, 1]
+        trades["entry_price"] = arr[:, 2]
+        trades["exit_price"] = arr[:, 3]
+        trades["quantity"] = arr[:, 4]
+        trades["reason"] = arr[:, 5]
+        # 成交价按限价单最差情况估算: 买入 触发价*(1+滑点), 卖出 触发价*(1-滑点)
+        buy_fill = trades["entry_price"] * (1 + slippage_pct)
+        sell_fill = np.where(trades["reason"] == EXIT_END_OF_DATA, trades["exit_price"],
+                             trades["exit_price"] * (1 - slippage_pct))
+        trades["pnl"] = (sell_fill - buy_fill) * trades["quantity"]
+    return trades, summarize(trades)
+
+
+def summarize(trades):
+    equity = np.cumsum(trades["pnl"]) if len(trades) else np.zeros(1)
+    peak = np.maximum.accumulate(np.r_[0.0, equity])[1:]
+    return {
+        "trades": int(len(trades)),
+        "pnl": float(trades["pnl"].sum()) if len(trades) else 0.0,
+        "win_rate": float((trades["pnl"] > 0).mean()) if len(trades) else 0.0,
+        "max_drawdown": float((peak - equity).max()) if len(trades) else 0.0,
+        "stop_losses": int((trades["reason"] == EXIT_STOP_LOSS).sum()),
+        "trailing_exits": int((trades["reason"] == EXIT_TRAILING).sum()),
+    }
+
+
+# ==========================================
+# 3. 逐笔参考实现 (用于校验向量化结果)
+# ==========================================
+
+def run_reference(ts, price, prev_close, volume=None, params=None):
+    """逐笔调用 strategy.dxyz_decide, 与实盘循环的判断顺序一致"""
+    p = dict(DEFAULT_PARAMS, **(params or {}))
+    volume = np.zeros(len(price)) if volume is None else volume
+    position = None
+    cooldown_until = 0.0
+    records = []
+    last = None                      # 最后一笔有效报价 (下标, 价格)
+    for i in range(len(price)):
+        cp = float(price[i])
+        if cp <= 0:
+            continue
+        last = (i, cp)
+        in_cooldown = position is None and bool(cooldown_until) and ts[i] < cooldown_until
+        actions = dxyz_decide(cp, float(prev_close[i]), float(volume[i]), position, in_cooldown,
+                              p["stop_loss_pct"], p["momentum_threshold"], p["min_volume"], p["ladder"])
+        for kind, info in actions:
+            if kind == "raise_high":
+                position["highest_price"] = info
+            elif kind == "sell":
+                reason = EXIT_STOP_LOSS if info.startswith("触发硬止损") else EXIT_TRAILING
+                records.append((position["entry_idx"], i, position["entry_price"], cp, position["quantity"], reason))
+                position = None
+                cooldown_until = ts[i] + p["cooldown_minutes"] * 60
+            elif kind == "buy":
+                quantity = int(p["budget"] / cp)
+                if quantity >= 1:
+                    position = {"entry_idx": i, "entry_price": cp, "highest_price": cp, "quantity": quantity}
+    if position:
+        records.append((position["entry_idx"], last[0], position["entry_price"],
+                        last[1], position["quantity"], EXIT_END_OF_DATA))
+    return build_trades(records, p["slippage_pct"])
+
+
+# ==========================================
+# 4. 数据加载与命令行
+# ==========================================
+
+def synthetic_minute_bars(n, seed=7, start_price=26.5):
+    """合成分钟线: 每天 390 根 (09:30-16:00), 带波动聚集的随机游走"""
+    rng = np.random.default_rng(seed)
+    bars_per_day = 390
+    day = np.arange(n) // bars_per_day
+    minute = np.arange(n) % bars_per_day
+    ts = 1704205800.0 + day * 86400.0 + minute * 60.0   # 2024-01-02 14:30 UTC 起
+    vol = 0.002 * np.exp(np.cumsum(rng.normal(0, 0.05, n)) * 0.1)
+    price = np.round(start_price * np.exp(np.cumsum(rng.normal(0, 1, n) * vol)), 2)
+    volume = rng.integers(100, 5000, n).astype(np.float64)
+    return ts, price, volume
+
+
+def load_csv(path):
+    data = np.genfromtxt(path, delimiter=',', names=True)
+    names = data.dtype.names
+    ts, price = data["ts"], data["price"]
+    prev_close = data["prev_close"] if "prev_close" in names else prev_close_from_days(ts, price)
+    volume = data["volume"] if "volume" in names else None
+    return ts, price, prev_close, volume
+
+
+def load_ticks(root, symbol):
+    from tick_recorder import load_day
+    parts = [load_day(root, day, symbol) for day in sorted(os.listdir(root))
+             if os.path.isdir(os.path.join(root, day, symbol))]
+    if not parts:
+        raise SystemExit(f"{root} 中没有 {symbol} 的记录")
+    cols = {name: np.concatenate([part[name] for part in parts]).astype(np.float64) for name in parts[0]}
+    return cols["ts"], cols["price"], cols["prev_close"], cols["volume"]
+
+
+def print_summary(title, summary, elapsed):
+    print(f"{title}: {summary['trades']} 笔交易 | 盈亏 {summary['pnl']:.2f} | 胜率 {summary['win_rate']:.1%} | "
+          f"最大回撤 {summary['max_drawdown']:.2f} | 硬止损 {summary['stop_losses']} | "
+          f"移动止盈 {summary['trailing_exits']} | 耗时 {elapsed * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dxyz_dynamic 向量化回测")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="CSV 文件, 表头含 ts,price[,prev_close][,volume]")
+    source.add_argument("--ticks", help="tick_recorder 数据目录")
+    source.add_argument("--synthetic", type=int, help="生成 N 根合成分钟线")
+    parser.add_argument("--symbol", default="DXYZ.US")
+    parser.add_argument("--bar-volume", action="store_true", help="volume 列为单根成交量, 需累加为当日成交量")
+    parser.add_argument("--verify", action="store_true", help="与逐笔参考实现比对结果")
+    for key in ("stop_loss_pct", "momentum_threshold", "min_volume", "cooldown_minutes", "slippage_pct", "budget"):
+        parser.add_argument(f"--{key.replace('_', '-')}", type=float, default=DEFAULT_PARAMS[key])
+    args = parser.parse_args()
+
+    if args.csv:
+        ts, price, prev_close, volume = load_csv(args.csv)
+    elif args.ticks:
+        ts, price, prev_close, volume = load_ticks(args.ticks, args.symbol)
+    else:
+        ts, price, volume = synthetic_minute_bars(args.synthetic)
+        prev_close = prev_close_from_days(ts, price)
+        args.bar_volume = True
+    if args.bar_volume and volume is not None:
+        volume = cumulative_day_volume(ts, volume)
+
+    params = {key: getattr(args, key) for key in DEFAULT_PARAMS if key != "ladder"}
+    print(f"数据: {len(price)} 笔")
+
+    started = time.perf_counter()
+    trades, summary = run_backtest(ts, price, prev_close, volume, params)
+    print_summary("向量化", summary, time.perf_counter() - started)
+
+    if args.verify:
+        started = time.perf_counter()
+        ref_trades, ref_summary = run_reference(ts, price, prev_close, volume, params)
+        print_summary("逐笔参考", ref_summary, time.perf_counter() - started)
+        same = len(trades) == len(ref_trades) and all(
+            np.array_equal(trades[name], ref_trades[name]) for name in trades.dtype.names)
+        print("校验结果: " + ("一致" if same else "不一致"))
+        if not same:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+"""
+逐笔报价 -> 1 秒 / 1 分钟 / 5 分钟 OHLCV K 线
+
+* 每个 (标的, 周期) 一个预分配的定长环形缓冲区 (array 列存储), 写满后覆盖最旧的 K 线,
+  整个交易时段内存恒定: 每根 K 线 32 字节 (时间 f8, OHLC f4, 成交量 f8)
+* 最新一格为正在形成的 K 线, 每笔报价原地更新, 不分配新对象
+* 成交量取报价累计成交量 v 的增量; 没有成交的周期不生成空 K 线
+* 读取不复制: segments() 返回按时间顺序的两段 memoryview (环形回绕处断开), bar(i) 读取单根
+
+BarAggregator.on_quote 可直接注册为 QuoteBook 的发布回调; warm() 用本地 K 线缓存 (candle_cache.py) 预热。
+"""
+import time
+import threading
+from array import array
+
+# 默认周期 (秒) -> 保留根数
+DEFAULT_INTERVALS = {
+    1: 900,       # 1 秒线保留最近 15 分钟
+    60: 480,      # 1 分钟线覆盖完整交易时段
+    300: 200,     # 5 分钟线约 3 个交易日
+}
+
+FIELDS = (("ts", "d"), ("open", "f"), ("high", "f"), ("low", "f"), ("close", "f"), ("volume", "d"))
+
+
+class BarRing:
+    __slots__ = ("interval", "capacity", "cols", "count", "current_start", "last_volume", "live")
+
+    def __init__(self, interval, capacity):
+        self.interval = interval
+        self.capacity = capacity
+        self.cols = {name: array(code, bytes(array(code).itemsize * capacity)) for name, code in FIELDS}
+        self.count = 0                 # 累计生成的 K 线数 (最新一格下标 = (count - 1) % capacity)
+        self.current_start = None
+        self.last_volume = None
+        self.live = False              # 是否已有实时报价写入
+
+    def update(self, price, cum_volume, ts):
+        start = ts - ts % self.interval
+        self.live = True
+        delta = 0.0
+        if cum_volume:
+            if self.last_volume is not None and cum_volume >= self.last_volume:
+                delta = cum_volume - self.last_volume
+            self.last_volume = cum_volume
+
+        cols = self.cols
+        if self.current_start is None or start > self.current_start:
+            # 新 K 线: 占用下一格 (写满后覆盖最旧的一根)
+            slot = self.count % self.capacity
+            self.count += 1
+            self.current_start = start
+            cols["ts"][slot] = start
+            cols["open"][slot] = cols["high"][slot] = cols["low"][slot] = cols["close"][slot] = price
+            cols["volume"][slot] = delta
+            return
+
+        # 同一周期 (或乱序的旧报价) 合并到当前 K 线
+        slot = (self.count - 1) % self.capacity
+        if price > cols["high"][slot]:
+            cols["high"][slot] = price
+        if price < cols["low"][slot]:
+            cols["low"][slot] = price
+        cols["close"][slot] = price
+        cols["volume"][slot] += delta
+
+    def merge_bar(self, ts, open_price, high, low, close, volume):
+        """合并一根更细周期的历史 K 线 (预热用); 早于当前 K 线的忽略"""
+        start = ts - ts % self.interval
+        cols = self.cols
+        if self.current_start is None or start > self.current_start:
+            slot = self.count % self.capacity
+            self.count += 1
+            self.current_start = start
+            cols["ts"][slot] = start
+            cols["open"][slot] = open_price
+            cols["high"][slot] = high
+            cols["low"][slot] = low
+            cols["close"][slot] = close
+            cols["volume"][slot] = volume
+        elif start == self.current_start:
+            slot = (self.count - 1) % self.capacity
+            if high > cols["high"][slot]:
+                cols["high"][slot] = high
+            if low < cols["low"][slot]:
+                cols["low"][slot] = low
+            cols["close"][slot] = close
+            cols["volume"][slot] += volume
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def bar(self, i=-1):
+        """第 i 根 K 线 (0 为最旧, -1 为最新/正在形成), 返回 (ts, open, high, low, close, volume)"""
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError(i)
+        slot = (self.count - n + (i % n)) % self.capacity
+        return tuple(self.cols[name][slot] for name, _ in FIELDS)
+
+    def segments(self, name):
+        """按时间顺序返回该列的 (较旧段, 较新段) memoryview, 不复制数据"""
+        view = memoryview(self.cols[name])
+        if self.count <= self.capacity:
+            return view[:self.count], view[:0]
+        head = self.count % self.capacity
+        return view[head:], view[:head]
+
+
+class BarAggregator:
+    def __init__(self, symbols, intervals=None):
+        self.intervals = dict(intervals or DEFAULT_INTERVALS)
+        self.rings = {}
+        self.lock = threading.Lock()
+        for symbol in symbols:
+            self._add(symbol)
+
+    def _add(self, symbol):
+        rings = {interval: BarRing(interval, capacity) for interval, capacity in self.intervals.items()}
+        self.rings[symbol] = rings
+        return rings
+
+    def on_quote(self, symbol, quote):
+        """QuoteBook 发布回调: 每笔报价更新该标的所有周期的当前 K 线"""
+        if not quote:
+            return
+        price = float(quote.get('c') or 0)
+        if price <= 0:
+            return
+        volume = float(quote.get('v') or 0)
+        ts = quote.get('t') or time.time()
+        with self.lock:
+            rings = self.rings.get(symbol) or self._add(symbol)
+            for ring in rings.values():
+                ring.update(price, volume, ts)
+
+    def warm(self, symbol, rows, resolution):
+        """用历史 K 线 [(ts, o, h, l, c, v), ...] 预热周期为 resolution 整数倍的缓冲区, 返回预热的周期"""
+        warmed = []
+        with self.lock:
+            rings = self.rings.get(symbol) or self._add(symbol)
+            for interval, ring in rings.items():
+                # 环形缓冲区只能追加; 已有实时报价后不再回填历史, 以免重复计入当前 K 线
+                if interval < resolution or interval % resolution or ring.live:
+                    continue
+                for row in rows:
+                    ring.merge_bar(*row)
+                warmed.append(interval)
+        return warmed
+
+    def get(self, symbol, interval):
+        rings = self.rings.get(symbol)
+        return rings.get(interval) if rings else None
+
+    def memory_bytes(self):
+        row = sum(array(code).itemsize for _, code in FIELDS)
+        return sum(ring.capacity * row for rings in self.rings.values() for ring in rings.values())
+
+    def gauges(self):
+        """最新 K 线, 供 /metrics 导出 (直接读环形缓冲区)"""
+        values = {}
+        for symbol, rings in list(self.rings.items()):
+            for interval, ring in rings.items():
+                if not ring.count:
+                    continue
+                ts, open_price, high, low, close, volume = ring.bar(-1)
+                labels = f'{{symbol="{symbol}",interval="{interval}s"}}'
+                values[f"close{labels}"] = close
+                values[f"high{labels}"] = high
+                values[f"low{labels}"] = low
+                values[f"volume{labels}"] = volume
+                values[f"count{labels}"] = ring.count
+        return values
@@ -0,0 +1,463 @@
+#!/usr/bin/python3
+"""
+批量向量化策略引擎: 所有标的的现价、持仓与冷却状态保存在 NumPy 数组中,
+每轮用数组表达式一次算出全部标的的止损 / 阶梯止盈 / 买入条件, 只对需要动作的标的回调。
+
+* 行情源发布回调只把报价写入数组对应下标 (O(1)), 并标记为新报价
+* 持仓 / 冷却从状态表同步: 仅在状态版本号变化时重建数组 (成交、创新高、进入冷却)
+* 相同报价不会重复发布; 状态版本号变化或冷却到期时, 用现有报价重新评估相关标的
+* 报价时间戳 t 距今超过 params["stale_after"] 秒的空仓标的不评估 (过期报价不据此买入; 持仓标的照常检查止损 / 止盈)
+* 规则与 strategy.dxyz_decide 逐项一致 (含判断顺序与日志原因文本), --verify 逐笔回放比对
+* 阶梯表可逐标的配置 (params["ladders"]), 展开为按行的阈值 / 回撤二维数组
+* 只处于冷却期的标的每 cooldown_every 秒最多回调一次 ([("cooldown", None)]), 与逐标的循环一样输出冷却日志
+
+用法:
+  python batch_engine.py --verify --symbols 200 --ticks 2000    # 与 dxyz_decide 逐笔比对
+  python batch_engine.py --bench --symbols 100,1000,5000        # 单轮评估耗时
+"""
+import time
+import random
+import logging
+import argparse
+import threading
+
+import numpy as np
+
+from strategy import DXYZ_TRAILING_LADDER, dxyz_decide, normalize_ladder, sell_triggers
+from backtest import ladder_limits
+
+logger = logging.getLogger(__name__)
+
+
+def ladder_table(ladders):
+    """逐行阶梯表 -> (阈值, 回撤) 二维数组; 档位较少的行用 inf 阈值补齐 (永不命中)"""
+    width = max(len(ladder) for ladder in ladders)
+    thresholds = np.full((len(ladders), width), np.inf)
+    limits = np.full((len(ladders), width), np.nan)
+    for i, ladder in enumerate(ladders):
+        for k, (threshold, limit) in enumerate(ladder):
+            thresholds[i, k], limits[i, k] = threshold, limit
+    return thresholds, limits
+
+
+def row_ladder_limits(max_pnl, thresholds, limits):
+    """按行匹配第一档 (阈值从高到低); 未达任何一档为 NaN, 与 ladder_limits 相同"""
+    hit = max_pnl[:, None] > thresholds
+    first = hit.argmax(axis=1)
+    return np.where(hit.any(axis=1), limits[np.arange(len(max_pnl)), first], np.nan)
+
+
+def batch_decide(price, prev_close, volume, quantity, entry, highest, cooldown_until, now,
+                 stop_loss_pct, momentum_threshold, min_volume, ladder=DXYZ_TRAILING_LADDER, ladder_rows=None):
+    """
+    dxyz_decide 的数组版本 (ladder_rows = ladder_table() 的逐行切片时忽略 ladder),
+    返回各条件的布尔数组 (及计算原因文本所需的中间量):
+      raise_high / new_high   持仓创新高及新的最高价
+      stop / trail            硬止损 / 阶梯移动止盈 (二者互斥, 硬止损优先)
+      cooldown                空仓且处于冷却期
+      buy / low_volume        买入信号 / 价格达标但成交量不足
+    """
+    holding = quantity > 0
+    flat = ~holding
+    with np.errstate(divide='ignore', invalid='ignore'):
+        day_change = np.where(prev_close != 0, (price - prev_close) / prev_close, 0.0)
+
+        raise_high = holding & (price > highest)
+        new_high = np.where(raise_high, price, highest)
+        pnl = (price - entry) / entry
+        max_pnl = (new_high - entry) / entry
+        drawdown = (new_high - price) / new_high
+        stop = holding & (pnl < -stop_loss_pct)
+        limit = row_ladder_limits(max_pnl, *ladder_rows) if ladder_rows is not None else ladder_limits(max_pnl, ladder)
+        trail = holding & ~stop & (drawdown > limit)
+
+    cooldown = flat & (cooldown_until != 0) & (now < cooldown_until)
+    trend = flat & ~cooldown & (day_change > momentum_threshold)
+    volume_ok = (volume > min_volume) | (volume == 0.0)
+    return {
+        "day_change": day_change, "raise_high": raise_high, "new_high": new_high,
+        "pnl": pnl, "max_pnl": max_pnl, "drawdown": drawdown, "stop": stop, "trail": trail,
+        "cooldown": cooldown, "buy": trend & volume_ok, "low_volume": trend & ~volume_ok,
+    }
+
+
+def active_mask(d):
+    """需要回调的标的: 下单、更新最高价或成交量不足提示; 仅处于冷却期的标的由引擎另行限频回调"""
+    return d["raise_high"] | d["stop"] | d["trail"] | d["buy"] | d["low_volume"]
+
+
+def actions_at(d, i):
+    """第 i 个标的的动作列表, 格式与 dxyz_decide 完全相同"""
+    if d["cooldown"][i]:
+        return [("cooldown", None)]
+    actions = []
+    if d["raise_high"][i]:
+        actions.append(("raise_high", float(d["new_high"][i])))
+    if d["stop"][i]:
+        actions.append(("sell", f"触发硬止损 (当前 {float(d['pnl'][i]):.2%})"))
+    elif d["trail"][i]:
+        actions.append(("sell", f"触发动态移动止盈 (最高浮盈 {float(d['max_pnl'][i]):.2%}, "
+                                f"回撤 {float(d['drawdown'][i]):.2%})"))
+    elif d["buy"][i]:
+        actions.append(("buy", float(d["day_change"][i])))
+    elif d["low_volume"][i]:
+        actions.append(("low_volume", None))
+    return actions
+
+
+class BatchStrategyEngine:
+    """
+    单线程批量评估全部标的。
+    on_actions(symbol, actions, quote, position) 只对有动作的标的调用, actions 与 dxyz_decide 返回值相同;
+    state_version() / state_snapshot() 用于同步持仓与冷却 (版本号不变时不重建数组)。
+    """
+
+    def __init__(self, feed, symbols, on_actions, state_version, state_snapshot, params,
+                 market_open=None, closed_wait=None, quote_timeout=15, on_cycle=None, cooldown_every=60.0):
+        self.feed = feed
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.on_actions = on_actions
+        self.state_version = state_version
+        self.state_snapshot = state_snapshot
+        self.params = params            # stop_loss_pct / momentum_threshold / min_volume (/ ladder / ladders)
+        self.market_open = market_open
+        self.closed_wait = closed_wait  # 休市时调用, 阻塞到开盘或退出
+        self.quote_timeout = quote_timeout
+        self.on_cycle = on_cycle        # 每轮结束回调 (含无新报价的轮次, 如心跳日志)
+        self.cooldown_every = cooldown_every  # 冷却期标的两次回调的最小间隔 (秒), 0 = 每笔新报价都回调
+        self.metrics = None             # 可选 metrics.Metrics, 记录每轮批量评估耗时
+
+        n = len(self.symbols)
+        self.price = np.zeros(n)
+        self.prev_close = np.zeros(n)
+        self.volume = np.zeros(n)
+        self.ts = np.zeros(n)           # 报价时间戳 t (0 = 报价不带时间戳)
+        self.fresh = np.zeros(n, dtype=bool)
+        self.quotes = [None] * n
+        self.quantity = np.zeros(n)
+        self.entry = np.zeros(n)
+        self.highest = np.zeros(n)
+        self.cooldown_until = np.zeros(n)
+        self.cooldown_reported = np.full(n, -np.inf)   # 上次回调冷却提示的时间
+        self.positions = [None] * n
+        # 逐标的阶梯表 {标的: ladder}, 未配置的标的用 params["ladder"]; 全部相同时不展开
+        ladder = params.get("ladder", DXYZ_TRAILING_LADDER)
+        ladders = [normalize_ladder(params.get("ladders", {}).get(symbol, ladder)) for symbol in self.symbols]
+        self.ladder_rows = ladder_table(ladders) if len(set(ladders)) > 1 else None
+        self.synced_version = None
+        self.last_recheck = time.time()
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.cycles = 0
+        self.evaluated = 0
+        self.callbacks = 0
+        self.stale = 0
+
+    def on_quote(self, symbol, quote):
+        """行情源发布回调: 写入数组并唤醒评估线程"""
+        i = self.index.get(symbol)
+        if i is None or not quote:
+            return
+        with self.lock:
+            self.quotes[i] = quote
+            self.price[i] = float(quote.get('c', 0))
+            self.prev_close[i] = float(quote.get('pc', 0))
+            self.volume[i] = float(quote.get('v', 0))
+            self.ts[i] = quote.get('t') or 0
+            self.fresh[i] = True
+        self.wake.set()
+
+    def sync_state(self):
+        version = self.state_version()
+        if version == self.synced_version:
+            return
+        state = self.state_snapshot()
+        for symbol, i in self.index.items():
+            data = state.get(symbol) or {}
+            qty = data.get("quantity", 0)
+            self.positions[i] = data if qty > 0 else None
+            self.quantity[i] = qty
+            self.entry[i] = data.get("entry_price", 0) if qty > 0 else 0
+            self.highest[i] = data.get("highest_price", 0) if qty > 0 else 0
+            self.cooldown_until[i] = data.get("cooldown_until", 0) or 0
+        self.synced_version = version
+
+    def mark_rechecks(self, now=None):
+        """报价未变但决策输入变了: 状态版本号变化时全部重新评估, 否则只重新评估冷却刚到期的标的"""
+        now = time.time() if now is None else now
+        changed = self.state_version() != self.synced_version
+        with self.lock:
+            if changed:
+                self.fresh |= self.price != 0
+            else:
+                self.fresh |= (self.cooldown_until > self.last_recheck) & (self.cooldown_until <= now) & (self.price != 0)
+        self.last_recheck = now
+
+    def run_once(self, now=None):
+        """评估本轮收到新报价的标的, 返回回调次数"""
+        now = time.time() if now is None else now
+        stale_after = self.params.get("stale_after")
+        self.sync_state()
+        with self.lock:
+            pending = self.fresh.copy()
+            if stale_after:
+                stale = pending & (self.ts > 0) & (now - self.ts > stale_after) & (self.quantity <= 0)
+                pending &= ~stale
+                stale = np.flatnonzero(stale)
+            else:
+                stale = ()
+            fresh = np.flatnonzero(pending & (self.price != 0))
+            zero = np.flatnonzero(pending & (self.price == 0))
+            self.fresh[:] = False
+            price, prev_close, volume = self.price[fresh], self.prev_close[fresh], self.volume[fresh]
+            quotes = [self.quotes[i] for i in fresh]
+        for i in stale:
+            logger.warning(f"[{self.symbols[i]}] 报价已过期 ({now - self.ts[i]:.0f}s 前)，不据此买入",
+                           extra={"log_key": f"stale:{self.symbols[i]}", "log_every": 60})
+        self.stale += len(stale)
+        for i in zero:
+            logger.warning(f"[{self.symbols[i]}] Finnhub 返回的价格为 0，请检查接口或代码！原始返回: {self.quotes[i]}",
+                           extra={"log_key": f"zero_price:{self.symbols[i]}", "log_every": 60})
+        self.cycles += 1
+        if not len(fresh):
+            return 0
+
+        started = time.perf_counter()
+        self.sync_state()
+        p = self.params
+        ladder_rows = None if self.ladder_rows is None else (self.ladder_rows[0][fresh], self.ladder_rows[1][fresh])
+        d = batch_decide(price, prev_close, volume, self.quantity[fresh], self.entry[fresh], self.highest[fresh],
+                         self.cooldown_until[fresh], now,
+                         p["stop_loss_pct"], p["momentum_threshold"], p["min_volume"],
+                         p.get("ladder", DXYZ_TRAILING_LADDER), ladder_rows)
+        self.evaluated += len(fresh)
+        cooldown = d["cooldown"] & (now - self.cooldown_reported[fresh] >= self.cooldown_every)
+        self.cooldown_reported[fresh[cooldown]] = now
+        hits = np.flatnonzero(active_mask(d) | cooldown)
+        if self.metrics:
+            self.metrics.observe("decision", "_batch", time.perf_counter() - started)
+        for k in hits:
+            i = fresh[k]
+            self.on_actions(self.symbols[i], actions_at(d, k), quotes[k], self.positions[i])
+        self.callbacks += len(hits)
+        return len(hits)
+
+    def wakeup(self):
+        """退出时唤醒评估线程"""
+        self.wake.set()
+
+    def run(self, running_event):
+        logger.info(f"批量引擎已启动: {len(self.symbols)} 个标的")
+        self.feed.add_listener(self.on_quote)
+        for symbol in self.symbols:  # 启动前已发布的报价
+            quote, seq = self.feed.get_quote(symbol)
+            if seq:
+                self.on_quote(symbol, quote)
+        try:
+            while running_event.is_set():
+                if self.market_open is not None and not self.market_open():
+                    if self.closed_wait:
+                        self.closed_wait()
+                    continue
+                self.wake.wait(self.quote_timeout)
+                if not running_event.is_set():
+                    continue
+                self.wake.clear()
+                try:
+                    self.mark_rechecks()
+                    self.run_once()
+                    if self.on_cycle:
+                        self.on_cycle()
+                except Exception as e:
+                    logger.error(f"批量策略循环错误: {e}")
+        finally:
+            self.feed.remove_listener(self.on_quote)
+            logger.info(f"批量引擎已停止: {self.cycles} 轮, 评估 {self.evaluated} 次, 动作回调 {self.callbacks} 次, "
+                        f"过期报价 {self.stale} 次")
+
+
+# ==========================================
+# 逐笔回放比对 / 压测
+# ==========================================
+
+DEFAULT_PARAMS = {"stop_loss_pct": 0.06, "momentum_threshold": 0.015, "min_volume": 10000}
+COOLDOWN_SECONDS = 1800
+
+
+class ReplayFeed:
+    """回放用最小行情源: 只需 add_listener / remove_listener"""
+
+    def __init__(self):
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def get_quote(self, symbol):
+        return None, 0
+
+    def remove_listener(self, listener):
+        self.listeners.remove(listener)
+
+
+def apply_fill(state, symbol, actions, price, now):
+    """回放中的即时成交: 买入按现价成交 1 手, 卖出清仓并进入冷却"""
+    data = state.setdefault(symbol, {})
+    for kind, info in actions:
+        if kind == "raise_high":
+            data["highest_price"] = info
+        elif kind == "buy":
+            data.update(quantity=100, entry_price=price, highest_price=price)
+        elif kind == "sell":
+            data.update(quantity=0, entry_price=0, highest_price=0, cooldown_until=now + COOLDOWN_SECONDS)
+
+
+def replay_verify(n_symbols, n_ticks, seed=7, params=DEFAULT_PARAMS):
+    """
+    同一串随机报价分别交给 dxyz_decide (逐标的) 与批量引擎, 逐笔比对动作列表;
+    每 4 个标的中有 1 个使用收紧的阶梯表, 持仓时同时比对预计算触发价的快速路径
+    """
+    rng = random.Random(seed)
+    symbols = [f"S{i:04d}.US" for i in range(n_symbols)]
+    tight = tuple((threshold / 2, limit / 2) for threshold, limit in DXYZ_TRAILING_LADDER)
+    ladders = {symbol: tight for symbol in symbols[::4]}
+    params = dict(params, ladders=ladders)
+    triggers = {}
+    prev_close = {s: round(rng.uniform(10, 200), 2) for s in symbols}
+    prices = dict(prev_close)
+    ref_state, batch_state = {}, {}
+    version = [0]
+    got = {}
+
+    def on_actions(symbol, actions, quote, position):
+        got[symbol] = actions
+
+    # cooldown_every=0: 冷却期标的每笔报价都回调, 逐笔比对全部动作 (含冷却)
+    engine = BatchStrategyEngine(ReplayFeed(), symbols, on_actions, lambda: version[0],
+                                 lambda: {s: dict(v) for s, v in batch_state.items()}, params, cooldown_every=0)
+    now = 1_700_000_000.0
+    checked = mismatches = 0
+    for _ in range(n_ticks):
+        now += 1.0
+        got.clear()
+        published = rng.sample(symbols, max(1, n_symbols // 3))
+        quotes = {}
+        for symbol in published:
+            prices[symbol] = max(0.01, round(prices[symbol] * (1 + rng.gauss(0.0003, 0.01)), 2))
+            volume = rng.choice((0, 5000, 50000))
+            quotes[symbol] = {"c": prices[symbol], "pc": prev_close[symbol], "v": volume}
+            engine.on_quote(symbol, quotes[symbol])
+        engine.run_once(now)
+
+        for symbol in published:
+            quote = quotes[symbol]
+            data = ref_state.get(symbol, {})
+            position = data if data.get("quantity", 0) > 0 else None
+            cooldown_ts = data.get("cooldown_until", 0)
+            in_cooldown = position is None and bool(cooldown_ts) and now < cooldown_ts
+            ladder = ladders.get(symbol, DXYZ_TRAILING_LADDER)
+            expected = dxyz_decide(quote["c"], quote["pc"], quote["v"], position, in_cooldown,
+                                   params["stop_loss_pct"], params["momentum_threshold"], params["min_volume"], ladder)
+            actual = got.get(symbol, [])
+            fast = expected
+            if position:
+                t = triggers.get(symbol)
+                if t is None or (t.entry_price, t.highest_price) != (position["entry_price"], position["highest_price"]):
+                    t = triggers[symbol] = sell_triggers(position["entry_price"], position["highest_price"],
+                                                         params["stop_loss_pct"], ladder)
+                fast = dxyz_decide(quote["c"], quote["pc"], quote["v"], position, in_cooldown,
+                                   params["stop_loss_pct"], params["momentum_threshold"], params["min_volume"],
+                                   ladder, t)
+            checked += 1
+            if expected != actual or expected != fast:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"不一致 {symbol} @ {now}: dxyz_decide={expected} batch={actual} 触发价={fast}")
+            apply_fill(ref_state, symbol, expected, quote["c"], now)
+            if actual and actual != [("cooldown", None)]:
+                apply_fill(batch_state, symbol, actual, quote["c"], now)
+                version[0] += 1
+    return checked, mismatches, engine.callbacks
+
+
+def bench(n_symbols, rounds=50, params=DEFAULT_PARAMS):
+    """每轮全部标的各一笔报价 (日内小幅波动, 少数标的触发动作); 逐标的一侧含与 evaluate_quote 相同的解析与加锁查状态"""
+    rng = np.random.default_rng(1)
+    symbols = [f"S{i:05d}.US" for i in range(n_symbols)]
+    state = {s: {"quantity": 100, "entry_price": 50.0, "highest_price": 50.5} for s in symbols[: n_symbols // 2]}
+    lock = threading.RLock()
+    engine = BatchStrategyEngine(ReplayFeed(), symbols, lambda *a: None, lambda: 0, lambda: state, params)
+    quotes = [{"c": float(p), "pc": 50.0, "v": 0} for p in np.round(50 * (1 + rng.normal(0, 0.005, n_symbols)), 2)]
+
+    def scalar_round():
+        for symbol, quote in zip(symbols, quotes):
+            price, prev_close, volume = float(quote.get('c', 0)), float(quote.get('pc', 0)), float(quote.get('v', 0))
+            with lock:
+                data = state.get(symbol)
+            with lock:
+                in_cooldown = data is None and symbol in state
+            dxyz_decide(price, prev_close, volume, data, in_cooldown,
+                        params["stop_loss_pct"], params["momentum_threshold"], params["min_volume"])
+
+    # 持仓标的的触发价只在入场价 / 最高价变化时计算, 此处预先算好
+    triggers = {symbol: sell_triggers(data["entry_price"], data["highest_price"], params["stop_loss_pct"])
+                for symbol, data in state.items()}
+
+    def scalar_triggers_round():
+        for symbol, quote in zip(symbols, quotes):
+            price, prev_close, volume = float(quote.get('c', 0)), float(quote.get('pc', 0)), float(quote.get('v', 0))
+            with lock:
+                data = state.get(symbol)
+            with lock:
+                in_cooldown = data is None and symbol in state
+            dxyz_decide(price, prev_close, volume, data, in_cooldown,
+                        params["stop_loss_pct"], params["momentum_threshold"], params["min_volume"],
+                        DXYZ_TRAILING_LADDER, triggers.get(symbol))
+
+    def ingest():
+        for symbol, quote in zip(symbols, quotes):
+            engine.on_quote(symbol, quote)
+
+    def batch_round():
+        ingest()
+        engine.run_once()
+
+    def decide_only():
+        engine.fresh[:] = True
+        engine.run_once()
+
+    timings = {}
+    for name, fn in (("scalar", scalar_round), ("triggers", scalar_triggers_round),
+                     ("batch", batch_round), ("decide", decide_only)):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        timings[name] = (time.perf_counter() - started) / rounds * 1000
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量向量化策略引擎: 回放比对与压测")
+    parser.add_argument("--verify", action="store_true", help="与 dxyz_decide 逐笔比对")
+    parser.add_argument("--bench", action="store_true", help="单轮评估耗时 (含写入报价)")
+    parser.add_argument("--symbols", default="200", help="标的数量 (--bench 可逗号分隔多个)")
+    parser.add_argument("--ticks", type=int, default=2000, help="回放轮数")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.verify or not args.bench:
+        n = int(args.symbols.split(',')[0])
+        checked, mismatches, callbacks = replay_verify(n, args.ticks, args.seed)
+        print(f"回放比对: {checked} 次决策, 动作回调 {callbacks} 次, 不一致 {mismatches} 次 "
+              f"-> {'一致' if not mismatches else '不一致'}")
+    if args.bench:
+        print(f"{'标的数':>6}{'逐标的(ms)':>12}{'逐标的+触发价(ms)':>16}{'批量(ms)':>10}{'其中评估(ms)':>12}")
+        for n in (int(x) for x in args.symbols.split(',')):
+            t = bench(n)
+            print(f"{n:>8}{t['scalar']:>14.2f}{t['triggers']:>20.2f}{t['batch']:>12.2f}{t['decide']:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+"""
+策略引擎压测: 单进程在 1 秒节奏下能同时跑多少个标的。
+
+合成行情源每 interval 秒为全部 N 个标的各发布一次报价 (随机游走),
+规则使用 strategy.dxyz_decide, 下单用 sleep 模拟 submit_order 的网络延迟。
+统计每笔报价从发布到完成决策的延迟, 以及因处理不过来被合并跳过的报价比例。
+
+用法:
+  python bench_engine.py --symbols 100,500,1000,2000 --seconds 10 --mode both
+"""
+import time
+import random
+import asyncio
+import argparse
+import threading
+
+from market_data import QuoteBook
+from strategy import dxyz_decide
+from engine import AsyncStrategyEngine
+
+STOP_LOSS_PCT = 0.06
+BUY_MOMENTUM_THRESHOLD = 0.015
+MIN_VOLUME_THRESHOLD = 10000
+
+
+class SyntheticFeed(QuoteBook):
+    """每 interval 秒为所有标的发布一轮报价"""
+
+    def __init__(self, symbols, interval, volatility=0.002):
+        super().__init__(symbols)
+        self.interval = interval
+        self.volatility = volatility
+        self.prices = {s: 26.5 for s in self.symbols}
+        self.cycle = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            self.cycle += 1
+            for symbol in self.symbols:
+                price = round(self.prices[symbol] * (1 + random.gauss(0, self.volatility)), 2)
+                self.prices[symbol] = price
+                self._publish(symbol, {"c": price, "pc": 26.5, "v": 0, "_pub": time.monotonic(), "_cycle": self.cycle})
+            self.stop_event.wait(max(0.0, self.interval - (time.monotonic() - started)))
+
+
+class BenchStrategy:
+    """内存持仓 + 模拟下单, 记录每笔报价的决策延迟"""
+
+    def __init__(self, order_latency):
+        self.order_latency = order_latency
+        self.positions = {}
+        self.last_cycle = {}
+        self.lags = []
+        self.skipped = 0
+        self.orders = 0
+
+    def evaluate(self, symbol, quote):
+        self.lags.append(time.monotonic() - quote["_pub"])
+        last = self.last_cycle.get(symbol)
+        if last is not None and quote["_cycle"] > last + 1:
+            self.skipped += quote["_cycle"] - last - 1
+        self.last_cycle[symbol] = quote["_cycle"]
+        position = self.positions.get(symbol)
+        return [(kind, info, quote["c"]) for kind, info in dxyz_decide(
+            quote["c"], quote["pc"], quote["v"], position, False,
+            STOP_LOSS_PCT, BUY_MOMENTUM_THRESHOLD, MIN_VOLUME_THRESHOLD)]
+
+    def execute(self, symbol, actions):
+        for kind, info, price in actions:
+            if kind == "raise_high":
+                self.positions[symbol]["highest_price"] = info
+            elif kind in ("buy", "sell"):
+                time.sleep(self.order_latency)  # 模拟 submit_order 往返
+                self.orders += 1
+                if kind == "buy":
+                    self.positions[symbol] = {"entry_price": price, "highest_price": price, "quantity": 1}
+                else:
+                    self.positions.pop(symbol, None)
+
+
+def run_asyncio(n, seconds, interval, order_latency, workers):
+    symbols = [f"S{i:04d}.US" for i in range(n)]
+    feed = SyntheticFeed(symbols, interval)
+    bench = BenchStrategy(order_latency)
+    engine = AsyncStrategyEngine(feed, symbols, bench.evaluate, bench.execute,
+                                 max_workers=workers, quote_timeout=interval * 3)
+
+    async def driver():
+        task = asyncio.create_task(engine.run())
+        await asyncio.sleep(0.1)
+        feed.start()
+        await asyncio.sleep(seconds)
+        engine.stop()
+        await task
+
+    asyncio.run(driver())
+    feed.stop()
+    return bench, feed.cycle * n
+
+
+def run_threads(n, seconds, interval, order_latency):
+    symbols = [f"S{i:04d}.US" for i in range(n)]
+    feed = SyntheticFeed(symbols, interval)
+    bench = BenchStrategy(order_latency)
+    running = threading.Event()
+    running.set()
+
+    def loop(symbol):
+        last_seq = 0
+        while running.is_set():
+            quote, last_seq = feed.wait_for_update(symbol, last_seq, timeout=interval * 3)
+            if quote:
+                bench.execute(symbol, bench.evaluate(symbol, quote))
+
+    threads = [threading.Thread(target=loop, args=(s,), daemon=True) for s in symbols]
+    for t in threads:
+        t.start()
+    feed.start()
+    time.sleep(seconds)
+    running.clear()
+    feed.stop()
+    for t in threads:
+        t.join(timeout=interval * 3)
+    return bench, feed.cycle * n
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def report(mode, n, bench, published, interval):
+    p50 = percentile(bench.lags, 0.50) * 1000
+    p99 = percentile(bench.lags, 0.99) * 1000
+    skipped_pct = bench.skipped / published * 100 if published else 0
+    ok = "OK" if p99 < interval * 1000 and skipped_pct < 1 else "跟不上"
+    print(f"{mode:<8}{n:>7}{len(bench.lags):>10}{p50:>10.1f}{p99:>10.1f}{skipped_pct:>9.2f}%{bench.orders:>8}   {ok}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略引擎压测")
+    parser.add_argument("--symbols", default="100,500,1000,2000", help="逗号分隔的标的数量列表")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--interval", type=float, default=1.0, help="行情节奏 (秒)")
+    parser.add_argument("--order-latency", type=float, default=0.3, help="模拟 submit_order 延迟 (秒)")
+    parser.add_argument("--workers", type=int, default=8, help="asyncio 模式线程池大小")
+    parser.add_argument("--mode", choices=["asyncio", "thread", "both"], default="both")
+    args = parser.parse_args()
+
+    print(f"{'模式':<6}{'标的数':>5}{'决策次数':>7}{'p50(ms)':>10}{'p99(ms)':>10}{'合并跳过':>8}{'下单':>6}")
+    for n in (int(x) for x in args.symbols.split(',')):
+        if args.mode in ("asyncio", "both"):
+            bench, published = run_asyncio(n, args.seconds, args.interval, args.order_latency, args.workers)
+            report("asyncio", n, bench, published, args.interval)
+        if args.mode in ("thread", "both"):
+            bench, published = run_threads(n, args.seconds, args.interval, args.order_latency)
+            report("thread", n, bench, published, args.interval)
+
+
+if __name__ == "__main__":
+    main()
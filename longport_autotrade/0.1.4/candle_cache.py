@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+"""
+本地历史 K 线缓存: 启动时从磁盘预热, 后台只补拉缺失的 K 线
+
+目录结构 (与 tick_recorder 相同的列式定长文件):
+  candles/DXYZ.US/60s/ts.f8  open.f4  high.f4  low.f4  close.f4  volume.f8
+
+* load() 读取整列 (array.fromfile), 数万根 K 线毫秒级完成, 启动不依赖网络
+* refresh() 从缓存中最后一根 K 线开始请求 (该根可能尚未走完, 重新拉取后覆盖), 只追加新 K 线;
+  无缓存时拉取最近 days 天
+* 超出保留天数 1.5 倍时压缩重写, 文件大小保持稳定
+* 数据源可替换: 任何实现 fetch(symbol, resolution, start, end) -> [(ts, o, h, l, c, v), ...] 的对象
+
+用法:
+  python candle_cache.py candles DXYZ.US          # 查看缓存概况
+"""
+import os
+import sys
+import time
+import logging
+from array import array
+from datetime import datetime, timezone
+
+from market_data import to_finnhub_symbol
+from rate_limiter import PRIORITY_LOW, is_rate_limit_error
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (("ts", "f8", "d"), ("open", "f4", "f"), ("high", "f4", "f"),
+           ("low", "f4", "f"), ("close", "f4", "f"), ("volume", "f8", "d"))
+
+# Finnhub resolution 参数
+FINNHUB_RESOLUTIONS = {60: "1", 300: "5", 900: "15", 1800: "30", 3600: "60", 86400: "D"}
+
+
+class FinnhubCandleSource:
+    """Finnhub /stock/candle (需要对应权限; 本地可用 feed_server.py 替身)"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def fetch(self, symbol, resolution, start, end):
+        data = self.client.stock_candles(to_finnhub_symbol(symbol), FINNHUB_RESOLUTIONS[resolution],
+                                         int(start), int(end))
+        if not data or data.get("s") != "ok":
+            return []
+        return list(zip(data["t"], data["o"], data["h"], data["l"], data["c"], data["v"]))
+
+
+class CandleCache:
+    def __init__(self, root, source, resolution=60, days=10, limiter=None):
+        if sys.byteorder != "little":
+            raise RuntimeError("列文件按小端序写入, 当前平台不受支持")
+        self.root = root
+        self.source = source
+        self.resolution = resolution
+        self.days = days
+        self.limiter = limiter
+        self.fetched = 0              # 累计从数据源拉取的 K 线数
+
+    def directory(self, symbol):
+        return os.path.join(self.root, symbol, f"{self.resolution}s")
+
+    # ---------- 读取 ----------
+
+    def load(self, symbol):
+        """返回 {列名: array}; 无缓存时各列为空"""
+        directory = self.directory(symbol)
+        columns = {}
+        for name, suffix, code in COLUMNS:
+            col = array(code)
+            path = os.path.join(directory, f"{name}.{suffix}")
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    col.frombytes(f.read())
+            columns[name] = col
+        # 写盘时各列同批追加; 若在两列之间异常退出, 按最短列对齐
+        rows = min(len(col) for col in columns.values())
+        for name, col in columns.items():
+            del col[rows:]
+        return columns
+
+    def rows(self, symbol):
+        cols = self.load(symbol)
+        return list(zip(*(cols[name] for name, _, _ in COLUMNS)))
+
+    # ---------- 写入 ----------
+
+    def _write(self, symbol, rows, keep, mode):
+        """keep = 保留已有文件的前 keep 行 (截断其后内容), 再追加 rows"""
+        directory = self.directory(symbol)
+        os.makedirs(directory, exist_ok=True)
+        for i, (name, suffix, code) in enumerate(COLUMNS):
+            path = os.path.join(directory, f"{name}.{suffix}")
+            with open(path, mode) as f:
+                if mode == 'r+b':
+                    f.truncate(keep * array(code).itemsize)
+                    f.seek(0, os.SEEK_END)
+                array(code, (row[i] for row in rows)).tofile(f)
+
+    def refresh(self, symbol, now=None):
+        """补拉缺失的 K 线并写入缓存, 返回新增 (含覆盖最后一根) 的行"""
+        now = time.time() if now is None else now
+        cols = self.load(symbol)
+        count = len(cols["ts"])
+        start = cols["ts"][-1] if count else now - self.days * 86400
+
+        if self.limiter and not self.limiter.acquire(PRIORITY_LOW, timeout=60):
+            logger.warning(f"[{symbol}] K 线补拉排队超时 (限流)，下次再试")
+            return []
+        try:
+            fetched = self.source.fetch(symbol, self.resolution, start, now)
+        except Exception as e:
+            if self.limiter and is_rate_limit_error(e):
+                self.limiter.backoff(10)
+            logger.warning(f"[{symbol}] K 线补拉失败，继续使用本地缓存: {e}")
+            return []
+
+        rows = sorted((row for row in fetched if row[0] >= start), key=lambda row: row[0])
+        if not rows:
+            return []
+        self.fetched += len(rows)
+
+        cutoff = now - self.days * 86400 * 1.5
+        if count and cols["ts"][0] < cutoff:
+            # 压缩: 只保留最近 days 天, 整体重写
+            keep_from = now - self.days * 86400
+            merged = [row for row in zip(*(cols[name] for name, _, _ in COLUMNS)) if row[0] < rows[0][0]] + rows
+            self._write(symbol, [row for row in merged if row[0] >= keep_from], 0, 'wb')
+        elif count:
+            # 最后一根可能尚未走完, 若重新拉到则覆盖
+            keep = count - 1 if rows[0][0] == cols["ts"][-1] else count
+            self._write(symbol, rows, keep, 'r+b')
+        else:
+            self._write(symbol, rows, 0, 'wb')
+        return rows
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("用法: python candle_cache.py <缓存目录> <标的> [周期秒数]")
+        sys.exit(1)
+    resolution = int(sys.argv[3]) if len(sys.argv) > 3 else 60
+    cache = CandleCache(sys.argv[1], None, resolution)
+    cols = cache.load(sys.argv[2])
+    n = len(cols["ts"])
+    if not n:
+        print(f"{sys.argv[2]}: 无缓存")
+        return
+    fmt = lambda ts: datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M")
+    print(f"{sys.argv[2]} {resolution}s: {n} 根 | {fmt(cols['ts'][0])} - {fmt(cols['ts'][-1])} UTC | "
+          f"最新收盘 {cols['close'][-1]:.2f}")
+
+
+if __name__ == "__main__":
+    main()
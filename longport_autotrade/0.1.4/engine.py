@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+"""
+asyncio 策略引擎: 所有标的的监控循环作为协程运行在同一个事件循环中。
+
+* 行情仍由共享行情源 (QuotePoller / FinnhubStreamFeed) 的单个线程获取,
+  发布时通过 call_soon_threadsafe 唤醒对应标的的协程, 协程不做任何阻塞 I/O。
+* evaluate(symbol, quote) 在事件循环内执行, 只做计算并返回动作列表。
+* 相同报价不会重复发布; 等待超时时若 recheck(symbol) 为真 (持仓 / 订单 / 冷却变化), 用现有报价重新评估,
+  否则调用 on_idle(symbol, quote) (如心跳日志)。
+* execute(symbol, actions) 含下单 / 写状态等阻塞调用, 投递到有界线程池执行;
+  同一标的在动作完成前不会处理下一笔报价, 避免重复下单。
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncStrategyEngine:
+    def __init__(self, feed, symbols, evaluate, execute, market_open=None,
+                 max_workers=8, quote_timeout=15, closed_sleep=60, recheck=None, on_idle=None):
+        self.feed = feed
+        self.symbols = list(symbols)
+        self.evaluate = evaluate
+        self.execute = execute
+        self.market_open = market_open
+        self.quote_timeout = quote_timeout
+        self.closed_sleep = closed_sleep
+        self.recheck = recheck
+        self.on_idle = on_idle
+        # 有界线程池: 同时在途的阻塞调用 (submit_order 等) 不超过 max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="Exec")
+
+        self.loop = None
+        self.events = {}
+        self.stopping = None
+        self.processed = 0
+
+    def _on_publish(self, symbol, quote):
+        """行情线程回调: 线程安全地唤醒对应协程"""
+        event = self.events.get(symbol)
+        loop = self.loop
+        if event is not None and loop is not None:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+    def stop(self):
+        """可从任意线程调用"""
+        loop = self.loop
+        if loop is not None and self.stopping is not None:
+            loop.call_soon_threadsafe(self.stopping.set)
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        self.events = {symbol: asyncio.Event() for symbol in self.symbols}
+        self.feed.add_listener(self._on_publish)
+
+        tasks = [asyncio.create_task(self._symbol_loop(symbol), name=f"Task-{symbol}") for symbol in self.symbols]
+        logger.info(f"asyncio 引擎已启动: {len(tasks)} 个标的协程")
+        try:
+            await self.stopping.wait()
+        finally:
+            self.feed.remove_listener(self._on_publish)
+            self.loop = None
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.executor.shutdown(wait=True)
+            logger.info("asyncio 引擎已停止")
+
+    async def _symbol_loop(self, symbol):
+        logger.info(f"启动策略监控: {symbol}")
+        event = self.events[symbol]
+        last_seq = 0
+
+        while not self.stopping.is_set():
+            if self.market_open is not None and not self.market_open():
+                # closed_sleep 可为秒数或返回秒数的函数 (如距下次开盘); 收到 stop() 立即醒来
+                delay = self.closed_sleep() if callable(self.closed_sleep) else self.closed_sleep
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await asyncio.wait_for(event.wait(), timeout=self.quote_timeout)
+            except asyncio.TimeoutError:
+                quote = self.feed.get_quote(symbol)[0]
+                if not quote:
+                    logger.error(f"无法获取 {symbol} 价格，跳过本次循环")
+                    continue
+                if not (self.recheck and self.recheck(symbol)):
+                    if self.on_idle:
+                        self.on_idle(symbol, quote)
+                    continue
+            else:
+                event.clear()
+                quote, seq = self.feed.get_quote(symbol)
+                if seq == last_seq:
+                    continue
+                last_seq = seq
+                if not quote:
+                    logger.error(f"无法获取 {symbol} 价格，跳过本次循环")
+                    continue
+
+            try:
+                actions = self.evaluate(symbol, quote)
+                if actions:
+                    await self.loop.run_in_executor(self.executor, self.execute, symbol, actions)
+                self.processed += 1
+            except Exception as e:
+                logger.error(f"策略循环错误 ({symbol}): {e}")
@@ -0,0 +1,318 @@
+#!/usr/bin/python3
+"""
+本地行情替身服务器 (离线测试用, 仅依赖标准库)
+
+同时模拟 Finnhub 的两个接口:
+  * REST:      GET /api/v1/quote?symbol=DXYZ      -> quote 格式 JSON
+               GET /api/v1/stock/candle?symbol=DXYZ&resolution=1&from=..&to=..
+                                                  -> 分钟 K 线 (按时间确定性生成, 仅工作日 13:30-20:00 UTC)
+  * WebSocket: ws://host:port/                    -> {"type":"subscribe"} / {"type":"trade"} 推送协议
+
+行情来源二选一:
+  * --file ticks.jsonl   按时间戳回放逐笔数据, 每行 {"s": "DXYZ", "p": 26.5, "t": 毫秒时间戳, "v": 100}
+  * --symbols DXYZ:26.5  随机游走生成 (默认)
+
+用法:
+  python feed_server.py --port 8765 --symbols DXYZ:26.5,NVDA:120 --tick-interval 0.2
+  python feed_server.py --port 8766 --rest-delay 0.2 --rest-jitter 0.5 --rest-error-rate 0.1   # 慢且不稳定的数据源
+  export FINNHUB_API_URL=http://127.0.0.1:8765/api/v1
+  export FINNHUB_WS_URL=ws://127.0.0.1:8765/
+"""
+import sys
+import json
+import math
+import time
+import random
+import base64
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+# ==========================================
+# 1. 行情状态与广播
+# ==========================================
+
+class MarketReplay:
+    """维护每个标的的 quote 快照, 并把每笔成交广播给已订阅的 websocket 客户端"""
+
+    def __init__(self, rest_delay=0.0, rest_jitter=0.0, rest_error_rate=0.0):
+        self.quotes = {}
+        self.clients = set()
+        # REST 故障注入 (验证多源对冲 / 超时): 固定延迟 + 指数分布抖动 (秒), 按概率返回 500
+        self.rest_delay = rest_delay
+        self.rest_jitter = rest_jitter
+        self.rest_error_rate = rest_error_rate
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def seed(self, symbol, price):
+        self.quotes[symbol] = {"c": price, "o": price, "h": price, "l": price, "pc": price,
+                               "d": 0.0, "dp": 0.0, "v": 0, "t": int(time.time())}
+
+    def on_trade(self, symbol, price, ts_ms, volume):
+        with self.lock:
+            if symbol not in self.quotes:
+                self.seed(symbol, price)
+            q = self.quotes[symbol]
+            q.update(c=price, h=max(q["h"], price), l=min(q["l"], price), t=ts_ms // 1000)
+            q["v"] += volume
+            q["d"] = round(price - q["pc"], 4)
+            q["dp"] = round(q["d"] / q["pc"] * 100, 4) if q["pc"] else 0.0
+            clients = list(self.clients)
+        message = json.dumps({"type": "trade", "data": [{"s": symbol, "p": price, "t": ts_ms, "v": volume}]})
+        for client in clients:
+            if symbol in client.subscriptions:
+                client.send_text(message)
+
+    def quote(self, symbol):
+        with self.lock:
+            q = self.quotes.get(symbol)
+            # 与 Finnhub 一致: 未知代码返回全 0
+            return dict(q) if q else {"c": 0, "o": 0, "h": 0, "l": 0, "pc": 0, "d": None, "dp": None, "t": 0}
+
+    def candles(self, symbol, resolution, start, end):
+        """确定性生成的历史 K 线: 同一时间段多次请求结果一致, 便于验证增量补拉"""
+        seconds = 86400 if resolution == "D" else int(resolution) * 60
+        with self.lock:
+            q = self.quotes.get(symbol)
+            base = q["pc"] if q else 100.0
+        out = {"t": [], "o": [], "h": [], "l": [], "c": [], "v": []}
+        ts = start - start % seconds
+        while ts <= end:
+            if time.gmtime(ts).tm_wday < 5 and (seconds >= 86400 or 48600 <= ts % 86400 < 72000):
+                rng = random.Random(f"{symbol}:{seconds}:{ts}")
+                mid = base * math.exp(0.02 * math.sin(ts / 7200.0) + 0.005 * math.sin(ts / 600.0))
+                open_price, close = (round(mid * (1 + rng.gauss(0, 0.001)), 2) for _ in range(2))
+                out["t"].append(ts)
+                out["o"].append(open_price)
+                out["c"].append(close)
+                out["h"].append(round(max(open_price, close) * (1 + abs(rng.gauss(0, 0.0005))), 2))
+                out["l"].append(round(min(open_price, close) * (1 - abs(rng.gauss(0, 0.0005))), 2))
+                out["v"].append(rng.randint(100, 5000))
+            ts += seconds
+        # 与 Finnhub 一致: 区间内无数据时 s = "no_data"
+        return dict(out, s="ok") if out["t"] else {"s": "no_data"}
+
+    def ping_loop(self, interval=10):
+        while not self.stop_event.wait(interval):
+            with self.lock:
+                clients = list(self.clients)
+            for client in clients:
+                client.send_text('{"type":"ping"}')
+
+    def random_walk(self, seeds, tick_interval, volatility=0.002):
+        for symbol, price in seeds.items():
+            self.seed(symbol, price)
+        while not self.stop_event.wait(tick_interval):
+            symbol = random.choice(list(seeds))
+            last = self.quotes[symbol]["c"]
+            price = round(max(0.01, last * (1 + random.gauss(0, volatility))), 2)
+            self.on_trade(symbol, price, int(time.time() * 1000), random.randint(1, 500))
+
+    def replay_file(self, path, speed=1.0, loop=False):
+        """按原始时间间隔 / speed 回放逐笔文件; 推送时间戳改写为当前时间"""
+        while not self.stop_event.is_set():
+            prev_t = None
+            with open(path, 'r') as f:
+                for line in f:
+                    if self.stop_event.is_set():
+                        return
+                    line = line.strip()
+                    if not line:
+                        continue
+                    tick = json.loads(line)
+                    if prev_t is not None and tick["t"] > prev_t:
+                        self.stop_event.wait((tick["t"] - prev_t) / 1000.0 / speed)
+                    prev_t = tick["t"]
+                    self.on_trade(tick["s"], float(tick["p"]), int(time.time() * 1000), int(tick.get("v", 0)))
+            if not loop:
+                return
+
+
+# ==========================================
+# 2. HTTP / WebSocket 处理
+# ==========================================
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # websocket 握手要求 1.1; REST 同样保持长连接
+    disable_nagle_algorithm = True  # 响应头与正文分两次写出, 不关闭 Nagle 时长连接上每次请求多等约 40ms
+    replay = None  # 由 serve() 注入
+
+    def log_message(self, format, *args):
+        pass  # 静默, 避免刷屏
+
+    def do_GET(self):
+        if self.headers.get("Upgrade", "").lower() == "websocket":
+            self.handle_websocket()
+            return
+
+        replay = self.replay
+        delay = replay.rest_delay + (random.expovariate(1 / replay.rest_jitter) if replay.rest_jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        if replay.rest_error_rate and random.random() < replay.rest_error_rate:
+            self.send_error(500)
+            return
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        symbol = params.get("symbol", [""])[0]
+        if url.path.rstrip('/').endswith("/quote"):
+            body = json.dumps(self.replay.quote(symbol)).encode()
+        elif url.path.rstrip('/').endswith("/stock/candle"):
+            try:
+                resolution = params.get("resolution", ["1"])[0]
+                start, end = int(params["from"][0]), int(params["to"][0])
+            except (KeyError, ValueError):
+                self.send_error(422)
+                return
+            body = json.dumps(self.replay.candles(symbol, resolution, start, end)).encode()
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # ---------- WebSocket (RFC 6455 最小实现) ----------
+
+    def handle_websocket(self):
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+
+        self.subscriptions = set()
+        self.send_lock = threading.Lock()
+        self.closed = False
+        with self.replay.lock:
+            self.replay.clients.add(self)
+        try:
+            while not self.closed:
+                opcode, payload = self.read_frame()
+                if opcode is None or opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    self.send_frame(0xA, payload)
+                elif opcode == 0x1:
+                    self.on_client_message(payload.decode())
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.closed = True
+            with self.replay.lock:
+                self.replay.clients.discard(self)
+            self.close_connection = True
+
+    def on_client_message(self, text):
+        msg = json.loads(text)
+        if msg.get("type") == "subscribe":
+            self.subscriptions.add(msg.get("symbol"))
+        elif msg.get("type") == "unsubscribe":
+            self.subscriptions.discard(msg.get("symbol"))
+
+    def read_frame(self):
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None, b""
+        opcode = header[0] & 0x0F
+        masked = header[1] & 0x80
+        length = header[1] & 0x7F
+        if length == 126:
+            length = int.from_bytes(self.rfile.read(2), "big")
+        elif length == 127:
+            length = int.from_bytes(self.rfile.read(8), "big")
+        mask = self.rfile.read(4) if masked else b""
+        payload = self.rfile.read(length)
+        if masked:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = bytes([0x80 | opcode, length])
+        elif length < 65536:
+            header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, "big")
+        else:
+            header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, "big")
+        with self.send_lock:
+            self.wfile.write(header + payload)
+
+    def send_text(self, text):
+        if self.closed:
+            return
+        try:
+            self.send_frame(0x1, text.encode())
+        except (ConnectionError, OSError):
+            self.closed = True
+
+
+# ==========================================
+# 3. 启动入口
+# ==========================================
+
+def serve(replay, host="127.0.0.1", port=8765):
+    """启动服务器 (后台线程), 返回 server 对象; server.shutdown() 停止"""
+    handler = type("BoundReplayHandler", (ReplayHandler,), {"replay": replay})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="Thread-FeedServer", daemon=True).start()
+    threading.Thread(target=replay.ping_loop, name="Thread-FeedPing", daemon=True).start()
+    return server
+
+
+def parse_seeds(text):
+    seeds = {}
+    for item in text.split(','):
+        symbol, price = item.split(':')
+        seeds[symbol.strip()] = float(price)
+    return seeds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 Finnhub 行情替身服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--file", help="逐笔回放文件 (JSON lines)")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速")
+    parser.add_argument("--loop", action="store_true", help="回放结束后从头循环")
+    parser.add_argument("--symbols", default="DXYZ:26.5", help="随机游走标的与初始价, 如 DXYZ:26.5,NVDA:120")
+    parser.add_argument("--tick-interval", type=float, default=0.2, help="随机游走成交间隔 (秒)")
+    parser.add_argument("--rest-delay", type=float, default=0.0, help="REST 响应固定延迟 (秒)")
+    parser.add_argument("--rest-jitter", type=float, default=0.0, help="REST 响应额外延迟 (指数分布均值, 秒)")
+    parser.add_argument("--rest-error-rate", type=float, default=0.0, help="REST 返回 500 的概率")
+    args = parser.parse_args()
+
+    replay = MarketReplay(args.rest_delay, args.rest_jitter, args.rest_error_rate)
+    server = serve(replay, args.host, args.port)
+    print(f"行情替身服务器已启动: http://{args.host}:{args.port}/api/v1  ws://{args.host}:{args.port}/")
+
+    try:
+        if args.file:
+            replay.replay_file(args.file, args.speed, args.loop)
+            print("回放结束，按 Ctrl+C 退出。")
+            while True:
+                time.sleep(1)
+        else:
+            replay.random_walk(parse_seeds(args.symbols), args.tick_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        replay.stop_event.set()
+        server.shutdown()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/python3
+"""
+行情 REST 共享连接池: 长连接复用 + 严格的连接 / 读取超时 + 每次请求耗时
+
+* PooledSession: requests.Session, 每个主机最多 pool_size 条长连接, 所有线程共享;
+  连接用满时排队等待空闲连接 (pool_block), 不会无限新建; 排队最多 pool_timeout 秒, 超时按超时错误抛出
+* 超时为 (连接超时, 读取超时) 二元组: 服务器卡住时最多阻塞 read_timeout 秒, 而不是取决于 socket 默认值
+* 连接失败 (未发出请求) 时最多重连 connect_retries 次; 读取超时与 HTTP 错误不重试, 交给上层 (对冲 / 下一轮轮询)
+* 每次请求的耗时按接口记录到 metrics ("http_<name>" 阶段), stats() 给出调用数 / 超时数 / 新建连接数
+
+用法:
+    session = PooledSession("finnhub", pool_size=8, connect_timeout=3.05, read_timeout=5, metrics=metrics)
+    session.install(finnhub_client)     # 替换 finnhub.Client 内部的 session, 保留其 token 与请求头
+
+测试: python -m pytest tests/test_http_transport.py   (以 feed_server 为替身验证连接复用 / 读取超时 / 排队超时 / 连接拒绝)
+"""
+import time
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import EmptyPoolError
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedPoolMixin:
+    """urllib3 连接池: 未指定排队超时时使用 pool_timeout (urllib3 默认 None, 连接用满时无限等待)"""
+    pool_timeout = None
+
+    def _get_conn(self, timeout=None):
+        return super()._get_conn(timeout=self.pool_timeout if timeout is None else timeout)
+
+
+class BoundedPoolAdapter(HTTPAdapter):
+    """HTTPAdapter 不向 urllib3 传排队超时, 这里替换 PoolManager 使用的连接池类"""
+
+    def __init__(self, pool_timeout, **kwargs):
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            scheme: type(cls.__name__, (BoundedPoolMixin, cls), {"pool_timeout": self.pool_timeout})
+            for scheme, cls in self.poolmanager.pool_classes_by_scheme.items()
+        }
+
+
+class PooledSession(requests.Session):
+    def __init__(self, name, pool_size=8, connect_timeout=3.05, read_timeout=5.0, connect_retries=1, metrics=None,
+                 pool_timeout=None):
+        super().__init__()
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_timeout = connect_timeout if pool_timeout is None else pool_timeout
+        self.metrics = metrics
+        self.base_url = ""
+        self.adapter = BoundedPoolAdapter(
+            self.pool_timeout, pool_connections=4, pool_maxsize=pool_size, pool_block=True,
+            max_retries=Retry(total=connect_retries, connect=connect_retries, read=False, status=0,
+                              redirect=0, other=0, raise_on_status=False),
+        )
+        self.mount("https://", self.adapter)
+        self.mount("http://", self.adapter)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    def install(self, client):
+        """替换 finnhub.Client 的 session: 沿用其请求头与 token 参数, 并统一超时"""
+        self.headers.update(client._session.headers)
+        self.params.update(client._session.params)
+        self.proxies.update(client._session.proxies)
+        self.base_url = client.API_URL.rstrip('/')
+        client._session = self
+        client.DEFAULT_TIMEOUT = self.timeout
+        return client
+
+    def endpoint(self, url):
+        if self.base_url and url.startswith(self.base_url):
+            return url[len(self.base_url):].split('?', 1)[0].strip('/') or "/"
+        return urlsplit(url).path.strip('/') or "/"
+
+    def request(self, method, url, **kwargs):
+        # finnhub.Client 总会传入自己的 DEFAULT_TIMEOUT; 未传或传 None 时使用本连接池的超时
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        started = time.perf_counter()
+        try:
+            try:
+                return super().request(method, url, **kwargs)
+            except EmptyPoolError as e:
+                # requests 不转换 urllib3 的排队超时; 统一为 requests.Timeout, 调用方按超时处理
+                raise requests.Timeout(f"{self.name} 连接池 {self.pool_timeout}s 内无空闲连接") from e
+        except requests.Timeout:
+            with self.lock:
+                self.timeouts += 1
+            raise
+        except requests.RequestException:
+            with self.lock:
+                self.errors += 1
+            raise
+        finally:
+            with self.lock:
+                self.calls += 1
+            if self.metrics:
+                self.metrics.observe(f"http_{self.name}", self.endpoint(url), time.perf_counter() - started)
+
+    def connections(self):
+        """各主机连接池累计新建的连接数 (长连接复用时远小于请求数)"""
+        pools = self.adapter.poolmanager.pools
+        return sum(getattr(pools.get(key), "num_connections", 0) for key in pools.keys())
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "connections": self.connections(),
+            "pool_size": self.adapter._pool_maxsize,
+        }
+
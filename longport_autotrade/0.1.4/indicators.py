@@ -0,0 +1,256 @@
+#!/usr/bin/python3
+"""
+增量日内指标 (每笔报价 O(1) 更新, 内存固定)
+
+  VWAP          由报价中的累计成交量 v 求增量成交量加权; 成交量回落 (新交易日) 时自动重置
+  EMA           按笔更新的指数移动平均 (span 为笔数)
+  ATR           按 bar_seconds 切分的 K 线计算真实波幅, Wilder 平滑
+  RollingWindow 最近 N 笔的均值 / 标准差 / 最高 / 最低: 定长环形数组 + 单调队列, 均摊 O(1)
+
+IndicatorBook.on_quote 可直接注册为 QuoteBook 的发布回调, 策略通过 get(symbol) 读取;
+warm() 用本地 K 线缓存 (candle_cache.py) 预热 ATR, 开盘即有可用值。
+注意: Finnhub REST quote 不含 v 字段, 此时 VWAP 为 None (feed_server / 逐笔回放数据带 v)。
+"""
+import math
+import time
+import threading
+from array import array
+from collections import deque
+
+
+class EMA:
+    __slots__ = ("alpha", "value")
+
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1)
+        self.value = None
+
+    def update(self, x):
+        self.value = x if self.value is None else self.value + self.alpha * (x - self.value)
+        return self.value
+
+
+class VWAP:
+    __slots__ = ("last_volume", "pv", "volume")
+
+    def __init__(self):
+        self.last_volume = None
+        self.pv = 0.0
+        self.volume = 0.0
+
+    def update(self, price, cum_volume):
+        if not cum_volume:
+            return self.value
+        if self.last_volume is None or cum_volume < self.last_volume:
+            # 首笔或新交易日: 以当前价作为已成交部分的近似
+            self.pv = price * cum_volume
+            self.volume = float(cum_volume)
+        else:
+            delta = cum_volume - self.last_volume
+            self.pv += price * delta
+            self.volume += delta
+        self.last_volume = cum_volume
+        return self.value
+
+    @property
+    def value(self):
+        return self.pv / self.volume if self.volume else None
+
+
+class ATR:
+    """按时间切分 K 线, 每根 K 线收盘时用 Wilder 平滑更新一次"""
+    __slots__ = ("period", "bar_seconds", "bar_id", "high", "low", "close", "prev_close", "value", "bars")
+
+    def __init__(self, period=14, bar_seconds=60):
+        self.period = period
+        self.bar_seconds = bar_seconds
+        self.bar_id = None
+        self.high = self.low = self.close = None
+        self.prev_close = None
+        self.value = None
+        self.bars = 0
+
+    def update(self, price, ts):
+        bar_id = int(ts // self.bar_seconds)
+        if bar_id != self.bar_id:
+            if self.bar_id is not None:
+                self.update_bar(self.high, self.low, self.close)
+            self.bar_id = bar_id
+            self.high = self.low = price
+        elif price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        return self.value
+
+    def add_bar(self, ts, high, low, close):
+        """历史 K 线预热: 作为正在形成的 K 线写入, 下一根到来 (或首笔报价进入新周期) 时收盘"""
+        bar_id = int(ts // self.bar_seconds)
+        if self.bar_id is not None and bar_id <= self.bar_id:
+            return
+        if self.bar_id is not None:
+            self.update_bar(self.high, self.low, self.close)
+        self.bar_id = bar_id
+        self.high, self.low, self.close = high, low, close
+
+    def update_bar(self, high, low, close):
+        tr = high - low
+        if self.prev_close is not None:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.bars += 1
+        if self.value is None:
+            self.value = tr
+        else:
+            n = min(self.bars, self.period)
+            self.value += (tr - self.value) / n
+        self.prev_close = close
+        return self.value
+
+
+class RollingWindow:
+    """最近 size 个值的均值 / 标准差 / 极值"""
+    __slots__ = ("size", "ring", "count", "total", "total_sq", "maxq", "minq")
+
+    def __init__(self, size):
+        self.size = size
+        self.ring = array('d', bytes(8 * size))
+        self.count = 0                       # 累计写入个数 (环形下标 = count % size)
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.maxq = deque()                  # (序号, 值), 值单调递减
+        self.minq = deque()                  # (序号, 值), 值单调递增
+
+    def update(self, x):
+        i = self.count
+        slot = i % self.size
+        if i >= self.size:
+            old = self.ring[slot]
+            self.total -= old
+            self.total_sq -= old * old
+        self.ring[slot] = x
+        self.total += x
+        self.total_sq += x * x
+        self.count = i + 1
+        if slot == self.size - 1:
+            # 每转一圈按环形数组重算一次, 消除加减累积的浮点误差 (均摊 O(1))
+            self.total = math.fsum(self.ring)
+            self.total_sq = math.fsum(v * v for v in self.ring)
+
+        expired = i - self.size
+        maxq, minq = self.maxq, self.minq
+        while maxq and maxq[-1][1] <= x:
+            maxq.pop()
+        maxq.append((i, x))
+        if maxq[0][0] <= expired:
+            maxq.popleft()
+        while minq and minq[-1][1] >= x:
+            minq.pop()
+        minq.append((i, x))
+        if minq[0][0] <= expired:
+            minq.popleft()
+
+    @property
+    def n(self):
+        return min(self.count, self.size)
+
+    @property
+    def full(self):
+        return self.count >= self.size
+
+    @property
+    def mean(self):
+        return self.total / self.n if self.count else None
+
+    @property
+    def std(self):
+        n = self.n
+        if n < 2:
+            return None
+        var = (self.total_sq - self.total * self.total / n) / (n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+    @property
+    def high(self):
+        return self.maxq[0][1] if self.maxq else None
+
+    @property
+    def low(self):
+        return self.minq[0][1] if self.minq else None
+
+
+class SymbolIndicators:
+    __slots__ = ("vwap", "ema_fast", "ema_slow", "atr", "window", "price", "ts", "ticks")
+
+    def __init__(self, fast=12, slow=26, atr_period=14, atr_bar_seconds=60, window=300):
+        self.vwap = VWAP()
+        self.ema_fast = EMA(fast)
+        self.ema_slow = EMA(slow)
+        self.atr = ATR(atr_period, atr_bar_seconds)
+        self.window = RollingWindow(window)
+        self.price = None
+        self.ts = None
+        self.ticks = 0
+
+    def update(self, price, cum_volume, ts):
+        self.price = price
+        self.ts = ts
+        self.ticks += 1
+        self.vwap.update(price, cum_volume)
+        self.ema_fast.update(price)
+        self.ema_slow.update(price)
+        self.atr.update(price, ts)
+        self.window.update(price)
+
+    def snapshot(self):
+        return {
+            "price": self.price,
+            "vwap": self.vwap.value,
+            "ema_fast": self.ema_fast.value,
+            "ema_slow": self.ema_slow.value,
+            "atr": self.atr.value,
+            "rolling_high": self.window.high,
+            "rolling_low": self.window.low,
+            "rolling_mean": self.window.mean,
+            "rolling_std": self.window.std,
+            "ticks": self.ticks,
+        }
+
+
+class IndicatorBook:
+    def __init__(self, symbols, **params):
+        self.params = params
+        self.indicators = {s: SymbolIndicators(**params) for s in symbols}
+        self.lock = threading.Lock()
+
+    def on_quote(self, symbol, quote):
+        """QuoteBook 发布回调: 每笔报价更新该标的全部指标"""
+        if not quote:
+            return
+        price = float(quote.get('c') or 0)
+        if price <= 0:
+            return
+        with self.lock:  # 推送模式下成交线程与底稿刷新线程可能同时发布
+            ind = self.indicators.get(symbol)
+            if ind is None:
+                ind = self.indicators[symbol] = SymbolIndicators(**self.params)
+            ind.update(price, float(quote.get('v') or 0), quote.get('t') or time.time())
+
+    def warm(self, symbol, rows, resolution):
+        """用历史 K 线 [(ts, o, h, l, c, v), ...] 预热 ATR (仅当 K 线周期与 atr_bar_seconds 一致), 返回是否预热"""
+        with self.lock:
+            ind = self.indicators.get(symbol)
+            if ind is None:
+                ind = self.indicators[symbol] = SymbolIndicators(**self.params)
+            if ind.atr.bar_seconds != resolution:
+                return False
+            for ts, _, high, low, close, _ in rows:
+                ind.atr.add_bar(ts, high, low, close)
+            return True
+
+    def get(self, symbol):
+        return self.indicators.get(symbol)
+
+    def snapshot(self, symbol):
+        ind = self.indicators.get(symbol)
+        return ind.snapshot() if ind else {}
@@ -0,0 +1,432 @@
+#!/usr/bin/python3
+"""
+历史 autotrade.log -> 逐笔数据集 -> 虚拟时钟倍速回放实盘循环
+
+* 流式解析: 逐行读取, 内存只保留当前交易日的报价; 兼容 0.1.2 ~ 0.1.4 的文本日志与 JSON lines 日志
+    - 心跳 "正在运行 | 现价 | 日涨幅" (0.1.4)、"观察中 ... 现价 | 日涨幅" (0.1.3) -> 报价
+    - "触发买入信号 ... 日涨幅" + "正在买入 ... 触发价 / 预估价格" -> 报价 + 买入事件
+    - "正在卖出 ... 原因 ... 触发价" -> 报价 + 卖出事件
+    - 没有时间戳前缀的续行 (如 502 错误页的 HTML) 直接跳过; 无后缀的旧代码 DXYZ 统一为 DXYZ.US
+* 日志只有现价与日涨幅 (两位小数), 昨收由 现价 / (1 + 日涨幅) 还原: 当日按推算值分段 (开盘前后数据源的昨收
+  可能尚未切换), 每段取中位数, 消除两位小数的舍入误差
+* 数据集与 tick_recorder.py 格式相同 (<目录>/<UTC 日期>/<标的>/ts.f8 ...), backtest.py / sweep.py --ticks 可直接读取;
+  原始买卖事件写入 <目录>/events.jsonl
+* ReplayClock: 虚拟时间按 1x ~ 1000x 流逝, 替换 time.time / time.monotonic / time.sleep、各模块的 datetime.now,
+  以及 Condition.wait (含 Event.wait / Queue.get) 的超时; 订单超时与改单、模拟券商撮合与延迟、行情等待和限流
+  都按虚拟时间计时。超过 max_gap 的空档 (休市 / 隔夜) 直接跳过。直接带超时的 Lock.acquire / Thread.join 仍为真实时间
+* replay: 把数据集按虚拟时间推送给实盘策略线程 (dxyz_strategy_logic + 模拟券商), 回放日志用同一解析器读取,
+  与原日志的买卖事件逐笔对照, 并输出决策耗时; 默认在新建的临时目录中运行, --workdir 只接受空目录
+
+用法:
+  python log_replay.py convert ../0.1.2/autotrade.log ../0.1.3/autotrade.log autotrade.log --out log_ticks --tz Asia/Shanghai
+  python log_replay.py replay log_ticks --symbol DXYZ.US --speed 1000
+"""
+import os
+import re
+import json
+import time
+import queue
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from statistics import median
+
+import pytz
+
+from market_calendar import NY
+from market_data import QuoteBook
+from tick_recorder import TickRecorder, ROW_BYTES, load_day
+
+# 保存真实时钟: 虚拟时钟安装后 time.time / time.monotonic / time.sleep 与 Condition.wait 会被替换
+_real_time = time.time
+_real_sleep = time.sleep
+_real_monotonic = time.monotonic
+_real_cond_wait = threading.Condition.wait
+
+TEXT_LINE = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3}) - \[(\w+)\] - (\S+) - (.*)$')
+HEARTBEAT = re.compile(r'\[(?P<s>[^\]]+)\] 正在运行 \| 状态: .+? \| 现价: (?P<p>[-\d.]+) \| 日涨幅: (?P<d>[-\d.]+)%')
+WATCHING = re.compile(r'观察中 (?P<s>\S+): 现价 (?P<p>[-\d.]+) \| 日涨幅 (?P<d>[-\d.]+)%')
+SIGNAL = re.compile(r'(?P<s>\S+) 触发买入信号: 日涨幅 (?P<d>[-\d.]+)%(?: \| 成交量 (?P<v>[\d.]+))?')
+BUYING = re.compile(r'正在买入 (?P<s>\S+) \| 数量: (?P<q>\d+) \| (?:触发价|预估价格): (?P<p>[\d.]+)')
+SELLING = re.compile(r'正在卖出 (?P<s>\S+) \| 原因: (?P<r>.+?) \| 触发价: (?P<p>[\d.]+)')
+
+
+# 日涨幅只保留两位小数 (0.01%), 同一昨收推算值的相对偏差不超过约 5e-5
+PREV_CLOSE_TOLERANCE = 2e-4
+
+
+def normalize_symbol(symbol):
+    """旧版本日志中的 DXYZ -> DXYZ.US (与 state_store.normalize_symbols 一致)"""
+    return symbol if "." in symbol else f"{symbol}.US"
+
+
+# ==========================================
+# 1. 流式解析
+# ==========================================
+
+def parse_lines(lines, tz=None):
+    """
+    逐行解析日志, 生成:
+      ("tick", ts, 标的, 现价, 日涨幅 (小数, 未知为 None), 成交量)
+      ("trade", ts, 标的, "buy" / "sell", 价格, 数量 (未知为 None), 原因)
+    tz = 文本日志时间所在时区 (pytz 时区); None 为本机时区
+    """
+    pending_signal = {}   # 标的 -> (日涨幅, 成交量): 买入信号行不含价格, 等紧随其后的 "正在买入" 行
+    for line in lines:
+        line = line.rstrip("\n")
+        if line.startswith("{"):
+            try:
+                entry = json.loads(line)
+                ts, msg = float(entry["ts"]), entry["msg"]
+            except (ValueError, KeyError, TypeError):
+                continue
+        else:
+            match = TEXT_LINE.match(line)
+            if not match:
+                continue  # 多行消息的续行
+            naive = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M:%S")
+            ts = (tz.localize(naive).timestamp() if tz is not None else naive.timestamp()) + int(match.group(2)) / 1000
+            msg = match.group(5)
+
+        match = HEARTBEAT.search(msg) or WATCHING.search(msg)
+        if match:
+            yield ("tick", ts, normalize_symbol(match.group("s")), float(match.group("p")),
+                   float(match.group("d")) / 100, 0.0)
+            continue
+        match = SIGNAL.search(msg)
+        if match:
+            pending_signal[normalize_symbol(match.group("s"))] = (float(match.group("d")) / 100,
+                                                                  float(match.group("v") or 0))
+            continue
+        match = BUYING.search(msg)
+        if match:
+            symbol, price = normalize_symbol(match.group("s")), float(match.group("p"))
+            day_change, volume = pending_signal.pop(symbol, (None, 0.0))
+            yield ("tick", ts, symbol, price, day_change, volume)
+            yield ("trade", ts, symbol, "buy", price, int(match.group("q")), None)
+            continue
+        match = SELLING.search(msg)
+        if match:
+            symbol, price = normalize_symbol(match.group("s")), float(match.group("p"))
+            yield ("tick", ts, symbol, price, None, 0.0)
+            yield ("trade", ts, symbol, "sell", price, None, match.group("r"))
+
+
+def read_lines(paths):
+    for path in paths:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            yield from f
+
+
+def ny_date(ts):
+    return datetime.fromtimestamp(ts, NY).date()
+
+
+# ==========================================
+# 2. 数据集
+# ==========================================
+
+class DatasetWriter:
+    """按 (标的, 纽约交易日) 缓冲报价, 换日时还原当日昨收后写入 tick_recorder 格式"""
+
+    def __init__(self, root):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.recorder = TickRecorder(root)
+        self.days = {}            # 标的 -> (交易日, [(ts, 现价, 日涨幅, 成交量)])
+        self.events = open(os.path.join(root, "events.jsonl"), 'w')
+        self.ticks = 0
+        self.trades = 0
+        self.sessions = 0
+
+    def add(self, event):
+        if event[0] == "trade":
+            _, ts, symbol, side, price, quantity, reason = event
+            self.events.write(json.dumps({"ts": round(ts, 3), "s": symbol, "side": side, "price": price,
+                                          "qty": quantity, "reason": reason}, ensure_ascii=False) + "\n")
+            self.trades += 1
+            return
+        _, ts, symbol, price, day_change, volume = event
+        day = ny_date(ts)
+        current = self.days.get(symbol)
+        if current is None or current[0] != day:
+            if current is not None:
+                self._flush(symbol, current[1])
+            current = self.days[symbol] = (day, [])
+        current[1].append((ts, price, day_change, volume))
+
+    def _flush(self, symbol, rows):
+        # 相邻报价推算出的昨收相差超过舍入误差时另起一段; 不带日涨幅的报价 (买卖行) 沿用所在段
+        segments, current = [], None
+        for ts, price, day_change, volume in rows:
+            estimate = price / (1 + day_change) if day_change is not None and day_change > -1 else None
+            if current is None or (estimate is not None and current[0]
+                                   and abs(estimate - median(current[0])) > estimate * PREV_CLOSE_TOLERANCE):
+                current = ([], [])
+                segments.append(current)
+            if estimate is not None:
+                current[0].append(estimate)
+            current[1].append((ts, price, volume))
+        for estimates, seg_rows in segments:
+            prev_close = round(median(estimates), 4) if estimates else 0.0
+            for ts, price, volume in seg_rows:
+                self.recorder.record_row(symbol, ts, price, 0.0, prev_close, volume)
+        self.ticks += self.recorder.flush()
+        self.sessions += 1
+
+    def close(self):
+        for symbol, (_, rows) in self.days.items():
+            self._flush(symbol, rows)
+        self.days = {}
+        self.events.close()
+
+
+def convert(paths, root, tz=None):
+    writer = DatasetWriter(root)
+    for event in parse_lines(read_lines(paths), tz):
+        writer.add(event)
+    writer.close()
+    return writer
+
+
+def load_dataset(root, symbol):
+    """返回 (按时间排序的 [(ts, 现价, 昨收, 成交量)], 原始买卖事件)"""
+    ticks = []
+    for day in sorted(os.listdir(root)):
+        if os.path.isdir(os.path.join(root, day, symbol)):
+            cols = load_day(root, day, symbol)
+            # 价格列为 float32, 还原到日志中的 4 位小数, 使回放报价与原始报价一致
+            ticks.extend(zip(map(float, cols["ts"]), (round(float(x), 4) for x in cols["price"]),
+                             (round(float(x), 4) for x in cols["prev_close"]), map(float, cols["volume"])))
+    ticks.sort(key=lambda row: row[0])
+    events = []
+    path = os.path.join(root, "events.jsonl")
+    if os.path.exists(path):
+        with open(path) as f:
+            events = [event for event in map(json.loads, f) if event["s"] == symbol]
+    return ticks, events
+
+
+# ==========================================
+# 3. 虚拟时钟
+# ==========================================
+
+class ReplayClock:
+    """虚拟时间从 start 开始按 speed 倍速流逝; advance_to() 遇到超过 max_gap 的空档直接跳过"""
+
+    def __init__(self, start, speed=1.0):
+        if speed <= 0:
+            raise ValueError("speed 必须大于 0")
+        self.speed = speed
+        self.anchor = (start, _real_monotonic())   # (虚拟时间, 真实单调时间), 整体替换保证读取一致
+        self.skipped = 0.0                          # 跳过的虚拟秒数
+
+    def time(self):
+        virtual, real = self.anchor
+        return virtual + (_real_monotonic() - real) * self.speed
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            _real_sleep(seconds / self.speed)
+
+    def advance_to(self, ts, max_gap=None):
+        gap = ts - self.time()
+        if gap <= 0:
+            return
+        if max_gap is not None and gap > max_gap:
+            self.anchor = (ts, _real_monotonic())
+            self.skipped += gap
+            return
+        self.sleep(gap)
+
+    def wait(self, cond, timeout=None):
+        """Condition.wait 的替身: 超时按虚拟时间计"""
+        return _real_cond_wait(cond, None if timeout is None else max(timeout, 0) / self.speed)
+
+    @contextmanager
+    def installed(self, *modules):
+        """替换 time.time / time.monotonic / time.sleep 与 Condition.wait 的超时 (进程内全部线程),
+        以及给定模块中的 datetime (now / today 返回虚拟时间)"""
+        clock = self
+
+        class VirtualDateTime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.fromtimestamp(clock.time(), tz)
+
+            @classmethod
+            def today(cls):
+                return datetime.fromtimestamp(clock.time())
+
+        patched = [(module, module.datetime) for module in modules if getattr(module, "datetime", None) is datetime]
+        time.time, time.sleep, time.monotonic = self.time, self.sleep, self.time
+        # queue / threading 在导入时绑定了 monotonic, 计算剩余等待时间时也需要虚拟时间
+        queue.time, threading._time = self.time, self.time
+        threading.Condition.wait = lambda cond, timeout=None: clock.wait(cond, timeout)
+        for module, _ in patched:
+            module.datetime = VirtualDateTime
+        try:
+            yield self
+        finally:
+            time.time, time.sleep, time.monotonic = _real_time, _real_sleep, _real_monotonic
+            queue.time, threading._time = _real_monotonic, _real_monotonic
+            threading.Condition.wait = _real_cond_wait
+            for module, original in patched:
+                module.datetime = original
+
+
+# ==========================================
+# 4. 倍速回放实盘循环
+# ==========================================
+
+class ReplayQuoteBook(QuoteBook):
+    """回放行情源: 由回放线程逐笔推送"""
+
+    def start(self):
+        pass
+
+    def push(self, symbol, quote):
+        self._publish(symbol, quote)
+
+
+def match_trades(original, replayed, tolerance):
+    """按时间顺序配对同方向、时间差不超过 tolerance 秒的买卖事件, 返回 (配对, 仅原日志, 仅回放)"""
+    pairs, unmatched = [], list(replayed)
+    only_original = []
+    for event in original:
+        candidates = [r for r in unmatched if r["side"] == event["side"] and abs(r["ts"] - event["ts"]) <= tolerance]
+        if candidates:
+            best = min(candidates, key=lambda r: abs(r["ts"] - event["ts"]))
+            unmatched.remove(best)
+            pairs.append((event, best))
+        else:
+            only_original.append(event)
+    return pairs, only_original, unmatched
+
+
+def replay(root, symbol, speed, max_gap=300.0, tolerance=120.0, workdir=None):
+    ticks, original = load_dataset(root, symbol)
+    if not ticks:
+        raise SystemExit(f"{root} 中没有 {symbol} 的报价")
+
+    # 实盘脚本在导入时创建并改写日志 / 状态文件: 只在新建的临时目录或用户指定的空目录中运行,
+    # 不会碰到实盘目录中的 trade_state.json / autotrade.log, 也不会混入上一次回放的结果
+    root = os.path.abspath(root)
+    if workdir:
+        workdir = os.path.abspath(workdir)
+        if os.path.exists(workdir) and os.listdir(workdir):
+            raise SystemExit(f"--workdir 必须是空目录或不存在的目录: {workdir}")
+        os.makedirs(workdir, exist_ok=True)
+    else:
+        workdir = tempfile.mkdtemp(prefix="log_replay_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        return _replay_in_workdir(root, symbol, speed, max_gap, tolerance, workdir, ticks, original)
+    finally:
+        os.chdir(cwd)
+
+
+def _replay_in_workdir(root, symbol, speed, max_gap, tolerance, workdir, ticks, original):
+    os.environ["BROKER_MODE"] = "sim"
+    os.environ.setdefault("FINNHUB_API_KEY", "replay")
+    os.environ["WARM_START"] = "0"
+    import longport_autotrade as live
+    import sim_broker
+    import order_manager
+
+    feed = ReplayQuoteBook([symbol])
+    feed.stale_after = live.QUOTE_STALE_SECONDS or None
+    live.quote_feed = feed
+    live.is_market_open = lambda: True   # 数据集只含交易时段内的报价, 空档由时钟跳过
+    config = live.TARGET_STOCKS.setdefault(symbol, {"budget": 1000, "strategy_type": "dxyz_dynamic"})
+
+    clock = ReplayClock(ticks[0][0], speed)
+    running = threading.Event()
+    running.set()
+    started = _real_monotonic()
+    with clock.installed(live, sim_broker, order_manager):
+        live.state_manager.reset_state()
+        live.trader.orders.start()
+        worker = threading.Thread(target=live.dxyz_strategy_logic, args=(symbol, config, running),
+                                  name=f"Thread-{symbol}", daemon=True)
+        worker.start()
+        for ts, price, prev_close, volume in ticks:
+            clock.advance_to(ts, max_gap)
+            feed.push(symbol, {"c": price, "pc": prev_close, "v": volume, "t": ts})
+        # 留出最后一笔的下单、撤单 / 改单与成交 (虚拟时间)
+        clock.sleep(max(60, live.ORDER_TIMEOUT * (live.ORDER_MAX_REPLACES + 2)))
+        running.clear()
+        feed.stop()
+        worker.join(timeout=5)
+        live.trader.orders.stop()
+        if hasattr(live.trader.ctx, "stop"):
+            live.trader.ctx.stop()
+        live.log_listener.stop()
+    elapsed = _real_monotonic() - started
+
+    replayed = [{"ts": ts, "s": s, "side": side, "price": price, "qty": qty, "reason": reason}
+                for kind, ts, s, side, price, qty, reason in
+                (e for e in parse_lines(read_lines([os.path.join(workdir, "autotrade.log")])) if e[0] == "trade")
+                if s == symbol]
+    virtual = ticks[-1][0] - ticks[0][0] - clock.skipped
+    decisions = [row for row in live.metrics.summary() if row[0] == "decision" and row[1] == symbol]
+    return {
+        "ticks": len(ticks), "virtual_seconds": virtual, "skipped_seconds": clock.skipped, "wall_seconds": elapsed,
+        "original": original, "replayed": replayed, "decisions": decisions, "workdir": workdir,
+        "matches": match_trades(original, replayed, tolerance),
+    }
+
+
+def fmt_ts(ts):
+    return datetime.fromtimestamp(ts, NY).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="历史日志转逐笔数据集 / 倍速回放")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("convert", help="日志 -> 逐笔数据集")
+    p.add_argument("logs", nargs="+")
+    p.add_argument("--out", default="log_ticks")
+    p.add_argument("--tz", help="文本日志时间的时区 (如 Asia/Shanghai), 默认本机时区")
+    p = sub.add_parser("replay", help="倍速回放数据集并与原日志的买卖对照")
+    p.add_argument("root")
+    p.add_argument("--symbol", default="DXYZ.US")
+    p.add_argument("--speed", type=float, default=100.0, help="回放倍速 (1 ~ 1000)")
+    p.add_argument("--max-gap", type=float, default=300.0, help="超过该秒数的空档直接跳过")
+    p.add_argument("--tolerance", type=float, default=120.0, help="买卖事件配对允许的时间差 (秒)")
+    p.add_argument("--workdir", help="回放工作目录 (日志 / 状态文件), 必须为空或不存在; 默认新建临时目录")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        started = time.perf_counter()
+        tz = pytz.timezone(args.tz) if args.tz else None
+        writer = convert(args.logs, args.out, tz)
+        print(f"{args.out}: {writer.ticks} 笔报价 ({writer.ticks * ROW_BYTES} 字节), {writer.trades} 笔买卖, "
+              f"{writer.sessions} 个 (标的, 交易日) | 耗时 {time.perf_counter() - started:.2f}s")
+        return
+
+    if not 1 <= args.speed <= 1000:
+        parser.error("--speed 取值范围 1 ~ 1000")
+    r = replay(args.root, args.symbol, args.speed, args.max_gap, args.tolerance, args.workdir)
+    print(f"回放 {args.symbol}: {r['ticks']} 笔报价 | 虚拟 {r['virtual_seconds'] / 3600:.2f} 小时 "
+          f"(跳过空档 {r['skipped_seconds'] / 3600:.1f} 小时) | 实际 {r['wall_seconds']:.1f}s | "
+          f"等效 {r['virtual_seconds'] / r['wall_seconds']:.0f}x")
+    for stage, symbol, count, avg, p50, p99 in r["decisions"]:
+        print(f"决策耗时: {count} 次 | 平均 {avg:.3f}ms | p50 {p50:.3f}ms | p99 {p99:.3f}ms")
+    pairs, only_original, only_replayed = r["matches"]
+    print(f"买卖对照 (容差 {args.tolerance:.0f}s): 一致 {len(pairs)} | 仅原日志 {len(only_original)} | "
+          f"仅回放 {len(only_replayed)}")
+    for event, got in pairs:
+        print(f"  = {event['side']:<4} {fmt_ts(event['ts'])} ET @ {event['price']} | 回放 {fmt_ts(got['ts'])} @ {got['price']}")
+    for event in only_original:
+        print(f"  - {event['side']:<4} {fmt_ts(event['ts'])} ET @ {event['price']} {event['reason'] or ''}")
+    for event in only_replayed:
+        print(f"  + {event['side']:<4} {fmt_ts(event['ts'])} ET @ {event['price']} {event['reason'] or ''}")
+    print(f"回放日志: {os.path.join(r['workdir'], 'autotrade.log')}")
+
+
+if __name__ == "__main__":
+    main()
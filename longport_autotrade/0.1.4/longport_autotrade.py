@@ -2,17 +2,36 @@
 import os
 import sys
 import time
-import json
 import signal
+import asyncio
 import threading
 import logging
-from datetime import datetime, timedelta, time as dtime
-from decimal import Decimal
+from datetime import datetime, timedelta
 
 # 第三方库
 import finnhub
-import pytz  # [新增] 用于处理美股时区(冬令时/夏令时)
-from longport.openapi import TradeContext, Config, OrderType, OrderSide, TimeInForceType
+from longport.openapi import TradeContext, QuoteContext, Config, OrderSide
+
+# 本地模块
+from market_data import QuotePoller, FinnhubStreamFeed, FinnhubSource  # [新增] 共享行情源 (轮询 / 推送)
+from quote_sources import HedgedQuoteSource, LongportQuoteSource  # [新增] 多数据源对冲报价
+from strategy import dxyz_decide, dxyz_poll_interval    # [新增] 纯规则函数，线程 / asyncio 共用
+from strategy import DXYZ_TRAILING_LADDER, normalize_ladder, sell_triggers, raise_triggers  # [新增] 逐标的阶梯表与预计算触发价
+from engine import AsyncStrategyEngine                  # [新增] asyncio 策略引擎
+from batch_engine import BatchStrategyEngine            # [新增] 全部标的批量向量化评估
+from state_store import JournalStore, SqliteStore, normalize_symbols  # [新增] 状态持久化后端
+from tick_recorder import TickRecorder                  # [新增] 逐笔行情列式记录
+from rate_limiter import RateLimiter, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, is_rate_limit_error  # [新增] 进程级限流
+from sim_broker import SimTradeContext                  # [新增] 本地模拟券商
+from order_manager import OrderManager                  # [新增] 异步下单与成交回报
+from metrics import Metrics, MetricsServer              # [新增] 分阶段耗时统计
+from async_log import setup_logging                     # [新增] 后台线程写日志
+from market_calendar import SessionCalendar, NY         # [新增] 预计算交易日历 (含休市 / 提前收盘)
+from indicators import IndicatorBook                    # [新增] 增量日内指标
+from bars import BarAggregator                          # [新增] 逐笔报价聚合为 OHLCV K 线
+from candle_cache import CandleCache, FinnhubCandleSource  # [新增] 本地历史 K 线缓存 (启动预热)
+from http_transport import PooledSession                # [新增] REST 长连接池 + 超时
+from position_book import PositionBook                  # [新增] 分片、写时复制的持仓表 (读取不加锁)
 
 # ==========================================
 # 1. 用户配置区域 (可在此修改策略参数)
@@ -20,6 +39,7 @@ from longport.openapi import TradeContext, Config, OrderType, OrderSide, TimeInF
 
 # 交易目标配置
 # 格式: {"TICKER": {"budget": 投资金额(USD), "strategy_type": "dxyz_momentum"}}
+# [新增] 可选 "ladder": [(最高浮盈阈值, 允许回撤), ...] 为该标的单独设置阶梯移动止盈，未设置则使用 strategy.DXYZ_TRAILING_LADDER
 TARGET_STOCKS = {
     "DXYZ.US": {                 # [修改] 适配长桥 OpenAPI 规范，必须加上市场后缀 .US
         "budget": 1000,          # 投资该股票的总金额
@@ -27,8 +47,45 @@ TARGET_STOCKS = {
     }
 }
 
+# [新增] 交易所临时休市日 (如国葬日)，常规休市与提前收盘由 market_calendar.py 自动推算
+MARKET_EXTRA_HOLIDAYS = []      # 例: ["2025-01-09"]
+
 # 全局策略参数
 POLLING_INTERVAL = 5            # 监控频率 (秒)
+QUOTE_STALE_SECONDS = int(os.getenv("QUOTE_STALE_SECONDS", "300"))  # [新增] 报价时间戳 t 超过该秒数未更新视为过期，不据此买入 (0 = 不检查)；持仓的止损 / 止盈不受影响 (冷门股数分钟无成交很常见)
+HEARTBEAT_INTERVAL = 10         # [新增] 心跳日志间隔 (秒)，推送模式下按时间而非循环次数打印
+HEARTBEAT_MAX_SILENCE = 300     # [新增] 持仓状态与现价都未变化时心跳去重，最长静默 (秒) 后仍打印一次
+
+# [新增] 自适应轮询节奏 (仅轮询模式): 把有限的行情额度留给离卖出触发价最近的持仓
+ADAPTIVE_POLLING = True
+POLL_CADENCE = {
+    "fast": 1,                  # 持仓且距卖出触发价不足 NEAR_STOP_PCT
+    "normal": POLLING_INTERVAL, # 普通持仓 / 接近买入阈值的空仓标的
+    "slow": 30,                 # 空仓且日涨幅距买入阈值超过 FAR_FROM_ENTRY_PCT
+    "idle": 60,                 # 冷却期
+}
+NEAR_STOP_PCT = 0.01
+FAR_FROM_ENTRY_PCT = 0.02
+
+# [新增] 行情源: "poll" = 每 POLLING_INTERVAL 轮询 REST; "stream" = 订阅 Finnhub 成交推送，逐笔触发策略
+QUOTE_FEED_MODE = os.getenv("QUOTE_FEED_MODE", "poll")
+
+# [新增] 报价数据源 (逗号分隔，第一个为初始主源): "finnhub" / "longport" / "finnhub@<备用 API 地址>"
+#        多个数据源时主源超过 QUOTE_HEDGE_AFTER 秒未返回即同时请求下一个，取最先返回的有效报价，并按延迟与错误率自动切换主源
+QUOTE_SOURCES = os.getenv("QUOTE_SOURCES", "finnhub")
+QUOTE_HEDGE_AFTER = 0.3
+QUOTE_SOURCE_TIMEOUT = 5        # 单次报价全部数据源的总超时 (秒)
+
+# [新增] Finnhub REST 共享连接池: 所有线程复用最多 HTTP_POOL_SIZE 条长连接；服务器卡住时最多阻塞 HTTP_READ_TIMEOUT 秒
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "8"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "5"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "3"))  # 连接全部被占用时最多排队的秒数
+
+# [新增] 策略引擎: "thread" = 每个标的一个线程; "asyncio" = 所有标的协程共用一个事件循环;
+#        "batch" = 单线程每轮用 NumPy 数组一次评估全部标的，只处理需要动作的标的 (标的很多时使用)
+ENGINE_MODE = os.getenv("ENGINE_MODE", "thread")
+EXECUTOR_WORKERS = 8            # asyncio 模式下下单 / 写状态等阻塞调用的线程池上限
 STOP_LOSS_PCT = 0.06            # [修改] 硬止损线: 从 0.03 (3%) 调整为 0.06 (6%)，防止高波动股票正常洗盘被震出局
 BUY_MOMENTUM_THRESHOLD = 0.015  # 买入动量阈值 (日内涨幅超过 1.5% 且趋势向上才买)
 
@@ -39,15 +96,66 @@ COOLDOWN_MINUTES = 30           # [新增] 1.A 卖出后冷却时间(分钟)，
 # [新增] 3.a 最小成交量过滤 (防止无量空涨)
 MIN_VOLUME_THRESHOLD = 10000    
 
+# [新增] 增量日内指标 (每笔报价 O(1) 更新): EMA 按笔数，ATR 按 atr_bar_seconds 秒 K 线，滚动极值按最近 window 笔
+INDICATOR_PARAMS = {"fast": 12, "slow": 26, "atr_period": 14, "atr_bar_seconds": 60, "window": 300}
+BUY_ABOVE_VWAP = False          # [新增] 买入信号额外要求现价高于当日 VWAP (无成交量数据时不生效)
+
+# [新增] K 线聚合: 周期 (秒) -> 保留根数，缓冲区启动时一次性分配，内存不随运行时间增长
+BAR_INTERVALS = {1: 900, 60: 480, 300: 200}
+
+# [新增] 历史 K 线缓存: 启动时从本地文件预热 K 线与 ATR，后台只补拉缺失部分 (WARM_START=0 关闭)
+WARM_START = os.getenv("WARM_START", "1") == "1"
+CANDLE_CACHE_DIR = "candles"
+CANDLE_CACHE_DAYS = 5           # 保留天数，需覆盖最长周期 K 线缓冲区 (5 分钟 x 200 根约 3 个交易日)
+CANDLE_RESOLUTION = 60          # 缓存 K 线周期 (秒)，与 INDICATOR_PARAMS["atr_bar_seconds"] 一致时同时预热 ATR
+
+# [新增] 进程级限流额度: 名称 -> (次数, 时间窗口秒, 突发上限)，所有线程/协程共享
+RATE_LIMITS = {
+    "finnhub": (60, 60, 10),        # Finnhub 免费版 60 次/分钟
+    "longport_trade": (30, 30, 10), # 长桥交易接口 30 秒内不超过 30 次
+}
+ORDER_RATE_WAIT = 5             # 下单最多排队等待令牌的秒数，超时放弃本次下单
+ORDER_WORKERS = 2               # [新增] 下单执行线程数
+ORDER_TIMEOUT = 10              # [新增] 当日单超过该秒数未完全成交: 买单撤单，卖单按最新价改单
+ORDER_MAX_REPLACES = 3          # [新增] 卖单最多改单次数，之后撤单，由策略重新触发卖出
+ORDER_STATUS_POLL = 5           # [新增] 超过该秒数未收到订单推送则主动查询订单状态
+RATE_LIMIT_BACKOFF = 10         # 下单收到限流错误后整体暂停的秒数
+
+# [新增] 逐笔行情记录 (可选): 每笔报价按列追加到 TICK_DATA_DIR/日期/代码/*.f4|f8，供回测与复盘
+RECORD_TICKS = os.getenv("RECORD_TICKS", "0") == "1"
+TICK_DATA_DIR = "ticks"
+
+# [新增] 券商: "live" = 长桥 TradeContext; "sim" = 本地模拟券商 (不需要长桥密钥，用于离线联调与下单延迟压测)
+BROKER_MODE = os.getenv("BROKER_MODE", "live")
+SIM_BROKER = {
+    "latency": 0.05,            # 单次调用网络往返 (秒)
+    "jitter": 0.02,             # 额外延迟 (指数分布均值，秒)，制造长尾
+    "reject_rate": 0.0,         # 随机拒单概率
+    "partial_fill_rate": 0.3,   # 每次撮合只成交一部分的概率
+    "fill_interval": 0.2,       # 撮合检查间隔 (秒)
+    "cash": 100000,             # 初始资金 (USD)
+}
+
+# [新增] 分阶段耗时统计: 本地 Prometheus 端点 (0 = 不开端口)，退出时写入 METRICS_DUMP_FILE
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+METRICS_DUMP_FILE = "latency_metrics.prom"
+
 # 状态文件路径
 STATE_FILE = "trade_state.json"
+STATE_JOURNAL_FILE = "trade_state.journal"  # [新增] 状态变更追加日志，与快照合并恢复
+STATE_FLUSH_INTERVAL = 1.0                  # [新增] 后台批量落盘间隔 (秒)；sqlite 后端只用于持仓最高价
+STATE_COMPACT_EVERY = 500                   # [新增] journal 累计多少条后压缩为新快照
+STATE_SHARDS = 16                           # [新增] 持仓表分片数: 不同分片的写入互不阻塞，读取不加锁
 
-# 日志设置
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - [%(levelname)s] - %(threadName)s - %(message)s',
-    handlers=[logging.StreamHandler(), logging.FileHandler("autotrade.log")]
-)
+# [新增] 状态后端: "json" = 快照 + journal; "sqlite" = SQLite (WAL) 每个标的一行，首次启动自动迁移旧 JSON
+STATE_BACKEND = os.getenv("STATE_BACKEND", "json")
+STATE_DB_FILE = "trade_state.db"
+
+# [新增] 日志格式: "text" = 原文本格式; "json" = 文件按 JSON lines 写入 (控制台仍为文本)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+
+# 日志设置 ([修改] 业务线程只入队，由后台线程写控制台与 autotrade.log；同一消息键限频 / 去重)
+log_listener = setup_logging("autotrade.log", json_format=(LOG_FORMAT == "json"))
 logger = logging.getLogger(__name__)
 
 # ==========================================
@@ -61,21 +169,71 @@ def get_env_variable(var_name):
         sys.exit(1)
     return value
 
-# 读取环境变量
-LP_APP_KEY = get_env_variable("LONGPORT_APP_KEY")
-LP_APP_SECRET = get_env_variable("LONGPORT_APP_SECRET")
-LP_ACCESS_TOKEN = get_env_variable("LONGPORT_ACCESS_TOKEN")
+# 读取环境变量 ([修改] 模拟券商模式不需要长桥密钥)
+if BROKER_MODE != "sim":
+    LP_APP_KEY = get_env_variable("LONGPORT_APP_KEY")
+    LP_APP_SECRET = get_env_variable("LONGPORT_APP_SECRET")
+    LP_ACCESS_TOKEN = get_env_variable("LONGPORT_ACCESS_TOKEN")
 FINNHUB_API_KEY = get_env_variable("FINNHUB_API_KEY")
 
-# 初始化 Finnhub
+# [新增] 逐标的阶梯表: 启动时校验并排序，配置错误直接报错退出
+for _ticker, _config in TARGET_STOCKS.items():
+    _config["ladder"] = normalize_ladder(_config.get("ladder", DXYZ_TRAILING_LADDER))
+
+# [新增] 各接口共享的限流器
+rate_limiters = {name: RateLimiter(name, rate, per, burst) for name, (rate, per, burst) in RATE_LIMITS.items()}
+
+# [新增] 行情请求 / 决策 / 下单 / 状态写入 / 日志 各阶段耗时直方图
+metrics = Metrics()
+
+# 初始化 Finnhub (地址可用环境变量指向本地替身服务器 feed_server.py，便于离线测试)
 finnhub_client = finnhub.Client(api_key=FINNHUB_API_KEY)
+finnhub_client.API_URL = os.getenv("FINNHUB_API_URL", finnhub_client.API_URL)
+
+# [新增] 替换 finnhub.Client 内部的 session: 共享有界长连接池、(连接, 读取) 超时，每次请求耗时记入 metrics
+http_sessions = {}
+
+def pooled_client(client, name):
+    session = PooledSession(name, pool_size=HTTP_POOL_SIZE, connect_timeout=HTTP_CONNECT_TIMEOUT,
+                            read_timeout=HTTP_READ_TIMEOUT, pool_timeout=HTTP_POOL_TIMEOUT, metrics=metrics)
+    http_sessions[name] = session
+    return session.install(client)
+
+pooled_client(finnhub_client, "finnhub")
+FINNHUB_WS_URL = os.getenv("FINNHUB_WS_URL", f"wss://ws.finnhub.io?token={FINNHUB_API_KEY}")
 
 # 初始化 Longport Config
 lp_config = Config(
     app_key=LP_APP_KEY,
     app_secret=LP_APP_SECRET,
     access_token=LP_ACCESS_TOKEN
-)
+) if BROKER_MODE != "sim" else None
+
+def build_quote_source():
+    """[新增] 按 QUOTE_SOURCES 组装报价数据源；只有一个时直接使用，不经过对冲"""
+    sources = []
+    for name in (item.strip() for item in QUOTE_SOURCES.split(',') if item.strip()):
+        if name == "finnhub":
+            sources.append(FinnhubSource(finnhub_client))
+        elif name.startswith("finnhub@"):
+            backup = finnhub.Client(api_key=FINNHUB_API_KEY)
+            backup.API_URL = name.split('@', 1)[1]
+            sources.append(FinnhubSource(pooled_client(backup, f"finnhub_backup{len(http_sessions)}"), name))
+        elif name == "longport":
+            if lp_config is None:
+                logger.warning("模拟券商模式未配置长桥密钥，忽略 longport 行情源")
+                continue
+            sources.append(LongportQuoteSource(QuoteContext(lp_config)))
+        else:
+            logger.warning(f"未知行情源 {name}，已忽略")
+    if not sources:
+        sources.append(FinnhubSource(finnhub_client))
+    if len(sources) == 1:
+        return sources[0]
+    logger.info(f"多数据源报价: {[source.name for source in sources]} (对冲延迟 {QUOTE_HEDGE_AFTER}s)")
+    return HedgedQuoteSource(sources, hedge_after=QUOTE_HEDGE_AFTER, timeout=QUOTE_SOURCE_TIMEOUT)
+
+quote_source = build_quote_source()
 
 # ==========================================
 # 3. 状态管理 (断点续传 & 冷却期)
@@ -83,89 +241,125 @@ lp_config = Config(
 
 class StateManager:
     def __init__(self):
-        self.state = {}
-        # 【关键修复】：将普通的 Lock 改为 RLock (可重入锁)，防止同线程死锁
-        self.lock = threading.RLock()
+        # [修改] 原先全部标的一个嵌套 dict + 一把 RLock，读写全部互斥；
+        #        现为按标的分片的不可变记录 (__slots__)，读取直接取当前记录不加锁，写入只锁该标的所在分片
+        self.book = PositionBook(STATE_SHARDS)
+        # [新增] 变更只记录该标的的字段，不再每次全量重写 JSON
+        if STATE_BACKEND == "sqlite":
+            self.store = SqliteStore(STATE_DB_FILE, STATE_FILE, STATE_JOURNAL_FILE, STATE_FLUSH_INTERVAL)
+        else:
+            self.store = JournalStore(STATE_FILE, STATE_JOURNAL_FILE, STATE_FLUSH_INTERVAL, STATE_COMPACT_EVERY)
+
+    @property
+    def version(self):
+        """[新增] 每次变更后更新，批量引擎据此判断是否需要重新同步持仓数组"""
+        return self.book.version
+
+    def locked(self, symbol):
+        """[新增] 该标的的读改写锁 (可重入，只与同一分片的写入互斥)"""
+        return self.book.locked(symbol)
+
+    def has_saved_state(self):
+        return self.store.exists()
 
     def load_state(self):
-        if os.path.exists(STATE_FILE):
+        if self.store.exists():
             try:
-                with open(STATE_FILE, 'r') as f:
-                    self.state = json.load(f)
+                # [修改] json: 快照 + journal 重放; sqlite: 读表 (首次自动从旧 JSON 迁移)
+                state = self.store.load()
                 
                 # 【防重复买入修复】：自动将旧记录 "DXYZ" 转换为 "DXYZ.US"
-                old_keys = list(self.state.keys())
-                for key in old_keys:
-                    if "." not in key:
-                        new_key = f"{key}.US"
-                        self.state[new_key] = self.state.pop(key)
+                normalize_symbols(state)
+                self.book.load(state)
                 
                 logger.info("已加载上次的交易状态 (并自动适配最新代码格式)。")
                 self.save_state() # 立即覆盖保存一次
             except Exception as e:
                 logger.error(f"加载状态失败: {e}")
-                self.state = {}
+                self.book.clear()
         else:
-            self.state = {}
+            self.book.clear()
+
+    def snapshot(self):
+        """返回当前状态的副本 {标的: dict} (供快照压缩使用)"""
+        return self.book.to_dict()
+
+    def records(self):
+        """[新增] 当前全部记录 {标的: PositionRecord}，不加锁、不复制 (记录不可变)"""
+        return self.book.snapshot()
 
     def save_state(self):
-        with self.lock:
-            with open(STATE_FILE, 'w') as f:
-                json.dump(self.state, f, indent=4)
+        """立即写入完整状态；仅在启动/退出等非热路径调用"""
+        started = time.perf_counter()
+        self.store.save(self.snapshot)
+        metrics.observe("save_state", "_all", time.perf_counter() - started)
         logger.info("交易状态已保存。")
 
+    def start_writer(self):
+        self.store.start(self.snapshot)
+
+    def stop_writer(self):
+        self.store.stop()
+
     def reset_state(self):
-        self.state = {}
+        self.book.clear()
         self.save_state()
         logger.info("交易状态已重置。")
 
     def update_position(self, symbol, quantity, avg_price, high_price):
-        with self.lock:
-            if symbol not in self.state:
-                self.state[symbol] = {}
-            
-            if quantity == 0:
-                # 清空持仓数据，但保留冷却时间等元数据
-                self.state[symbol]["quantity"] = 0
-                self.state[symbol]["entry_price"] = 0
-                self.state[symbol]["highest_price"] = 0
-            else:
-                self.state[symbol].update({
-                    "quantity": quantity,
-                    "entry_price": avg_price,
-                    "highest_price": high_price,
-                    "last_update": str(datetime.now())
-                })
-            self.save_state()
+        started = time.perf_counter()
+        if quantity == 0:
+            # 清空持仓数据，但保留冷却时间等元数据
+            fields = {"quantity": 0, "entry_price": 0, "highest_price": 0}
+        else:
+            fields = {
+                "quantity": quantity,
+                "entry_price": avg_price,
+                "highest_price": high_price,
+                "last_update": str(datetime.now())
+            }
+        with self.book.locked(symbol):
+            self.book.update(symbol, **fields)
+            # [修改] 只记录本次变更，由后台线程批量落盘 (在分片锁内记录，保证同一标的的变更顺序)
+            self.store.record(symbol, fields)
+        metrics.observe("save_state", symbol, time.perf_counter() - started)
 
     def get_position(self, symbol):
-        with self.lock:
-            # 只有当 quantity > 0 时才认为有持仓
-            data = self.state.get(symbol, {})
-            if data.get("quantity", 0) > 0:
-                return data
-            return None
+        # [修改] 不加锁: 返回的记录不可变，读到的总是某次写入后的完整状态
+        record = self.book.get(symbol)
+        # 只有当 quantity > 0 时才认为有持仓
+        if record is not None and record.quantity > 0:
+            return record
+        return None
+
+    def update_highest(self, symbol, high_price):
+        """[新增] 只更新持仓最高价"""
+        started = time.perf_counter()
+        with self.book.locked(symbol):
+            record = self.book.get(symbol)
+            if record is None or record.quantity <= 0:
+                return
+            self.book.update(symbol, highest_price=high_price)
+            self.store.record(symbol, {"highest_price": high_price})
+        metrics.observe("save_state", symbol, time.perf_counter() - started)
 
     # [新增] 1.A 设置冷却期 (解决死循环买入问题)
     def set_cooldown(self, symbol):
-        with self.lock:
-            if symbol not in self.state:
-                self.state[symbol] = {}
-            # 设置未来解除锁定的时间戳
-            unlock_time = datetime.now() + timedelta(minutes=COOLDOWN_MINUTES)
-            self.state[symbol]["cooldown_until"] = unlock_time.timestamp()
-            self.save_state()
-            logger.info(f"[{symbol}] 进入冷却期，{COOLDOWN_MINUTES}分钟内不执行买入。")
+        # 设置未来解除锁定的时间戳
+        unlock_time = datetime.now() + timedelta(minutes=COOLDOWN_MINUTES)
+        with self.book.locked(symbol):
+            self.book.update(symbol, cooldown_until=unlock_time.timestamp())
+            self.store.record(symbol, {"cooldown_until": unlock_time.timestamp()})
+        logger.info(f"[{symbol}] 进入冷却期，{COOLDOWN_MINUTES}分钟内不执行买入。")
 
     # [新增] 1.A 检查是否在冷却期
     def is_in_cooldown(self, symbol):
-        with self.lock:
-            data = self.state.get(symbol, {})
-            cooldown_ts = data.get("cooldown_until", 0)
-            # 如果当前时间小于解锁时间，说明还在冷却中
-            if cooldown_ts and time.time() < cooldown_ts:
-                return True
-            return False
+        record = self.book.get(symbol)
+        cooldown_ts = record.cooldown_until if record is not None else 0
+        # 如果当前时间小于解锁时间，说明还在冷却中
+        if cooldown_ts and time.time() < cooldown_ts:
+            return True
+        return False
 
 state_manager = StateManager()
 
@@ -175,12 +369,27 @@ state_manager = StateManager()
 
 class Trader:
     def __init__(self):
-        try:
-            self.ctx = TradeContext(lp_config)
-            logger.info("Longport 交易环境连接成功")
-        except Exception as e:
-            logger.error(f"Longport 连接失败: {e}")
-            sys.exit(1)
+        if BROKER_MODE == "sim":
+            # [新增] 模拟券商按共享行情源的最新价撮合，策略与下单代码不变
+            self.ctx = SimTradeContext(last_price, **SIM_BROKER)
+        else:
+            try:
+                self.ctx = TradeContext(lp_config)
+                logger.info("Longport 交易环境连接成功")
+            except Exception as e:
+                logger.error(f"Longport 连接失败: {e}")
+                sys.exit(1)
+
+        # [新增] 下单交给执行线程，策略线程不再阻塞等待券商返回；持仓按实际成交更新
+        self.orders = OrderManager(
+            self.ctx, self.on_fill, last_price,
+            limiter=rate_limiters["longport_trade"], rate_wait=ORDER_RATE_WAIT, rate_backoff=RATE_LIMIT_BACKOFF,
+            is_rate_limit_error=is_rate_limit_error, timeout=ORDER_TIMEOUT, max_replaces=ORDER_MAX_REPLACES,
+            status_poll=ORDER_STATUS_POLL, slippage_pct=SLIPPAGE_PCT, workers=ORDER_WORKERS, metrics=metrics,
+        )
+
+    def has_working_order(self, symbol):
+        return self.orders.has_working_order(symbol)
 
     def execute_buy(self, symbol, budget, current_price):
         """执行买入 (优化了价格计算和资金检查)"""
@@ -197,23 +406,9 @@ class Trader:
         limit_price = current_price * (1 + SLIPPAGE_PCT)
         
         logger.info(f"正在买入 {symbol} | 数量: {quantity} | 触发价: {current_price} | 限价: {limit_price:.2f}")
-        
-        try:
-            self.ctx.submit_order(
-                symbol,                         # 1. 股票代码
-                OrderType.LO,                   # 2. 订单类型: 限价单
-                OrderSide.Buy,                  # 3. 买卖方向: 买入
-                Decimal(str(quantity)),         # 4. 提交数量: 必须是 Decimal 对象
-                TimeInForceType.Day,            # 5. 订单有效期: 当日有效
-                submitted_price=Decimal(f"{limit_price:.2f}") # 6. 限价价格
-            )
-            # 更新状态
-            state_manager.update_position(symbol, quantity, current_price, current_price)
-            logger.info(f"买入指令已发送: {symbol}")
-            return True
-        except Exception as e:
-            logger.error(f"买入失败 {symbol}: {e}")
-            return False
+
+        # [修改] 只入队，由执行线程提交；持仓在收到成交后更新 (见 on_fill)
+        return self.orders.submit(symbol, OrderSide.Buy, quantity, limit_price, PRIORITY_NORMAL)
 
     def execute_sell(self, symbol, quantity, current_price, reason="Unknown"):
         """执行卖出"""
@@ -221,25 +416,33 @@ class Trader:
         limit_price = current_price * (1 - SLIPPAGE_PCT)
         
         logger.info(f"正在卖出 {symbol} | 原因: {reason} | 触发价: {current_price} | 限价: {limit_price:.2f}")
-        try:
-            self.ctx.submit_order(
-                symbol,
-                OrderType.LO,
-                OrderSide.Sell,
-                Decimal(str(quantity)),
-                TimeInForceType.Day,
-                submitted_price=Decimal(f"{limit_price:.2f}")
-            )
+        # [修改] 卖单优先于买单；全部卖出成交后才清空持仓并进入冷却期
+        return self.orders.submit(symbol, OrderSide.Sell, quantity, limit_price, PRIORITY_HIGH)
+
+    def on_fill(self, symbol, side, quantity, price):
+        """[新增] 按实际成交更新持仓 (由订单推送线程或执行线程调用)"""
+        with state_manager.locked(symbol):  # 读改写期间不让策略线程插入最高价更新
+            position = state_manager.get_position(symbol)
+            held = position['quantity'] if position else 0
+            if side == OrderSide.Buy:
+                total = held + quantity
+                entry_price = (position['entry_price'] * held + price * quantity) / total if position else price
+                highest_price = max(position['highest_price'], price) if position else price
+                state_manager.update_position(symbol, total, entry_price, highest_price)
+                return
+
+            remaining = held - quantity
+            if remaining > 0:
+                state_manager.update_position(symbol, remaining, position['entry_price'], position['highest_price'])
+                return
             state_manager.update_position(symbol, 0, 0, 0) # 清空持仓
-            
-            # [新增] 1.A 卖出成功后，触发冷却期，防止立即买回
+            # [新增] 1.A 卖出成交后，触发冷却期，防止立即买回
             state_manager.set_cooldown(symbol)
-            
-            logger.info(f"卖出指令已发送: {symbol}")
-            return True
-        except Exception as e:
-            logger.error(f"卖出失败 {symbol}: {e}")
-            return False
+
+def last_price(symbol):
+    """[新增] 共享行情源中该标的的最新价 (模拟券商撮合用)"""
+    quote, _ = quote_feed.get_quote(symbol)
+    return float(quote.get('c', 0)) if quote else 0
 
 trader = Trader()
 
@@ -247,146 +450,347 @@ trader = Trader()
 # 5. 策略引擎 (DXYZ 核心逻辑)
 # ==========================================
 
+# [修改] 交易时段改为启动时预计算 (UTC 时间戳，含节假日与提前收盘)，每次检查只是查表
+market_calendar = SessionCalendar(extra_holidays=MARKET_EXTRA_HOLIDAYS)
+shutdown_event = threading.Event()  # [新增] 退出时唤醒休市期间休眠的线程
+
 # [新增] 1.B & 4.c 智能交易时间检查函数
 def is_market_open():
-    """检查当前是否为美股交易时间 (09:30 - 16:00 ET)"""
-    try:
-        tz_ny = pytz.timezone('America/New_York')
-        now_utc = datetime.now(pytz.utc)
-        now_ny = now_utc.astimezone(tz_ny)
-        
-        if now_ny.weekday() >= 5:
-            return False
+    """检查当前是否为美股交易时段 (09:30 - 16:00 ET，提前收盘日 13:00，节假日休市)"""
+    return market_calendar.is_open()
+
+def seconds_until_open():
+    """[新增] 距下次开盘的秒数 (休市期间直接休眠到开盘，不再每分钟醒来检查)"""
+    return market_calendar.seconds_until_open()
+
+def quote_priority(symbol):
+    """[新增] 行情请求优先级: 持仓 > 空仓 > 冷却期"""
+    if state_manager.get_position(symbol):
+        return PRIORITY_HIGH
+    if state_manager.is_in_cooldown(symbol):
+        return PRIORITY_LOW
+    return PRIORITY_NORMAL
+
+def quote_interval(symbol, quote):
+    """[新增] 按持仓 / 冷却 / 距触发价远近给出该标的的轮询间隔"""
+    position = state_manager.get_position(symbol)
+    in_cooldown = position is None and state_manager.is_in_cooldown(symbol)
+    return dxyz_poll_interval(quote, position, in_cooldown, STOP_LOSS_PCT, BUY_MOMENTUM_THRESHOLD,
+                              POLL_CADENCE, NEAR_STOP_PCT, FAR_FROM_ENTRY_PCT, symbol_ladder(symbol))
+
+# [新增] 全部标的共用一个行情源: 轮询模式每轮每个标的只请求一次 Finnhub; 推送模式逐笔成交即时更新
+if QUOTE_FEED_MODE == "stream":
+    quote_feed = FinnhubStreamFeed(quote_source, FINNHUB_WS_URL, TARGET_STOCKS.keys(),
+                                   limiter=rate_limiters["finnhub"])
+else:
+    quote_feed = QuotePoller(quote_source, TARGET_STOCKS.keys(), POLLING_INTERVAL, active_check=is_market_open,
+                             inactive_wait=seconds_until_open,
+                             limiter=rate_limiters["finnhub"], priority_fn=quote_priority,
+                             interval_fn=quote_interval if ADAPTIVE_POLLING else None)
+
+quote_feed.metrics = metrics
+quote_feed.stale_after = QUOTE_STALE_SECONDS or None  # [新增] 相同报价不再重复发布，过期报价不据此买入
+
+# [新增] 指标随行情源逐笔更新，策略直接读取，不再额外请求历史数据
+indicator_book = IndicatorBook(TARGET_STOCKS.keys(), **INDICATOR_PARAMS)
+quote_feed.add_listener(indicator_book.on_quote)
+
+# [新增] 1 秒 / 1 分钟 / 5 分钟 K 线，策略与 /metrics 直接读取环形缓冲区
+bar_aggregator = BarAggregator(TARGET_STOCKS.keys(), BAR_INTERVALS)
+quote_feed.add_listener(bar_aggregator.on_quote)
+
+tick_recorder = TickRecorder(TICK_DATA_DIR) if RECORD_TICKS else None
+if tick_recorder:
+    quote_feed.add_listener(tick_recorder.record)
+
+candle_cache = CandleCache(CANDLE_CACHE_DIR, FinnhubCandleSource(finnhub_client), CANDLE_RESOLUTION,
+                           CANDLE_CACHE_DAYS, limiter=rate_limiters["finnhub"]) if WARM_START else None
+
+
+def warm_from_candles(symbol, rows):
+    """[新增] 历史 K 线写入 K 线缓冲区与 ATR (已有实时报价的部分自动跳过)"""
+    if not rows:
+        return
+    bar_aggregator.warm(symbol, rows, CANDLE_RESOLUTION)
+    indicator_book.warm(symbol, rows, CANDLE_RESOLUTION)
+
+
+def warm_start():
+    """[新增] 同步读取本地缓存预热，不访问网络"""
+    started = time.perf_counter()
+    total = 0
+    for symbol in TARGET_STOCKS:
+        rows = candle_cache.rows(symbol)
+        warm_from_candles(symbol, rows)
+        total += len(rows)
+    logger.info(f"本地 K 线缓存预热完成: {total} 根，耗时 {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+def refresh_candles():
+    """[新增] 后台补拉缓存之后缺失的 K 线 (低优先级占用 Finnhub 额度)，并补入尚未被实时报价覆盖的部分"""
+    started = time.perf_counter()
+    for symbol in TARGET_STOCKS:
+        if shutdown_event.is_set():
+            return
+        warm_from_candles(symbol, candle_cache.refresh(symbol))
+    logger.info(f"K 线缓存增量补拉完成: 新增 {candle_cache.fetched} 根，耗时 {time.perf_counter() - started:.1f}s")
+
+
+def evaluate_quote(symbol, config, quote, status):
+    """解析报价并给出需要执行的动作 (只做计算和日志，不下单)；status 保存该标的的日志计时"""
+    started = time.perf_counter()
+    current_price = float(quote.get('c', 0))
+    prev_close = float(quote.get('pc', 0))    
+    current_volume = float(quote.get('v', 0)) 
+
+    if current_price is None or current_price == 0:
+        logger.warning(f"[{symbol}] Finnhub 返回的价格为 0，请检查接口或代码！原始返回: {quote}",
+                       extra={"log_key": f"zero_price:{symbol}", "log_every": 60})
+        return []
+
+    status["decision_key"] = decision_key(symbol)
+    position = state_manager.get_position(symbol)
+    # [新增] 按 Finnhub 报价时间戳判断，旧价格不当作实时价格买入；
+    # t 是最后成交时间，持仓时仍按最后成交价检查止损 / 止盈，不因长时间无成交而停止保护
+    if position is None and quote_feed.is_stale(quote):
+        logger.warning(f"[{symbol}] 报价已过期 ({time.time() - quote['t']:.0f}s 前，现价 {current_price})，不据此买入",
+                       extra={"log_key": f"stale:{symbol}", "log_every": 60})
+        return []
+
+    day_change_pct = (current_price - prev_close) / prev_close if prev_close else 0
+
+    # =========================================================
+    # 【心跳消除假死】：每 HEARTBEAT_INTERVAL (10秒) 打印一次日志！
+    # [修改] 按时间而非循环次数，推送模式下逐笔触发也不会刷屏
+    # =========================================================
+    now_ts = time.time()
+    log_elapsed = 0.0
+    if now_ts - status["last_heartbeat"] >= HEARTBEAT_INTERVAL:
+        status["last_heartbeat"] = now_ts
+        log_elapsed = log_heartbeat(symbol, position, current_price, day_change_pct)
+
+    in_cooldown = position is None and state_manager.is_in_cooldown(symbol)
+    # [修改] 持仓时先与预计算的触发价区间比较，普通报价一次比较即可返回
+    ladder = config.get("ladder", DXYZ_TRAILING_LADDER)
+    triggers = position_triggers(symbol, position, ladder, status) if position else None
+    actions = dxyz_decide(current_price, prev_close, current_volume, position, in_cooldown,
+                          STOP_LOSS_PCT, BUY_MOMENTUM_THRESHOLD, MIN_VOLUME_THRESHOLD, ladder, triggers)
+
+    pending = filter_actions(symbol, actions, current_price, position, day_change_pct, current_volume, status, now_ts)
+    # 决策耗时不含心跳日志 (单独计入 logging)
+    metrics.observe("decision", symbol, time.perf_counter() - started - log_elapsed)
+    return pending
+
+
+def symbol_ladder(symbol):
+    return TARGET_STOCKS.get(symbol, {}).get("ladder", DXYZ_TRAILING_LADDER)
+
+
+def position_triggers(symbol, position, ladder, status):
+    """[新增] 入场价或最高价变化时重算绝对触发价 (硬止损 / 移动止盈 / 阶梯上移)，其余报价直接复用；
+    创新高且未越过阶梯上移价时档位不变，只平移移动止盈价"""
+    triggers = status["triggers"]
+    if (triggers is not None and triggers.entry_price == position['entry_price']
+            and triggers.highest_price < position['highest_price']):
+        triggers = status["triggers"] = raise_triggers(triggers, position['highest_price'], STOP_LOSS_PCT, ladder)
+        logger.debug(f"[{symbol}] 卖出触发价已更新: {triggers}")
+    elif triggers is None or triggers.entry_price != position['entry_price'] or \
+            triggers.highest_price != position['highest_price']:
+        triggers = status["triggers"] = sell_triggers(position['entry_price'], position['highest_price'],
+                                                      STOP_LOSS_PCT, ladder)
+        logger.debug(f"[{symbol}] 卖出触发价已更新: {triggers}")
+    return triggers
+
+
+def log_heartbeat(symbol, position, current_price, day_change_pct):
+    """[修改] 状态与现价未变化的心跳只在静默超过 HEARTBEAT_MAX_SILENCE 后再打印；返回日志耗时"""
+    pos_str = "🟢 持仓中" if position else "⚪ 空仓监控"
+    log_started = time.perf_counter()
+    logger.info(f"[{symbol}] 正在运行 | 状态: {pos_str} | 现价: {current_price} | 日涨幅: {day_change_pct:.2%}",
+                extra={"log_key": f"heartbeat:{symbol}", "log_state": (pos_str, current_price),
+                       "log_max_silence": HEARTBEAT_MAX_SILENCE})
+    log_elapsed = time.perf_counter() - log_started
+    metrics.observe("logging", symbol, log_elapsed)
+    return log_elapsed
+
+
+def idle_heartbeat(symbol, quote, status):
+    """[新增] 报价未变化时不再评估，但心跳照常 (与 evaluate_quote 同一节奏与去重)"""
+    now_ts = time.time()
+    if now_ts - status["last_heartbeat"] < HEARTBEAT_INTERVAL:
+        return
+    status["last_heartbeat"] = now_ts
+    current_price = float(quote.get('c', 0))
+    prev_close = float(quote.get('pc', 0))
+    day_change_pct = (current_price - prev_close) / prev_close if prev_close else 0
+    log_heartbeat(symbol, state_manager.get_position(symbol), current_price, day_change_pct)
+
+
+def filter_actions(symbol, actions, current_price, position, day_change_pct, current_volume, status, now_ts):
+    """[新增] 提示类动作只打日志，其余附上报价上下文交给 execute_actions (线程 / asyncio / 批量引擎共用)"""
+    pending = []
+    for kind, info in actions:
+        if kind == "cooldown":
+            if now_ts - status["last_cooldown_log"] >= 60:
+                status["last_cooldown_log"] = now_ts
+                logger.info(f"{symbol} 处于冷却期，跳过买入检查")
+        elif kind == "low_volume":
+            logger.info(f"{symbol} 价格达标但成交量不足 ({current_volume})，不操作",
+                        extra={"log_key": f"low_volume:{symbol}", "log_every": 60})
+        elif kind == "buy" and BUY_ABOVE_VWAP and not above_vwap(symbol, current_price):
+            continue
+        else:
+            pending.append((kind, info, current_price, position, day_change_pct, current_volume))
+    return pending
 
-        current_time = now_ny.time()
-        market_start = dtime(9, 30)
-        market_end = dtime(16, 0)
-        
-        is_open = market_start <= current_time <= market_end
-        if not is_open and now_ny.minute % 30 == 0 and now_ny.second < 5: 
-            logger.info(f"市场检查: 当前纽约时间 {now_ny.strftime('%Y-%m-%d %H:%M:%S')} (非交易时段)")
 
-        return is_open
-    except Exception as e:
-        logger.error(f"时区时间检查错误: {e}")
-        return False
+def above_vwap(symbol, current_price):
+    """[新增] 现价是否高于当日 VWAP；尚无 VWAP 时视为满足"""
+    ind = indicator_book.get(symbol)
+    vwap = ind.vwap.value if ind else None
+    if vwap is None or current_price > vwap:
+        return True
+    logger.info(f"{symbol} 日涨幅达标但现价 {current_price} 未站上 VWAP {vwap:.2f}，不操作",
+                extra={"log_key": f"below_vwap:{symbol}", "log_every": 60})
+    return False
+
+
+def execute_actions(symbol, config, actions):
+    """执行 evaluate_quote 给出的动作 (含下单与状态写入等阻塞调用)"""
+    for kind, info, current_price, position, day_change_pct, current_volume in actions:
+        # --- 场景 A: 持有仓位 (监控卖出) ---
+        if kind == "raise_high":
+            # [修改] 只更新最高价，不覆盖执行线程同时写入的成交数量
+            state_manager.update_highest(symbol, info)
+        elif kind in ("sell", "buy") and trader.has_working_order(symbol):
+            continue  # [新增] 该标的已有在途订单，等待成交回报
+        elif kind == "sell":
+            trader.execute_sell(symbol, position['quantity'], current_price, reason=info)
+
+        # --- 场景 B: 空仓 (监控买入) ---
+        elif kind == "buy":
+            logger.info(f"{symbol} 触发买入信号: 日涨幅 {day_change_pct:.2%} | 成交量 {current_volume}")
+            success = trader.execute_buy(symbol, config['budget'], current_price)
+
+            # 【显式汇报进度】：明确告诉你买入结束了，正在继续工作
+            if success:
+                logger.info(f"✅ [{symbol}] 买入单已提交，成交后脚本将自动切入【持仓监控】模式，等待止盈/止损时机！")
+
+
+def new_symbol_status():
+    return {"last_heartbeat": 0, "last_cooldown_log": 0, "decision_key": None, "triggers": None}
+
+
+def decision_key(symbol):
+    """[新增] 报价之外影响决策的输入: 持仓 (状态版本号)、订单结束次数、冷却状态"""
+    return state_manager.version, trader.orders.finished, state_manager.is_in_cooldown(symbol)
+
+
+def needs_recheck(symbol, status):
+    """[新增] 报价未变 (不再重复发布) 但决策输入已变化时，用现有报价重新评估一次"""
+    return status["decision_key"] is not None and decision_key(symbol) != status["decision_key"]
 
 
 def dxyz_strategy_logic(symbol, config, running_event):
-    """DXYZ 专用策略: 结合趋势跟踪与动态阶梯移动止损"""
+    """DXYZ 专用策略: 结合趋势跟踪与动态阶梯移动止损 (线程模式)"""
     logger.info(f"启动策略监控: {symbol}")
     
-    heartbeat_counter = 0
+    last_seq = 0  # [新增] 已处理的最新报价序号
+    status = new_symbol_status()
 
     while running_event.is_set():
         if not is_market_open():
-            if heartbeat_counter % 6 == 0: 
-                logger.info(f"[{symbol}] 当前非美股交易时间 (09:30-16:00 ET) 或周末，休眠等待...")
-            heartbeat_counter += 1
-            time.sleep(60) 
+            # [修改] 直接休眠到下次开盘 (或收到退出信号)
+            wait = seconds_until_open()
+            next_open = datetime.fromtimestamp(time.time() + wait, NY).strftime('%Y-%m-%d %H:%M')
+            logger.info(f"[{symbol}] 当前非美股交易时段，休眠至下次开盘 {next_open} ET ({wait / 3600:.1f} 小时)")
+            shutdown_event.wait(wait)
             continue
 
         try:
-            quote = None
-            retry_count = 0
-            finnhub_symbol = symbol.split('.')[0] 
-            
-            while retry_count < 3:
-                try:
-                    quote = finnhub_client.quote(finnhub_symbol)
-                    break 
-                except Exception as api_err:
-                    retry_count += 1
-                    logger.warning(f"获取行情失败，重试 {retry_count}/3: {api_err}")
-                    time.sleep(2)
-            
+            # [修改] 不再单独请求 Finnhub，而是等待共享行情源发布新报价 (轮询为下一轮，推送为下一笔成交)
+            quote, last_seq = quote_feed.wait_for_update(symbol, last_seq, timeout=POLLING_INTERVAL * 3)
+
             if not quote:
-                logger.error(f"无法获取 {symbol} 价格，跳过本次循环")
-                time.sleep(POLLING_INTERVAL)
+                quote = quote_feed.get_quote(symbol)[0]
+                if quote:
+                    # 仅是暂无新报价，旧报价仍有效; [新增] 持仓 / 订单 / 冷却变化时重新评估
+                    if needs_recheck(symbol, status):
+                        execute_actions(symbol, config, evaluate_quote(symbol, config, quote, status))
+                    else:
+                        idle_heartbeat(symbol, quote, status)
+                    continue
+                logger.error(f"无法获取 {symbol} 价格，跳过本次循环",
+                             extra={"log_key": f"no_quote:{symbol}", "log_every": 60})
                 continue
 
-            current_price = float(quote.get('c', 0))
-            open_price = float(quote.get('o', 0))     
-            prev_close = float(quote.get('pc', 0))    
-            current_volume = float(quote.get('v', 0)) 
-
-            if current_price is None or current_price == 0:
-                logger.warning(f"[{symbol}] Finnhub 返回的价格为 0，请检查接口或代码！原始返回: {quote}")
-                time.sleep(POLLING_INTERVAL)
-                continue
-            
-            day_change_pct = (current_price - prev_close) / prev_close if prev_close else 0
-            position = state_manager.get_position(symbol)
-
-            # =========================================================
-            # 【心跳消除假死】：改为每 2 次循环 (10秒) 打印一次日志！
-            # =========================================================
-            heartbeat_counter += 1
-            if heartbeat_counter % 2 == 0: 
-                pos_str = "🟢 持仓中" if position else "⚪ 空仓监控"
-                logger.info(f"[{symbol}] 正在运行 | 状态: {pos_str} | 现价: {current_price} | 日涨幅: {day_change_pct:.2%}")
-
-            # --- 场景 A: 持有仓位 (监控卖出) ---
-            if position:
-                entry_price = position['entry_price']
-                highest_price = position['highest_price']
-                quantity = position['quantity']
-
-                if current_price > highest_price:
-                    highest_price = current_price
-                    state_manager.update_position(symbol, quantity, entry_price, highest_price)
-
-                pnl_pct = (current_price - entry_price) / entry_price
-                max_pnl_pct = (highest_price - entry_price) / entry_price
-                drawdown_pct = (highest_price - current_price) / highest_price
-
-                current_trailing_limit = None 
-
-                # [修改] 优化阶梯移动止损逻辑，新增微利保本防线
-                if max_pnl_pct > 0.20:
-                    current_trailing_limit = 0.10  
-                elif max_pnl_pct > 0.10:
-                    current_trailing_limit = 0.06  
-                elif max_pnl_pct > 0.05:          # [修改] 将原先的 0.03 改为 0.05，拉开梯度
-                    current_trailing_limit = 0.03  
-                elif max_pnl_pct > 0.02:          # [新增] 保本防线：只要盈利曾超过 2%，回撤 1.5% 就会强制止盈，保住 0.5% 的底线
-                    current_trailing_limit = 0.015 
-
-                if pnl_pct < -STOP_LOSS_PCT:
-                    trader.execute_sell(symbol, quantity, current_price, reason=f"触发硬止损 (当前 {pnl_pct:.2%})")
-                elif current_trailing_limit is not None and drawdown_pct > current_trailing_limit:
-                    reason_msg = f"触发动态移动止盈 (最高浮盈 {max_pnl_pct:.2%}, 回撤 {drawdown_pct:.2%})"
-                    trader.execute_sell(symbol, quantity, current_price, reason=reason_msg)
-                else:
-                    pass # 持仓正常，继续持有
-
-            # --- 场景 B: 空仓 (监控买入) ---
-            else:
-                if state_manager.is_in_cooldown(symbol):
-                    if heartbeat_counter % 12 == 0:
-                        logger.info(f"{symbol} 处于冷却期，跳过买入检查")
-                    time.sleep(POLLING_INTERVAL)
-                    continue
-                
-                volume_ok = (current_volume > MIN_VOLUME_THRESHOLD) or (current_volume == 0.0)
-                price_trend_ok = day_change_pct > BUY_MOMENTUM_THRESHOLD
-
-                if price_trend_ok and volume_ok:
-                    logger.info(f"{symbol} 触发买入信号: 日涨幅 {day_change_pct:.2%} | 成交量 {current_volume}")
-                    success = trader.execute_buy(symbol, config['budget'], current_price)
-                    
-                    # 【显式汇报进度】：明确告诉你买入结束了，正在继续工作
-                    if success:
-                        logger.info(f"✅ [{symbol}] 买入流程完毕，脚本已无缝切入【持仓监控】模式，等待止盈/止损时机！")
-                elif price_trend_ok and not volume_ok:
-                    logger.info(f"{symbol} 价格达标但成交量不足 ({current_volume})，不操作")
-                else:
-                    pass
+            # [修改] 规则判断与下单拆开，与 asyncio 引擎共用同一套规则
+            actions = evaluate_quote(symbol, config, quote, status)
+            execute_actions(symbol, config, actions)
 
         except Exception as e:
             logger.error(f"策略循环错误 ({symbol}): {e}")
-        
-        time.sleep(POLLING_INTERVAL)
+            time.sleep(POLLING_INTERVAL)
+
+
+def build_async_engine():
+    """[新增] asyncio 引擎: 所有标的作为协程运行，下单等阻塞调用进入有界线程池"""
+    statuses = {ticker: new_symbol_status() for ticker in TARGET_STOCKS}
+    return AsyncStrategyEngine(
+        quote_feed,
+        TARGET_STOCKS.keys(),
+        evaluate=lambda symbol, quote: evaluate_quote(symbol, TARGET_STOCKS[symbol], quote, statuses[symbol]),
+        execute=lambda symbol, actions: execute_actions(symbol, TARGET_STOCKS[symbol], actions),
+        market_open=is_market_open,
+        closed_sleep=seconds_until_open,
+        max_workers=EXECUTOR_WORKERS,
+        quote_timeout=POLLING_INTERVAL * 3,
+        recheck=lambda symbol: needs_recheck(symbol, statuses[symbol]),
+        on_idle=lambda symbol, quote: idle_heartbeat(symbol, quote, statuses[symbol]),
+    )
+
+def build_batch_engine():
+    """[新增] 批量引擎: 单线程每轮向量化评估全部标的，只对需要动作的标的执行 filter_actions / execute_actions"""
+    statuses = {ticker: new_symbol_status() for ticker in TARGET_STOCKS}
+    last_heartbeat = [0.0]
+
+    def on_actions(symbol, actions, quote, position):
+        current_price = float(quote.get('c', 0))
+        prev_close = float(quote.get('pc', 0))
+        day_change_pct = (current_price - prev_close) / prev_close if prev_close else 0
+        pending = filter_actions(symbol, actions, current_price, position, day_change_pct,
+                                 float(quote.get('v', 0)), statuses[symbol], time.time())
+        if pending:
+            execute_actions(symbol, TARGET_STOCKS[symbol], pending)
+
+    def on_cycle():
+        now_ts = time.time()
+        if now_ts - last_heartbeat[0] < HEARTBEAT_INTERVAL:
+            return
+        last_heartbeat[0] = now_ts
+        for i, symbol in enumerate(engine.symbols):
+            quote = engine.quotes[i]
+            if quote and quote.get('c'):
+                prev_close = float(quote.get('pc', 0))
+                day_change_pct = (quote['c'] - prev_close) / prev_close if prev_close else 0
+                log_heartbeat(symbol, engine.positions[i], float(quote['c']), day_change_pct)
+
+    engine = BatchStrategyEngine(
+        quote_feed,
+        TARGET_STOCKS.keys(),
+        on_actions=on_actions,
+        state_version=lambda: (state_manager.version, trader.orders.finished),
+        state_snapshot=state_manager.records,  # [修改] 不可变记录，无需逐条复制为 dict
+        params={"stop_loss_pct": STOP_LOSS_PCT, "momentum_threshold": BUY_MOMENTUM_THRESHOLD,
+                "min_volume": MIN_VOLUME_THRESHOLD, "stale_after": QUOTE_STALE_SECONDS,
+                "ladders": {ticker: config.get("ladder", DXYZ_TRAILING_LADDER) for ticker, config in TARGET_STOCKS.items()}},
+        market_open=is_market_open,
+        closed_wait=lambda: shutdown_event.wait(seconds_until_open()),
+        quote_timeout=POLLING_INTERVAL * 3,
+        on_cycle=on_cycle,
+    )
+    engine.metrics = metrics
+    return engine
 
 # ==========================================
 # 6. 主程序流程
@@ -397,7 +801,7 @@ def main():
     print("   Longport AutoTrade v0.1.9 (Fully Fixed)")
     print("========================================")
 
-    if os.path.exists(STATE_FILE):
+    if state_manager.has_saved_state():
         choice = input("检测到之前的交易状态文件。是否继续上次的交易状态? (y/n): ").strip().lower()
         if choice == 'y':
             state_manager.load_state()
@@ -409,26 +813,89 @@ def main():
     running_event = threading.Event()
     running_event.set()
 
+    async_engine = build_async_engine() if ENGINE_MODE == "asyncio" else None
+    batch_engine = build_batch_engine() if ENGINE_MODE == "batch" else None
+
     def signal_handler(sig, frame):
         print("\n正在停止脚本，请稍候...")
         running_event.clear()
+        shutdown_event.set()
+        if batch_engine:
+            batch_engine.wakeup()
+        quote_feed.stop()
+        trader.orders.stop()  # [新增] 先停执行线程，确保已收到的成交写入状态
+        if metrics_server:
+            metrics_server.stop()
+        metrics.dump(METRICS_DUMP_FILE)
+        state_manager.stop_writer()
         state_manager.save_state()
+        if tick_recorder:
+            tick_recorder.stop()
+        for name, limiter in rate_limiters.items():
+            logger.info(f"限流统计 [{name}]: {limiter.stats()}")
+        logger.info(f"下单统计: {trader.orders.stats()}")
+        logger.info(f"行情统计: {quote_feed.stats()}")  # [新增] 含未变化而跳过的报价数
+        if isinstance(quote_source, HedgedQuoteSource):
+            logger.info(f"行情源统计: {quote_source.stats()}")
+        for name, session in http_sessions.items():
+            logger.info(f"HTTP 连接池 {name}: {session.stats()}")  # [新增] 请求数 / 超时数 / 新建连接数
+        if BROKER_MODE == "sim":
+            trader.ctx.stop()
+            logger.info(f"模拟券商统计: {trader.ctx.stats()}")
+        logger.info(f"日志限频共省略 {log_listener.rate_filter.dropped} 条")  # 剩余日志由 atexit 刷出
+        if async_engine:
+            async_engine.stop()  # 事件循环结束后 main() 正常返回
+            return
         sys.exit(0)
 
+    # [新增] 限流 / 下单统计随 /metrics 一并导出
+    for name, limiter in rate_limiters.items():
+        metrics.add_gauges(f"ratelimit_{name}", limiter.stats)
+    metrics.add_gauges("orders", trader.orders.stats)
+    metrics.add_gauges("quotes", quote_feed.stats)
+    if isinstance(quote_source, HedgedQuoteSource):
+        metrics.add_gauges("quote_source", quote_source.stats)
+    for name, session in http_sessions.items():
+        metrics.add_gauges(f"http_{name}", session.stats)
+    metrics.add_gauges("bar", bar_aggregator.gauges)
+    metrics_server = MetricsServer(metrics, port=METRICS_PORT) if METRICS_PORT else None
+
     signal.signal(signal.SIGINT, signal_handler)
 
+    state_manager.start_writer()
+    trader.orders.start()
+    if metrics_server:
+        metrics_server.start()
+    if tick_recorder:
+        tick_recorder.start()
+    if candle_cache:
+        warm_start()
+        threading.Thread(target=refresh_candles, name="Thread-CandleRefresh", daemon=True).start()
+    quote_feed.start()
+
+    if async_engine:
+        print(f"监控已启动 (asyncio): {list(TARGET_STOCKS.keys())}")
+        print("按 Ctrl+C 安全停止脚本并保存状态。")
+        asyncio.run(async_engine.run())
+        return
+
     threads = []
-    for ticker, config in TARGET_STOCKS.items():
-        t = threading.Thread(
-            target=dxyz_strategy_logic, 
-            args=(ticker, config, running_event),
-            name=f"Thread-{ticker}"
-        )
+    if batch_engine:
+        t = threading.Thread(target=batch_engine.run, args=(running_event,), name="Thread-Batch")
         t.start()
         threads.append(t)
+    else:
+        for ticker, config in TARGET_STOCKS.items():
+            t = threading.Thread(
+                target=dxyz_strategy_logic, 
+                args=(ticker, config, running_event),
+                name=f"Thread-{ticker}"
+            )
+            t.start()
+            threads.append(t)
 
     print(f"监控已启动: {list(TARGET_STOCKS.keys())}")
-    print("美股交易时间 (ET): 09:30 - 16:00 (含冬夏令时自动切换)")
+    print("美股交易时间 (ET): 09:30 - 16:00 (含冬夏令时自动切换、节假日与提前收盘)")
     print("按 Ctrl+C 安全停止脚本并保存状态。")
 
     while running_event.is_set():
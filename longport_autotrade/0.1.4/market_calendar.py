@@ -0,0 +1,185 @@
+#!/usr/bin/python3
+"""
+美股 (NYSE / NASDAQ) 交易日历: 启动时预先算出每个交易日开收盘的 UTC 时间戳
+
+* 休市日按交易所规则推算: 元旦、马丁路德金日、总统日、耶稣受难日、阵亡将士纪念日、
+  六月节、独立日、劳动节、感恩节、圣诞节 (周六提前到周五, 周日顺延到周一; 元旦落在周六不补休)
+* 提前收盘 (13:00 ET): 独立日前一天 (周一至周四)、感恩节次日、平安夜 (周一至周四)
+* 常规时段 09:30-16:00 ET 在 UTC 下不跨日, 因此按 UTC 日序号建索引,
+  is_open() / next_boundary() 均为 O(1) 查表, 不再每次做时区换算
+* 临时休市 (如国葬日) 通过 extra_holidays 追加
+
+用法:
+  python market_calendar.py 2026        # 打印全年休市日与提前收盘日
+"""
+import sys
+import time
+from datetime import date, datetime, timedelta, time as dtime
+
+import pytz
+
+NY = pytz.timezone('America/New_York')
+REGULAR_OPEN = dtime(9, 30)
+REGULAR_CLOSE = dtime(16, 0)
+EARLY_CLOSE = dtime(13, 0)
+DAY = 86400
+
+
+def easter(year):
+    """公历复活节 (Anonymous Gregorian algorithm)"""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def nth_weekday(year, month, weekday, n):
+    """当月第 n 个星期几 (n = -1 表示最后一个)"""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def observed(day):
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+def nyse_holidays(year):
+    holidays = {
+        nth_weekday(year, 1, 0, 3),             # 马丁路德金日: 1 月第三个周一
+        nth_weekday(year, 2, 0, 3),             # 总统日: 2 月第三个周一
+        easter(year) - timedelta(days=2),       # 耶稣受难日
+        nth_weekday(year, 5, 0, -1),            # 阵亡将士纪念日: 5 月最后一个周一
+        observed(date(year, 7, 4)),             # 独立日
+        nth_weekday(year, 9, 0, 1),             # 劳动节: 9 月第一个周一
+        nth_weekday(year, 11, 3, 4),            # 感恩节: 11 月第四个周四
+        observed(date(year, 12, 25)),           # 圣诞节
+    }
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:                 # 落在周六时不在上一年 12/31 补休
+        holidays.add(observed(new_year))
+    if year >= 2022:
+        holidays.add(observed(date(year, 6, 19)))  # 六月节
+    return holidays
+
+
+def nyse_early_closes(year):
+    early = {nth_weekday(year, 11, 3, 4) + timedelta(days=1)}   # 感恩节次日
+    for day in (date(year, 7, 3), date(year, 12, 24)):
+        if day.weekday() <= 3:
+            early.add(day)
+    return early
+
+
+class SessionCalendar:
+    def __init__(self, years=None, extra_holidays=()):
+        self.extra_holidays = {date.fromisoformat(d) if isinstance(d, str) else d for d in extra_holidays}
+        self.sessions = {}          # UTC 日序号 -> (开盘时间戳, 收盘时间戳)
+        self.next_session = {}      # UTC 日序号 -> 该日之后 (不含当日) 第一个交易日的 (开盘, 收盘)
+        self.first_day = self.last_day = None
+        self.current = (0.0, 0.0)   # 最近一次命中的交易时段, 热路径先比较它
+        if years is None:
+            this_year = datetime.now(NY).year
+            years = (this_year, this_year + 1)
+        self.build(years)
+
+    def build(self, years):
+        years = sorted(set(years))
+        self.sessions, self.next_session = {}, {}
+        holidays, early = set(self.extra_holidays), set()
+        for year in years:
+            holidays |= nyse_holidays(year)
+            early |= nyse_early_closes(year)
+
+        day = date(years[0], 1, 1)
+        end = date(years[-1], 12, 31)
+        while day <= end:
+            if day.weekday() < 5 and day not in holidays:
+                close_time = EARLY_CLOSE if day in early else REGULAR_CLOSE
+                open_ts = NY.localize(datetime.combine(day, REGULAR_OPEN)).timestamp()
+                close_ts = NY.localize(datetime.combine(day, close_time)).timestamp()
+                self.sessions[int(open_ts // DAY)] = (open_ts, close_ts)
+            day += timedelta(days=1)
+
+        self.first_day = int(NY.localize(datetime.combine(date(years[0], 1, 1), dtime(0))).timestamp() // DAY)
+        self.last_day = max(self.sessions)
+        following = None
+        for index in range(self.last_day, self.first_day - 1, -1):
+            self.next_session[index] = following
+            following = self.sessions.get(index, following)
+
+    def _ensure(self, ts):
+        index = int(ts // DAY)
+        if not self.first_day <= index < self.last_day - 7:
+            year = datetime.fromtimestamp(ts, NY).year
+            self.build(range(year - 1, year + 2))
+        return index
+
+    def session(self, ts=None):
+        """ts 所在 UTC 日的交易时段 (开盘, 收盘), 休市日返回 None"""
+        ts = time.time() if ts is None else ts
+        index = self._ensure(ts)  # 可能重建索引, 需先于读取 self.sessions
+        return self.sessions.get(index)
+
+    def is_open(self, ts=None):
+        ts = time.time() if ts is None else ts
+        open_ts, close_ts = self.current
+        if open_ts <= ts < close_ts:
+            return True
+        index = self._ensure(ts)
+        today = self.sessions.get(index)
+        if today and today[0] <= ts < today[1]:
+            self.current = today
+            return True
+        return False
+
+    def next_open(self, ts=None):
+        """下一次开盘时间戳 (当前在交易时段内时返回下一交易日开盘)"""
+        ts = time.time() if ts is None else ts
+        index = self._ensure(ts)
+        today = self.sessions.get(index)
+        if today and ts < today[0]:
+            return today[0]
+        return self.next_session[index][0]
+
+    def next_boundary(self, ts=None):
+        """下一个开盘或收盘时刻"""
+        ts = time.time() if ts is None else ts
+        index = self._ensure(ts)
+        today = self.sessions.get(index)
+        if today and today[0] <= ts < today[1]:
+            return today[1]
+        return self.next_open(ts)
+
+    def seconds_until_open(self, ts=None):
+        ts = time.time() if ts is None else ts
+        return 0.0 if self.is_open(ts) else max(self.next_open(ts) - ts, 0.0)
+
+
+def main():
+    year = int(sys.argv[1]) if len(sys.argv) > 1 else datetime.now(NY).year
+    print(f"{year} 休市日:")
+    for day in sorted(nyse_holidays(year)):
+        print(f"  {day} {day.strftime('%a')}")
+    print(f"{year} 提前收盘 (13:00 ET):")
+    for day in sorted(nyse_early_closes(year)):
+        print(f"  {day} {day.strftime('%a')}")
+    calendar = SessionCalendar([year])
+    print(f"交易日: {sum(1 for o, _ in calendar.sessions.values() if datetime.fromtimestamp(o, NY).year == year)} 天")
+
+
+if __name__ == "__main__":
+    main()
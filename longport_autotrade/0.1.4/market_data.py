@@ -0,0 +1,350 @@
+#!/usr/bin/python3
+"""
+行情组件: 统一维护共享的最新报价表, 策略线程只读不请求。
+
+* QuoteBook:          报价表基类 (发布 / 等待更新), 即行情源接口
+* QuotePoller:        轮询实现, 每轮每个标的只请求一次 Finnhub REST
+* FinnhubStreamFeed:  推送实现, 订阅 Finnhub 成交 websocket, 逐笔更新现价
+* 报价数据源:          任何实现 fetch(symbol) -> quote 的对象 (如 quote_sources.HedgedQuoteSource);
+                      传入 finnhub.Client 时自动包装为 FinnhubSource
+
+报价统一使用 Finnhub quote 格式: {"c": 现价, "o": 开盘, "pc": 昨收, "v": 成交量, "t": 时间戳}
+
+与上一笔相同的报价 (时间戳与现价均未变, 或无时间戳时现价与成交量均未变) 不再发布:
+序号不变、不唤醒策略、不调用回调, 只刷新取得时间并计数; 报价时间戳过旧时 is_stale() 为 True。
+"""
+import json
+import time
+import threading
+import logging
+
+from rate_limiter import PRIORITY_NORMAL, PRIORITY_LOW, is_rate_limit_error
+
+try:
+    import websocket  # websocket-client, 仅推送模式需要
+except ImportError:
+    websocket = None
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKOFF = 10  # 收到 429 后所有请求整体暂停的秒数
+
+
+def to_finnhub_symbol(symbol):
+    """长桥代码 (DXYZ.US) 转 Finnhub 代码 (DXYZ)"""
+    return symbol.split('.')[0]
+
+
+class FinnhubSource:
+    """Finnhub REST quote 数据源"""
+
+    def __init__(self, client, name="finnhub"):
+        self.client = client
+        self.name = name
+
+    def fetch(self, symbol):
+        return self.client.quote(to_finnhub_symbol(symbol))
+
+
+def as_source(client):
+    return client if hasattr(client, "fetch") else FinnhubSource(client)
+
+
+def same_quote(old, new):
+    """两笔报价是否相同: Finnhub REST 在没有新成交时原样返回上一笔 (t 不变); 昨收变化 (底稿刷新) 视为不同"""
+    if not old or not new or old.get('pc') != new.get('pc'):
+        return False
+    if old.get('t') and new.get('t'):
+        return old['t'] == new['t'] and old.get('c') == new.get('c')
+    return old.get('c') == new.get('c') and old.get('v') == new.get('v')
+
+
+class QuoteBook:
+    """共享报价表 + 行情源接口; 子类实现 start() / stop() 并调用 _publish() 写入报价"""
+
+    def __init__(self, symbols):
+        self.symbols = list(symbols)
+        # 共享报价表: symbol -> {"quote": dict, "seq": int, "ts": float}
+        self.book = {}
+        self.lock = threading.RLock()
+        # 每个标的一个条件变量 (共用同一把锁), 发布时只唤醒该标的的等待者
+        self.conds = {s: threading.Condition(self.lock) for s in self.symbols}
+        self.listeners = []   # 发布回调 listener(symbol, quote), 供 asyncio 引擎 / 行情记录器使用
+        self.metrics = None   # 可选 metrics.Metrics, 记录每次 REST 请求耗时
+        self.stale_after = None  # 报价时间戳 t 距今超过该秒数视为过期 (None = 不检查)
+        self.published = 0
+        self.unchanged = 0    # 与上一笔相同而未发布的报价数
+        self.stale = 0        # is_stale() 判定为过期的次数
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        self.stop_event.set()
+        with self.lock:
+            for cond in self.conds.values():
+                cond.notify_all()
+        if self.thread:
+            self.thread.join(timeout=5)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _cond(self, symbol):
+        cond = self.conds.get(symbol)
+        if cond is None:
+            cond = self.conds[symbol] = threading.Condition(self.lock)
+        return cond
+
+    def _publish(self, symbol, quote, merge=None):
+        """写入报价并唤醒等待者; merge(当前报价) -> 新报价 在锁内执行 (读改写不被其他发布打断)。
+        回调在释放锁之后调用, 慢回调不阻塞其他标的的 get_quote / wait_for_update"""
+        with self.lock:
+            entry = self.book.get(symbol)
+            if merge is not None:
+                quote = merge(entry["quote"] if entry else None)
+            if entry and same_quote(entry["quote"], quote):
+                entry["ts"] = time.time()
+                self.unchanged += 1
+                return
+            self.published += 1
+            seq = entry["seq"] + 1 if entry else 1
+            self.book[symbol] = {"quote": quote, "seq": seq, "ts": time.time()}
+            self._cond(symbol).notify_all()
+        for listener in self.listeners:
+            listener(symbol, quote)
+
+    def is_stale(self, quote, now=None):
+        """报价自带时间戳 t 过旧 (如停牌 / 数据源卡住), 不应当作实时价格使用"""
+        if not self.stale_after or not quote or not quote.get('t'):
+            return False
+        if (time.time() if now is None else now) - quote['t'] <= self.stale_after:
+            return False
+        with self.lock:
+            self.stale += 1
+        return True
+
+    def stats(self):
+        total = self.published + self.unchanged
+        return {"published": self.published, "unchanged": self.unchanged, "stale": self.stale,
+                "unchanged_ratio": round(self.unchanged / total, 4) if total else 0.0}
+
+    def get_quote(self, symbol):
+        """返回 (quote, seq); 尚无数据时返回 (None, 0)"""
+        with self.lock:
+            entry = self.book.get(symbol)
+            if not entry:
+                return None, 0
+            return entry["quote"], entry["seq"]
+
+    def wait_for_update(self, symbol, last_seq, timeout):
+        """阻塞直到该标的出现比 last_seq 更新的报价, 返回 (quote, seq); 超时返回 (None, last_seq)"""
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            cond = self._cond(symbol)
+            while not self.stop_event.is_set():
+                entry = self.book.get(symbol)
+                if entry and entry["seq"] > last_seq:
+                    return entry["quote"], entry["seq"]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                cond.wait(remaining)
+            return None, last_seq
+
+
+class QuotePoller(QuoteBook):
+    """
+    单线程轮询全部标的, 每个标的按自己的节奏请求 (同一时刻到期的标的合并为一轮)。
+
+    * interval_fn(symbol, quote) 返回该标的下次轮询间隔 (秒); 未配置时统一为 interval
+      每次调度都会重新计算, 标的状态变化 (买入 / 卖出 / 冷却结束) 后立即按新节奏执行
+    * 配置了限流器时按 priority_fn 排序 (持仓标的优先), 额度不足时剩余标的顺延到下一次调度
+    """
+
+    def __init__(self, client, symbols, interval, max_failures=3, active_check=None,
+                 limiter=None, priority_fn=None, interval_fn=None, tick=0.2, inactive_wait=None):
+        super().__init__(symbols)
+        self.client = client
+        self.source = as_source(client)
+        self.interval = interval
+        self.max_failures = max_failures      # 连续失败超过该次数后报错并作废旧报价
+        self.active_check = active_check      # 返回 False 时暂停轮询 (如非交易时段)
+        self.limiter = limiter                # 进程共享的 Finnhub 限流器
+        self.priority_fn = priority_fn        # symbol -> 优先级 (数字越小越优先)
+        self.interval_fn = interval_fn        # (symbol, 最新报价) -> 轮询间隔秒数
+        self.tick = tick                      # 调度粒度 (秒)
+        self.inactive_wait = inactive_wait    # active_check 为 False 时返回需休眠的秒数 (如距开盘)
+
+        self.failures = {s: 0 for s in self.symbols}
+        self.last_polled = {s: 0.0 for s in self.symbols}
+        self.cycle = 0
+        self.api_calls = 0
+        self.skipped = 0                      # 因限流额度不足而顺延的请求数
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="Thread-QuotePoller", daemon=True)
+        self.thread.start()
+        mode = "自适应节奏" if self.interval_fn else f"间隔 {self.interval}s"
+        logger.info(f"行情轮询已启动: {len(self.symbols)} 个标的, {mode}")
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            if self.active_check is None or self.active_check():
+                due = self.due_symbols(time.monotonic())
+                if due:
+                    self.poll_once(due)
+            elif self.inactive_wait:
+                self.stop_event.wait(self.inactive_wait())
+                continue
+            self.stop_event.wait(self.tick)
+
+    def symbol_interval(self, symbol):
+        if not self.interval_fn:
+            return self.interval
+        quote, _ = self.get_quote(symbol)
+        return self.interval_fn(symbol, quote)
+
+    def due_symbols(self, now):
+        return [s for s in self.symbols if now - self.last_polled[s] >= self.symbol_interval(s)]
+
+    def poll_once(self, symbols=None):
+        """对给定 (默认全部) 标的各请求一次, 单个标的失败不阻塞其他标的"""
+        for symbol, priority in self._ordered_symbols(symbols or self.symbols):
+            if self.stop_event.is_set():
+                break
+            if self.limiter and not self.limiter.acquire(priority, timeout=self.tick):
+                self.skipped += 1
+                continue
+            self.last_polled[symbol] = time.monotonic()
+            try:
+                self.api_calls += 1
+                started = time.perf_counter()
+                quote = self.source.fetch(symbol)
+                if self.metrics:
+                    self.metrics.observe("quote_fetch", symbol, time.perf_counter() - started)
+            except Exception as api_err:
+                if self.limiter and is_rate_limit_error(api_err):
+                    self.limiter.backoff(RATE_LIMIT_BACKOFF)
+                self.failures[symbol] += 1
+                logger.warning(f"获取行情失败 ({symbol})，连续失败 {self.failures[symbol]}/{self.max_failures}: {api_err}")
+                # 只在达到阈值时作废一次; 之后继续失败不再发布, 避免反复唤醒策略与回调
+                if self.failures[symbol] == self.max_failures:
+                    self._publish(symbol, None)
+                continue
+            self.failures[symbol] = 0
+            self._publish(symbol, quote)
+        self.cycle += 1
+
+    def _ordered_symbols(self, symbols):
+        if not self.priority_fn:
+            return [(symbol, PRIORITY_NORMAL) for symbol in symbols]
+        return sorted(((symbol, self.priority_fn(symbol)) for symbol in symbols), key=lambda item: item[1])
+
+
+class FinnhubStreamFeed(QuoteBook):
+    """
+    推送实现: 订阅 Finnhub 成交 websocket, 每笔成交立即更新现价并唤醒策略线程。
+
+    成交推送只有价格/数量, 开盘价与昨收仍由 REST quote 定期刷新作为底稿。
+    连续多笔成交在策略线程处理前只保留最新一笔 (报价表天然合并)。
+    """
+
+    def __init__(self, client, ws_url, symbols, snapshot_interval=60, reconnect_delay=2, limiter=None):
+        super().__init__(symbols)
+        if websocket is None:
+            raise ImportError("推送模式需要 websocket-client: pip install websocket-client")
+        self.client = client
+        self.source = as_source(client)
+        self.ws_url = ws_url
+        self.snapshot_interval = snapshot_interval
+        self.reconnect_delay = reconnect_delay
+        self.limiter = limiter
+        self.by_finnhub = {to_finnhub_symbol(s): s for s in self.symbols}
+        self.ws = None
+        self.ticks = 0
+        self.snapshot_thread = None
+
+    def start(self):
+        # 先同步拉一次底稿, 保证第一笔成交到来前已有昨收价
+        self.refresh_snapshots()
+        self.snapshot_thread = threading.Thread(target=self._snapshot_loop, name="Thread-QuoteSnapshot", daemon=True)
+        self.snapshot_thread.start()
+        self.thread = threading.Thread(target=self._run, name="Thread-QuoteStream", daemon=True)
+        self.thread.start()
+        logger.info(f"行情推送已启动: {len(self.symbols)} 个标的 -> {self.ws_url}")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.ws:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+        super().stop()
+
+    def refresh_snapshots(self):
+        """REST 刷新开盘价 / 昨收等底稿字段, 保留推送得到的最新现价"""
+        for symbol in self.symbols:
+            if self.limiter and not self.limiter.acquire(PRIORITY_LOW, timeout=self.snapshot_interval):
+                continue
+            try:
+                started = time.perf_counter()
+                snapshot = self.source.fetch(symbol)
+                if self.metrics:
+                    self.metrics.observe("quote_fetch", symbol, time.perf_counter() - started)
+            except Exception as api_err:
+                if self.limiter and is_rate_limit_error(api_err):
+                    self.limiter.backoff(RATE_LIMIT_BACKOFF)
+                logger.warning(f"刷新行情底稿失败 ({symbol}): {api_err}")
+                continue
+            self._publish(symbol, None, merge=lambda current, snapshot=snapshot: self._merge_snapshot(current, snapshot))
+
+    @staticmethod
+    def _merge_snapshot(current, snapshot):
+        if current and current.get("t", 0) > snapshot.get("t", 0):
+            return dict(snapshot, c=current["c"], t=current["t"])
+        return snapshot
+
+    def _snapshot_loop(self):
+        while not self.stop_event.wait(self.snapshot_interval):
+            self.refresh_snapshots()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.ws = websocket.create_connection(self.ws_url, timeout=60)
+                for finnhub_symbol in self.by_finnhub:
+                    self.ws.send(json.dumps({"type": "subscribe", "symbol": finnhub_symbol}))
+                while not self.stop_event.is_set():
+                    self.on_message(self.ws.recv())
+            except Exception as ws_err:
+                if self.stop_event.is_set():
+                    break
+                logger.warning(f"行情推送连接中断，{self.reconnect_delay}s 后重连: {ws_err}")
+                self.stop_event.wait(self.reconnect_delay)
+            finally:
+                if self.ws:
+                    try:
+                        self.ws.close()
+                    except Exception:
+                        pass
+
+    def on_message(self, message):
+        msg = json.loads(message)
+        if msg.get("type") != "trade":
+            return  # ping 等控制消息
+        for trade in msg.get("data", []):
+            symbol = self.by_finnhub.get(trade.get("s"))
+            if not symbol:
+                continue
+            # 推送时间为毫秒, quote 接口为秒; 在发布锁内合并到最新底稿
+            self._publish(symbol, None, merge=lambda base, trade=trade: dict(base or {}, c=trade["p"],
+                                                                               t=trade["t"] // 1000))
+            self.ticks += 1
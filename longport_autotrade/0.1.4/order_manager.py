@@ -0,0 +1,291 @@
+#!/usr/bin/python3
+"""
+异步下单流水线: 策略线程只把订单放入队列, 由执行线程负责提交 / 改单 / 撤单
+
+* submit() 立即返回; 同一标的同时只允许一笔在途订单, 避免等待成交期间重复下单
+* 持仓由成交驱动: 订单推送 (set_on_order_changed) 或状态查询发现新增成交数量时回调 on_fill,
+  不再在提交成功后假定按触发价全部成交
+* 超时处理: 买单超过 timeout 未成交即撤单 (动量信号已过期); 卖单按最新价重新定价改单,
+  改单 max_replaces 次后仍未成交则撤单, 剩余持仓由策略在下一笔报价重新触发卖出
+* 超过 status_poll 秒没有收到推送的订单主动查询一次, 防止推送丢失导致状态不同步
+"""
+import time
+import queue
+import itertools
+import threading
+import logging
+from decimal import Decimal
+
+from longport.openapi import OrderStatus, OrderSide, OrderType, TimeInForceType, TopicType
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = (OrderStatus.Filled, OrderStatus.Canceled, OrderStatus.Rejected,
+                  OrderStatus.Expired, OrderStatus.PartialWithdrawal)
+
+
+class WorkingOrder:
+    def __init__(self, symbol, side, quantity, limit_price, priority):
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.limit_price = limit_price
+        self.priority = priority
+        self.order_id = None
+        self.filled = 0               # 已处理的累计成交数量
+        self.filled_value = 0.0       # 已处理成交的累计金额 (用于从成交均价还原单笔成交价)
+        self.replaces = 0
+        self.placed_at = 0.0          # 提交或最近一次改单的时间 (monotonic)
+        self.updated_at = 0.0         # 最近一次收到状态的时间
+        self.busy = False             # 已有改单 / 撤单 / 查询任务在队列中
+        self.canceling = False        # 已发出撤单, 等待终结状态
+
+    @property
+    def label(self):
+        return "买入" if self.side == OrderSide.Buy else "卖出"
+
+
+class OrderManager:
+    def __init__(self, ctx, on_fill, price_fn, limiter=None, rate_wait=5, rate_backoff=10,
+                 is_rate_limit_error=None, timeout=10, max_replaces=3, status_poll=5,
+                 slippage_pct=0.01, workers=2, metrics=None):
+        self.ctx = ctx
+        self.on_fill = on_fill                # (symbol, side, 数量, 成交价) -> None
+        self.price_fn = price_fn              # symbol -> 最新价, 卖单改单定价用
+        self.limiter = limiter
+        self.rate_wait = rate_wait
+        self.rate_backoff = rate_backoff
+        self.is_rate_limit_error = is_rate_limit_error
+        self.timeout = timeout
+        self.max_replaces = max_replaces
+        self.status_poll = status_poll
+        self.slippage_pct = slippage_pct
+        self.workers = workers
+        self.metrics = metrics                # 可选 metrics.Metrics, 记录 submit_order 耗时
+
+        self.lock = threading.RLock()
+        self.working = {}                     # symbol -> WorkingOrder
+        self.by_id = {}                       # order_id -> WorkingOrder
+        self.early_events = {}                # 提交返回前就到达的推送: order_id -> event
+        self.tasks = queue.PriorityQueue()    # (priority, seq, 动作, WorkingOrder)
+        self.counter = itertools.count()
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.finished = 0                     # 已结束 (成交 / 撤单 / 拒单) 的订单数, 策略据此判断是否需要重新评估
+
+        # 统计
+        self.stats_counter = {"submitted": 0, "failed": 0, "filled": 0, "canceled": 0,
+                              "rejected": 0, "replaced": 0, "polled": 0}
+
+    # ---------- 策略线程调用 ----------
+
+    def submit(self, symbol, side, quantity, limit_price, priority):
+        """把订单放入执行队列; 该标的已有在途订单时返回 False"""
+        with self.lock:
+            if symbol in self.working:
+                return False
+            order = WorkingOrder(symbol, side, quantity, limit_price, priority)
+            self.working[symbol] = order
+        self._enqueue(priority, "submit", order)
+        return True
+
+    def has_working_order(self, symbol):
+        with self.lock:
+            return symbol in self.working
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        self.ctx.set_on_order_changed(self.on_order_changed)
+        self.ctx.subscribe([TopicType.Private])
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"Thread-OrderWorker-{i}", daemon=True)
+            t.start()
+            self.threads.append(t)
+        t = threading.Thread(target=self._monitor, name="Thread-OrderMonitor", daemon=True)
+        t.start()
+        self.threads.append(t)
+        logger.info(f"下单执行线程已启动: {self.workers} 个 (超时 {self.timeout}s, 卖单最多改单 {self.max_replaces} 次)")
+
+    def stop(self):
+        self.stop_event.set()
+        for t in self.threads:
+            t.join(timeout=2)
+        with self.lock:
+            for order in self.working.values():
+                logger.warning(f"[{order.symbol}] 退出时仍有在途{order.label}单 {order.order_id or '(未提交)'}，"
+                               f"已成交 {order.filled}/{order.quantity}")
+
+    def stats(self):
+        with self.lock:
+            return dict(self.stats_counter, working=len(self.working))
+
+    # ---------- 内部 ----------
+
+    def _enqueue(self, priority, action, order):
+        self.tasks.put((priority, next(self.counter), action, order))
+
+    def _finish(self, order):
+        """持锁调用: 订单结束, 释放该标的的下单名额"""
+        if self.working.get(order.symbol) is order:
+            del self.working[order.symbol]
+            self.finished += 1
+        self.by_id.pop(order.order_id, None)
+
+    def _acquire(self, order):
+        if self.limiter is None or self.limiter.acquire(order.priority, timeout=self.rate_wait):
+            return True
+        logger.error(f"{order.symbol} 下单排队超过 {self.rate_wait}s (交易接口限流)，放弃本次操作")
+        return False
+
+    def _on_error(self, err):
+        if self.limiter is not None and self.is_rate_limit_error and self.is_rate_limit_error(err):
+            self.limiter.backoff(self.rate_backoff)
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            try:
+                _, _, action, order = self.tasks.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                getattr(self, f"_do_{action}")(order)
+            except Exception as e:
+                logger.error(f"下单执行线程错误 ({order.symbol} {action}): {e}")
+            finally:
+                order.busy = False
+
+    def _do_submit(self, order):
+        if not self._acquire(order):
+            with self.lock:
+                self._finish(order)
+            return
+        started = time.perf_counter()
+        try:
+            response = self.ctx.submit_order(
+                order.symbol,
+                OrderType.LO,
+                order.side,
+                Decimal(str(order.quantity)),
+                TimeInForceType.Day,
+                submitted_price=Decimal(f"{order.limit_price:.2f}")
+            )
+        except Exception as e:
+            self._on_error(e)
+            logger.error(f"{order.label}失败 {order.symbol}: {e}")
+            with self.lock:
+                self.stats_counter["failed"] += 1
+                self._finish(order)
+            return
+
+        if self.metrics:
+            self.metrics.observe("submit_order", order.symbol, time.perf_counter() - started)
+        now = time.monotonic()
+        with self.lock:
+            order.order_id = response.order_id
+            order.placed_at = order.updated_at = now
+            self.by_id[order.order_id] = order
+            self.stats_counter["submitted"] += 1
+            early = self.early_events.pop(order.order_id, None)
+        logger.info(f"{order.label}指令已发送: {order.symbol} | 订单号: {order.order_id}")
+        if early is not None:
+            self._apply(order, early)
+
+    def _do_replace(self, order):
+        price = float(self.price_fn(order.symbol) or 0)
+        if price <= 0 or not self._acquire(order):
+            return
+        limit_price = price * (1 - self.slippage_pct)
+        try:
+            self.ctx.replace_order(order.order_id, Decimal(str(order.quantity)),
+                                   price=Decimal(f"{limit_price:.2f}"))
+        except Exception as e:
+            self._on_error(e)
+            logger.warning(f"[{order.symbol}] 改单失败，改为查询订单状态: {e}")
+            self._do_poll(order)
+            return
+        with self.lock:
+            order.limit_price = limit_price
+            order.replaces += 1
+            order.placed_at = time.monotonic()
+            self.stats_counter["replaced"] += 1
+        logger.info(f"[{order.symbol}] 卖单超时未成交，按最新价改单 ({order.replaces}/{self.max_replaces}) | "
+                    f"限价: {limit_price:.2f}")
+
+    def _do_cancel(self, order):
+        if not self._acquire(order):
+            return
+        try:
+            self.ctx.cancel_order(order.order_id)
+            order.canceling = True
+            logger.info(f"[{order.symbol}] {order.label}单超时未成交，已撤单 (已成交 {order.filled}/{order.quantity})")
+        except Exception as e:
+            self._on_error(e)
+            logger.warning(f"[{order.symbol}] 撤单失败，改为查询订单状态: {e}")
+            self._do_poll(order)
+
+    def _do_poll(self, order):
+        detail = self.ctx.order_detail(order.order_id)
+        with self.lock:
+            self.stats_counter["polled"] += 1
+        self._apply(order, detail)
+
+    def _monitor(self):
+        while not self.stop_event.wait(1):
+            now = time.monotonic()
+            with self.lock:
+                orders = [o for o in self.working.values() if o.order_id is not None and not o.busy]
+            for order in orders:
+                action = None
+                if order.canceling:
+                    if now - order.updated_at > self.status_poll:
+                        action = "poll"
+                elif now - order.placed_at > self.timeout:
+                    if order.side == OrderSide.Sell and order.replaces < self.max_replaces:
+                        action = "replace"
+                    else:
+                        action = "cancel"
+                elif now - order.updated_at > self.status_poll:
+                    action = "poll"
+                if action:
+                    order.busy = True
+                    self._enqueue(order.priority, action, order)
+
+    # ---------- 订单状态 (推送线程 / 查询) ----------
+
+    def on_order_changed(self, event):
+        with self.lock:
+            order = self.by_id.get(event.order_id)
+            if order is None:
+                # 提交返回前推送已到达: 仅缓存本程序正在提交的标的
+                pending = self.working.get(event.symbol)
+                if pending is not None and pending.order_id is None:
+                    self.early_events[event.order_id] = event
+                return
+        self._apply(order, event)
+
+    def _apply(self, order, event):
+        """按推送或查询结果处理新增成交与终结状态 (event 需含 status / executed_quantity / executed_price)"""
+        with self.lock:
+            order.updated_at = time.monotonic()
+            executed = int(event.executed_quantity or 0)
+            delta = executed - order.filled
+            if delta > 0:
+                # executed_price 为累计成交均价, 还原出本次新增部分的成交价
+                total_value = float(event.executed_price or 0) * executed
+                fill_price = (total_value - order.filled_value) / delta
+                order.filled = executed
+                order.filled_value = total_value
+                logger.info(f"[{order.symbol}] {order.label}成交 {delta} 股 @ {fill_price:.2f} "
+                            f"(累计 {executed}/{order.quantity})")
+                self.on_fill(order.symbol, order.side, delta, fill_price)
+
+            if event.status in FINAL_STATUSES:
+                if event.status == OrderStatus.Filled:
+                    self.stats_counter["filled"] += 1
+                elif event.status == OrderStatus.Rejected:
+                    self.stats_counter["rejected"] += 1
+                    logger.error(f"[{order.symbol}] {order.label}单被拒绝: {getattr(event, 'msg', '')}")
+                else:
+                    self.stats_counter["canceled"] += 1
+                self._finish(order)
@@ -0,0 +1,267 @@
+#!/usr/bin/python3
+"""
+持仓状态表: __slots__ 不可变记录 + 按标的分片 + 写时复制, 读取不加锁
+
+* PositionRecord: 单个标的的状态 (数量 / 成本价 / 最高价 / 更新时间 / 冷却到期), 创建后不再修改;
+  兼容原来的 dict 读法 record['entry_price'] / record.get('cooldown_until', 0)
+* PositionBook: 标的按哈希分到 shards 个分片, 每个分片一把写锁和一份只读映射;
+  写入时复制该分片的映射、替换其中一条记录后整体换掉引用, 读取直接取当前引用 (引用赋值是原子的)
+* 读者拿到的记录与 snapshot() 都不会再被修改, 无需加锁也无需复制
+* 不同分片的写入互不阻塞; 同一标的的读改写 (如成交回报) 用 locked(symbol) 包住
+* version 每次写入后更新为全局递增的新值, 只用于判断状态是否变化 (并发写入时不保证单调)
+
+用法:
+  python position_book.py --bench --symbols 100,500 --seconds 2     # 与单锁 dict 的读写争用对比
+"""
+import sys
+import time
+import argparse
+import itertools
+import threading
+
+FIELDS = ("quantity", "entry_price", "highest_price", "last_update", "cooldown_until")
+
+
+class PositionRecord:
+    __slots__ = FIELDS + ("extra",)
+
+    def __init__(self, quantity=0, entry_price=0, highest_price=0, last_update=None, cooldown_until=None,
+                 extra=None):
+        setattr_ = object.__setattr__
+        setattr_(self, "quantity", quantity)
+        setattr_(self, "entry_price", entry_price)
+        setattr_(self, "highest_price", highest_price)
+        setattr_(self, "last_update", last_update)
+        setattr_(self, "cooldown_until", cooldown_until)
+        setattr_(self, "extra", extra)   # 旧状态文件中的其他字段, 原样保留
+
+    def __setattr__(self, name, value):
+        raise AttributeError("PositionRecord 不可修改, 请使用 replace()")
+
+    @classmethod
+    def from_dict(cls, data):
+        extra = {key: value for key, value in data.items() if key not in FIELDS} or None
+        return cls(data.get("quantity", 0), data.get("entry_price", 0), data.get("highest_price", 0),
+                   data.get("last_update"), data.get("cooldown_until"), extra)
+
+    def replace(self, **fields):
+        values = {name: getattr(self, name) for name in FIELDS}
+        values.update(fields)
+        return PositionRecord(extra=self.extra, **values)
+
+    def to_dict(self):
+        data = dict(self.extra) if self.extra else {}
+        for name in FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+    # ---------- 兼容 dict 读法 ----------
+
+    def __getitem__(self, key):
+        if key in FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        elif self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self):
+        return f"PositionRecord({self.to_dict()})"
+
+
+EMPTY = PositionRecord()
+
+
+class Shard:
+    __slots__ = ("lock", "records")
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.records = {}              # 只读映射: 写入时整体替换, 从不原地修改
+
+
+class PositionBook:
+    def __init__(self, shards=16):
+        self.shards = tuple(Shard() for _ in range(shards))
+        self.versions = itertools.count(1)
+        self.version = 0
+
+    def _shard(self, symbol):
+        return self.shards[hash(symbol) % len(self.shards)]
+
+    # ---------- 读取 (不加锁) ----------
+
+    def get(self, symbol):
+        return self.shards[hash(symbol) % len(self.shards)].records.get(symbol)
+
+    def snapshot(self):
+        """{标的: PositionRecord}; 记录不可变, 不复制"""
+        return {symbol: record for shard in self.shards for symbol, record in shard.records.items()}
+
+    def to_dict(self):
+        """{标的: dict}, 供持久化后端写快照"""
+        return {symbol: record.to_dict() for symbol, record in self.snapshot().items()}
+
+    # ---------- 写入 ----------
+
+    def locked(self, symbol):
+        """该标的所在分片的写锁 (可重入), 用于读改写"""
+        return self._shard(symbol).lock
+
+    def update(self, symbol, **fields):
+        """覆盖该标的的若干字段, 返回新记录"""
+        shard = self._shard(symbol)
+        with shard.lock:
+            record = (shard.records.get(symbol) or EMPTY).replace(**fields)
+            records = dict(shard.records)
+            records[symbol] = record
+            shard.records = records
+            self.version = next(self.versions)
+        return record
+
+    def load(self, state):
+        """用 {标的: dict} 整体替换"""
+        grouped = [{} for _ in self.shards]
+        for symbol, data in state.items():
+            grouped[hash(symbol) % len(self.shards)][symbol] = PositionRecord.from_dict(data)
+        for shard, records in zip(self.shards, grouped):
+            with shard.lock:
+                shard.records = records
+        self.version = next(self.versions)
+
+    def clear(self):
+        self.load({})
+
+    def __len__(self):
+        return sum(len(shard.records) for shard in self.shards)
+
+
+# ==========================================
+# 争用压测: 原 StateManager 的单锁 dict (写入时在锁内记录变更) vs 分片写时复制
+# ==========================================
+
+class LockedBook:
+    """原实现: 全部标的一个嵌套 dict, 读写都持有同一把 RLock, 写入在锁内调用持久化"""
+
+    def __init__(self, io_seconds):
+        self.state = {}
+        self.lock = threading.RLock()
+        self.io_seconds = io_seconds
+
+    def get_position(self, symbol):
+        with self.lock:
+            data = self.state.get(symbol, {})
+            return data if data.get("quantity", 0) > 0 else None
+
+    def is_in_cooldown(self, symbol):
+        with self.lock:
+            cooldown_ts = self.state.get(symbol, {}).get("cooldown_until", 0)
+            return bool(cooldown_ts) and time.time() < cooldown_ts
+
+    def update_highest(self, symbol, price):
+        with self.lock:
+            self.state.setdefault(symbol, {"quantity": 100, "entry_price": 10.0})["highest_price"] = price
+            if self.io_seconds:
+                time.sleep(self.io_seconds)
+
+
+class ShardedBook:
+    """新实现: 读取不加锁, 写入只锁该标的所在分片 (持久化调用仍在分片锁内, 保证同一标的的记录顺序)"""
+
+    def __init__(self, io_seconds, shards=16):
+        self.book = PositionBook(shards)
+        self.io_seconds = io_seconds
+
+    def get_position(self, symbol):
+        record = self.book.get(symbol)
+        return record if record is not None and record.quantity > 0 else None
+
+    def is_in_cooldown(self, symbol):
+        record = self.book.get(symbol)
+        return record is not None and bool(record.cooldown_until) and time.time() < record.cooldown_until
+
+    def update_highest(self, symbol, price):
+        with self.book.locked(symbol):
+            if self.book.get(symbol) is None:
+                self.book.update(symbol, quantity=100, entry_price=10.0, highest_price=price)
+            else:
+                self.book.update(symbol, highest_price=price)
+            if self.io_seconds:
+                time.sleep(self.io_seconds)
+
+
+def bench(book, n_symbols, seconds, write_every=50):
+    """每个标的一个线程: 循环读取持仓与冷却状态, 每 write_every 次读取写一次最高价; 返回读吞吐与读延迟分位"""
+    symbols = [f"S{i:04d}.US" for i in range(n_symbols)]
+    for symbol in symbols:
+        book.update_highest(symbol, 10.0)
+    start = threading.Event()
+    stop = threading.Event()
+    results = []
+    results_lock = threading.Lock()
+
+    def worker(symbol):
+        reads, worst, samples = 0, 0.0, []
+        price = 10.0
+        start.wait()
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            book.get_position(symbol)
+            book.is_in_cooldown(symbol)
+            elapsed = time.perf_counter() - t0
+            reads += 1
+            if reads % 16 == 0:
+                samples.append(elapsed)
+            if elapsed > worst:
+                worst = elapsed
+            if reads % write_every == 0:
+                price += 0.01
+                book.update_highest(symbol, price)
+        with results_lock:
+            results.append((reads, worst, samples))
+
+    threads = [threading.Thread(target=worker, args=(symbol,), daemon=True) for symbol in symbols]
+    for t in threads:
+        t.start()
+    start.set()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    reads = sum(r for r, _, _ in results)
+    samples = sorted(s for _, _, batch in results for s in batch)
+    p99 = samples[int(len(samples) * 0.99)] if samples else 0.0
+    return {"reads_per_sec": reads / seconds, "p99_us": p99 * 1e6, "max_ms": max(w for _, w, _ in results) * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="持仓状态表争用压测")
+    parser.add_argument("--bench", action="store_true")
+    parser.add_argument("--symbols", default="100,500", help="标的 (线程) 数, 逗号分隔")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--write-every", type=int, default=50, help="每多少次读取写一次")
+    parser.add_argument("--io-ms", type=float, default=0.2, help="每次写入在锁内的持久化耗时 (模拟 SQLite 写入)")
+    args = parser.parse_args()
+    if not args.bench:
+        parser.print_help()
+        sys.exit(1)
+
+    print(f"{'标的数':>6}{'实现':>10}{'读/秒':>14}{'读 p99(µs)':>14}{'读最大(ms)':>14}")
+    for n in (int(x) for x in args.symbols.split(',')):
+        for name, book in (("单锁", LockedBook(args.io_ms / 1000)), ("分片COW", ShardedBook(args.io_ms / 1000))):
+            r = bench(book, n, args.seconds, args.write_every)
+            print(f"{n:>8}{name:>10}{r['reads_per_sec']:>16,.0f}{r['p99_us']:>16.1f}{r['max_ms']:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
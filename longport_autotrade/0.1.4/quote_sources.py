@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+"""
+多数据源报价: 主源在延迟预算内未返回时, 同时向备用源发出请求, 取最先返回的有效报价
+
+* LongportQuoteSource: 长桥 QuoteContext.quote(), 转换为 Finnhub quote 格式
+* HedgedQuoteSource:   对冲请求 + 自动切换主源
+    - 主源请求发出后 hedge_after 秒仍未返回 (或已出错), 立即请求下一个源; 总超时 timeout 秒
+    - 价格 <= 0 的返回视为无效, 与异常同样计入错误率
+    - 每个源记录最近 window 次调用的延迟 (p50 / p99) 与错误率, 输掉竞速的请求同样计入
+    - 近期错误率不超过 max_error_rate 的源中 p50 最低者为主源; 新主源需快 switch_margin 以上才切换, 避免来回抖动
+    - 每 probe_every 次请求同时探测全部源, 备用源长期不被使用时统计也不过期
+
+用法 (longport_autotrade.py): QUOTE_SOURCES=finnhub,longport 时启用, QuotePoller / FinnhubStreamFeed 直接使用。
+"""
+import time
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+class QuoteUnavailable(Exception):
+    """全部数据源均失败或超时"""
+
+
+class LongportQuoteSource:
+    """长桥行情 (需要行情权限); 代码直接使用长桥格式 DXYZ.US"""
+    name = "longport"
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+
+    def fetch(self, symbol):
+        quotes = self.ctx.quote([symbol])
+        if not quotes:
+            raise QuoteUnavailable(f"长桥未返回 {symbol} 行情")
+        q = quotes[0]
+        current, prev_close = float(q.last_done), float(q.prev_close)
+        return {
+            "c": current, "o": float(q.open), "h": float(q.high), "l": float(q.low), "pc": prev_close,
+            "d": round(current - prev_close, 4),
+            "dp": round((current - prev_close) / prev_close * 100, 4) if prev_close else 0.0,
+            "v": int(q.volume), "t": int(q.timestamp.timestamp()),
+        }
+
+
+class SourceStats:
+    __slots__ = ("latencies", "outcomes", "calls", "errors", "wins")
+
+    def __init__(self, window):
+        self.latencies = deque(maxlen=window)   # 成功调用的耗时 (秒)
+        self.outcomes = deque(maxlen=window)    # 最近调用是否出错
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0                            # 作为最终结果被采用的次数
+
+    def percentile(self, pct):
+        if not self.latencies:
+            return None
+        values = sorted(self.latencies)
+        return values[min(len(values) - 1, int(len(values) * pct))]
+
+    @property
+    def error_rate(self):
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class HedgedQuoteSource:
+    def __init__(self, sources, hedge_after=0.3, timeout=5.0, window=200, max_error_rate=0.2,
+                 switch_margin=0.2, probe_every=50, validate=None):
+        if not sources:
+            raise ValueError("至少需要一个数据源")
+        self.sources = list(sources)
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        self.max_error_rate = max_error_rate
+        self.switch_margin = switch_margin
+        self.probe_every = probe_every
+        self.validate = validate or (lambda quote: bool(quote) and float(quote.get('c') or 0) > 0)
+        self.stats_by_source = {source.name: SourceStats(window) for source in self.sources}
+        self.primary = self.sources[0]
+        self.lock = threading.Lock()
+        # 每个源独立线程池: 某个源卡住时只占满自己的线程, 不影响向其他源发请求
+        self.pools = {source.name: ThreadPoolExecutor(max_workers=4, thread_name_prefix=f"Quote-{source.name}")
+                      for source in self.sources}
+        self.requests = 0
+        self.hedged = 0        # 触发备用请求的次数
+        self.failed = 0        # 全部源均失败的次数
+        self.switches = 0
+
+    # ---------- 调用 ----------
+
+    def _call(self, source, symbol):
+        started = time.perf_counter()
+        error = None
+        try:
+            quote = source.fetch(symbol)
+            if not self.validate(quote):
+                error = QuoteUnavailable(f"{source.name} 返回无效报价: {quote}")
+        except Exception as e:
+            error = e
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            stats = self.stats_by_source[source.name]
+            stats.calls += 1
+            stats.outcomes.append(error is not None)
+            if error is None:
+                stats.latencies.append(elapsed)
+            else:
+                stats.errors += 1
+        if error is not None:
+            raise error
+        return quote
+
+    def ordered_sources(self):
+        with self.lock:
+            primary = self.primary
+        return [primary] + [source for source in self.sources if source is not primary]
+
+    def fetch(self, symbol):
+        """返回最先到达的有效报价; 全部失败时抛出 QuoteUnavailable (附各源错误)"""
+        self.requests += 1
+        order = self.ordered_sources()
+        probe = len(order) > 1 and self.probe_every and self.requests % self.probe_every == 0
+        started = time.monotonic()
+        deadline = started + self.timeout
+        pending = {}
+        errors = []
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            source = order[launched]
+            pending[self.pools[source.name].submit(self._call, source, symbol)] = source
+            launched += 1
+
+        launch()
+        while probe and launched < len(order):
+            launch()
+        next_hedge = started + self.hedge_after
+
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wake_at = min(deadline, next_hedge) if launched < len(order) else deadline
+            done, _ = wait(pending, timeout=max(0.0, wake_at - now), return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    quote = future.result()
+                except Exception as e:
+                    errors.append(f"{source.name}: {e}")
+                    continue
+                with self.lock:
+                    self.stats_by_source[source.name].wins += 1
+                self._maybe_switch()
+                return quote
+            # 超过延迟预算或当前请求都已失败: 追加下一个源
+            if launched < len(order) and (time.monotonic() >= next_hedge or not pending):
+                self.hedged += 1
+                launch()
+                next_hedge = time.monotonic() + self.hedge_after
+
+        self.failed += 1
+        self._maybe_switch()
+        if pending:
+            errors.extend(f"{source.name}: 超时 ({self.timeout}s)" for source in pending.values())
+        raise QuoteUnavailable(f"{symbol} 全部行情源失败: {'; '.join(errors)}")
+
+    # ---------- 主源选择 ----------
+
+    def _maybe_switch(self):
+        with self.lock:
+            healthy = []
+            for source in self.sources:
+                stats = self.stats_by_source[source.name]
+                p50 = stats.percentile(0.5)
+                if p50 is not None and stats.error_rate <= self.max_error_rate:
+                    healthy.append((p50, source))
+            if not healthy:
+                return
+            best_p50, best = min(healthy, key=lambda item: item[0])
+            current = self.stats_by_source[self.primary.name]
+            current_p50 = current.percentile(0.5)
+            current_ok = current_p50 is not None and current.error_rate <= self.max_error_rate
+            if best is self.primary or (current_ok and best_p50 > current_p50 * (1 - self.switch_margin)):
+                return
+            old, self.primary = self.primary, best
+            self.switches += 1
+        reason = (f"p50 {current_p50 * 1000:.0f}ms, 错误率 {current.error_rate:.0%}" if current_p50 is not None
+                  else f"尚无成功返回, 错误率 {current.error_rate:.0%}")
+        logger.warning(f"行情主源切换: {old.name} -> {best.name} (p50 {best_p50 * 1000:.0f}ms; 原主源 {reason})")
+
+    # ---------- 统计 ----------
+
+    def stats(self):
+        """供 /metrics 导出: 每个源的延迟分位、错误率与采用次数"""
+        values = {"requests": self.requests, "hedged": self.hedged, "failed": self.failed, "switches": self.switches}
+        with self.lock:
+            for name, stats in self.stats_by_source.items():
+                labels = f'{{source="{name}"}}'
+                p50, p99 = stats.percentile(0.5), stats.percentile(0.99)
+                values[f"p50_ms{labels}"] = round(p50 * 1000, 2) if p50 is not None else -1
+                values[f"p99_ms{labels}"] = round(p99 * 1000, 2) if p99 is not None else -1
+                values[f"error_rate{labels}"] = round(stats.error_rate, 4)
+                values[f"calls{labels}"] = stats.calls
+                values[f"wins{labels}"] = stats.wins
+                values[f"primary{labels}"] = int(name == self.primary.name)
+        return values
+
+    def close(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False)
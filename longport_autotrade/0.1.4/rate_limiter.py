@@ -0,0 +1,156 @@
+#!/usr/bin/python3
+"""
+进程级令牌桶限流 (线程安全, 同时支持 asyncio)
+
+每个外部接口一个 RateLimiter, 所有线程 / 协程共享同一份额度:
+  * finnhub:        免费版约 60 次/分钟
+  * longport_trade: 长桥交易接口 30 秒内不超过 30 次
+
+等待中的请求按 (优先级, 到达顺序) 排队, 令牌只发给队首, 因此持仓标的的行情
+与卖单总是先于空仓标的。超时仍未拿到令牌的请求记为 dropped 并返回 False。
+遇到 429 时调用 backoff() 清空令牌并整体暂停, 避免各线程同时重试。
+
+协程使用 acquire_async(): 与线程共用同一队列, 等待期间让出事件循环; 被取消时归还排队位置,
+不会因残留的队首票据卡住其他等待者。
+"""
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+
+# 优先级: 数字越小越优先
+PRIORITY_HIGH = 0      # 卖单 / 持仓标的行情
+PRIORITY_NORMAL = 1    # 买单 / 空仓标的行情
+PRIORITY_LOW = 2       # 冷却期标的 / 行情底稿刷新
+
+
+class RateLimiter:
+    def __init__(self, name, rate, per, burst=None):
+        self.name = name
+        self.rate = rate / float(per)            # 每秒补充的令牌数
+        self.capacity = float(burst if burst is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+        self.cond = threading.Condition()
+        self.queue = []                          # 等待队列: (priority, seq)
+        self.counter = itertools.count()
+
+        # 统计
+        self.granted = 0
+        self.throttled = 0                       # 需要排队等待才拿到令牌
+        self.dropped = 0                         # 超时放弃
+
+    # ---------- 内部 ----------
+
+    def _refill(self, now):
+        if now < self.paused_until:
+            self.updated = now
+            return
+        start = max(self.updated, self.paused_until)
+        self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self.updated = now
+
+    def _try_take(self, ticket):
+        """持锁调用: 队首且有令牌则取走并返回 0, 否则返回建议等待秒数"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.queue[0] == ticket and self.tokens >= 1:
+            self.tokens -= 1
+            heapq.heappop(self.queue)
+            self.granted += 1
+            self.cond.notify_all()
+            return 0.0
+        if now < self.paused_until:
+            return self.paused_until - now
+        return max((1 - self.tokens) / self.rate, 0.001)
+
+    def _enqueue(self, priority):
+        ticket = (priority, next(self.counter))
+        heapq.heappush(self.queue, ticket)
+        return ticket
+
+    def _abandon(self, ticket):
+        self.queue.remove(ticket)
+        heapq.heapify(self.queue)
+        self.dropped += 1
+        self.cond.notify_all()
+
+    # ---------- 对外接口 ----------
+
+    def acquire(self, priority=PRIORITY_NORMAL, timeout=None):
+        """阻塞获取一个令牌; 超时返回 False (记为 dropped)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            ticket = self._enqueue(priority)
+            waited = False
+            while True:
+                wait = self._try_take(ticket)
+                if wait == 0:
+                    if waited:
+                        self.throttled += 1
+                    return True
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._abandon(ticket)
+                        return False
+                    wait = min(wait, remaining)
+                waited = True
+                self.cond.wait(wait)
+
+    async def acquire_async(self, priority=PRIORITY_NORMAL, timeout=None):
+        """asyncio 版本: 按令牌补充时间休眠并让出事件循环; 超时返回 False, 被取消时归还排队位置"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            ticket = self._enqueue(priority)
+        waited = False
+        try:
+            while True:
+                with self.cond:
+                    wait = self._try_take(ticket)
+                    if wait == 0:
+                        if waited:
+                            self.throttled += 1
+                        return True
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._abandon(ticket)
+                            return False
+                        wait = min(wait, remaining)
+                waited = True
+                # 协程收不到 Condition 通知: 按预计可取令牌的时间休眠, 不做固定间隔轮询
+                await asyncio.sleep(wait)
+        except BaseException:
+            with self.cond:
+                if ticket in self.queue:
+                    self._abandon(ticket)
+            raise
+
+    def backoff(self, seconds):
+        """服务端限流 (429) 时调用: 清空令牌并暂停发放 seconds 秒"""
+        with self.cond:
+            self.tokens = 0.0
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.cond.notify_all()
+
+    def stats(self):
+        with self.cond:
+            return {
+                "granted": self.granted,
+                "throttled": self.throttled,
+                "dropped": self.dropped,
+                "queued": len(self.queue),
+                "tokens": round(self.tokens, 2),
+            }
+
+
+def is_rate_limit_error(err):
+    """判断是否为接口限流错误 (HTTP 429 或 SDK 错误信息中包含限流字样)"""
+    if getattr(err, "status_code", None) == 429:
+        return True
+    text = str(err).lower()
+    return "429" in text or "rate limit" in text or "too many requests" in text
@@ -0,0 +1,300 @@
+#!/usr/bin/python3
+"""
+本地模拟券商: 与长桥 TradeContext 接口兼容的替身, 用于离线联调与下单延迟压测
+
+支持的接口 (参数与返回字段与 longport.openapi 一致):
+  submit_order / cancel_order / replace_order / order_detail / today_orders
+  stock_positions / set_on_order_changed / subscribe / unsubscribe
+
+撮合模型:
+  * 每次调用先按 latency + 指数分布的 jitter 阻塞, 模拟网络往返
+  * 按 reject_rate 概率直接拒单; 资金或可卖持仓不足同样拒单 (抛出 SimOrderRejected)
+  * 限价单: 买单在现价 <= 限价、卖单在现价 >= 限价时按现价成交; 市价单按现价成交
+  * 按 partial_fill_rate 概率本次只成交剩余数量的一部分, 余量留待后续撮合
+  * 现价由 price_fn(symbol) 提供 (通常取共享行情源的最新报价)
+  * 每次成交 / 撤单都通过 set_on_order_changed 注册的回调推送 (在撮合线程中调用, 与 SDK 推送线程一致)
+"""
+import time
+import random
+import itertools
+import threading
+import logging
+from collections import deque
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from longport.openapi import OrderStatus, OrderSide, OrderType
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = (OrderStatus.New, OrderStatus.PartialFilled)
+
+
+class SimOrderRejected(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"OpenApiException: (code={code}) {message}")
+        self.code = code
+        self.message = message
+
+
+class SimTradeContext:
+    def __init__(self, price_fn, latency=0.05, jitter=0.02, reject_rate=0.0, partial_fill_rate=0.0,
+                 fill_interval=0.2, cash=100000, seed=None):
+        self.price_fn = price_fn
+        self.latency = latency
+        self.jitter = jitter
+        self.reject_rate = reject_rate
+        self.partial_fill_rate = partial_fill_rate
+        self.fill_interval = fill_interval
+        self.rng = random.Random(seed)
+
+        self.lock = threading.RLock()
+        self.orders = {}                # order_id -> 订单 (SimpleNamespace, 字段同 longport Order)
+        self.positions = {}             # symbol -> {"quantity": Decimal, "cost": Decimal}
+        self.cash = Decimal(str(cash))
+        self.ids = itertools.count(1)
+        self.on_order_changed = None
+
+        # 统计
+        self.submitted = 0
+        self.rejected = 0
+        self.fills = 0
+        self.partial_fills = 0
+        self.ack_latency = deque(maxlen=100000)   # submit_order 调用耗时 (秒)
+        self.fill_latency = deque(maxlen=100000)  # 提交到完全成交 (秒)
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="Thread-SimBroker", daemon=True)
+        self.thread.start()
+        logger.info(f"模拟券商已启用 (延迟 {latency * 1000:.0f}ms ± {jitter * 1000:.0f}ms, "
+                    f"拒单率 {reject_rate:.0%}, 部分成交率 {partial_fill_rate:.0%})")
+
+    # ---------- 内部 ----------
+
+    def _network(self):
+        delay = self.latency + (self.rng.expovariate(1 / self.jitter) if self.jitter else 0)
+        time.sleep(delay)
+
+    def _price(self, symbol):
+        try:
+            return float(self.price_fn(symbol) or 0)
+        except Exception:
+            return 0.0
+
+    def _push(self, order, last_share=Decimal(0), last_price=None):
+        callback = self.on_order_changed
+        if callback is None:
+            return
+        event = SimpleNamespace(
+            order_id=order.order_id, symbol=order.symbol, side=order.side, order_type=order.order_type,
+            status=order.status, submitted_quantity=order.quantity, submitted_price=order.price,
+            executed_quantity=order.executed_quantity, executed_price=order.executed_price,
+            last_share=last_share, last_price=last_price, submitted_at=order.submitted_at,
+            updated_at=order.updated_at, msg=order.msg, tag=None, stock_name=order.symbol,
+        )
+        try:
+            callback(event)
+        except Exception as e:
+            logger.error(f"订单推送回调异常: {e}")
+
+    def _match(self, order):
+        """持锁调用: 按现价尝试撮合, 返回本次成交 (数量, 价格) 或 None"""
+        price = self._price(order.symbol)
+        if price <= 0:
+            return None
+        if order.order_type != OrderType.MO:
+            limit = float(order.price)
+            if order.side == OrderSide.Buy and price > limit:
+                return None
+            if order.side == OrderSide.Sell and price < limit:
+                return None
+
+        remaining = order.quantity - order.executed_quantity
+        quantity = remaining
+        if remaining > 1 and self.rng.random() < self.partial_fill_rate:
+            quantity = Decimal(self.rng.randint(1, int(remaining) - 1))
+        fill_price = Decimal(f"{price:.4f}")
+
+        # 成交均价与账户
+        executed = order.executed_quantity + quantity
+        order.executed_price = ((order.executed_price or Decimal(0)) * order.executed_quantity
+                                + fill_price * quantity) / executed
+        order.executed_quantity = executed
+        order.status = OrderStatus.Filled if executed == order.quantity else OrderStatus.PartialFilled
+        order.updated_at = datetime.now()
+
+        holding = self.positions.setdefault(order.symbol, {"quantity": Decimal(0), "cost": Decimal(0)})
+        if order.side == OrderSide.Buy:
+            total = holding["quantity"] + quantity
+            holding["cost"] = (holding["cost"] * holding["quantity"] + fill_price * quantity) / total
+            holding["quantity"] = total
+            self.cash -= fill_price * quantity
+        else:
+            holding["quantity"] -= quantity
+            self.cash += fill_price * quantity
+            if holding["quantity"] == 0:
+                holding["cost"] = Decimal(0)
+
+        self.fills += 1
+        if order.status == OrderStatus.Filled:
+            self.fill_latency.append(time.monotonic() - order.created)
+        else:
+            self.partial_fills += 1
+        return quantity, fill_price
+
+    def _run(self):
+        while not self.stop_event.wait(self.fill_interval):
+            events = []
+            with self.lock:
+                for order in self.orders.values():
+                    if order.status in OPEN_STATUSES:
+                        fill = self._match(order)
+                        if fill:
+                            events.append((order, fill))
+            for order, (quantity, price) in events:
+                self._push(order, quantity, price)
+
+    def _get_open(self, order_id):
+        order = self.orders.get(order_id)
+        if order is None:
+            raise SimOrderRejected(603001, f"order not found: {order_id}")
+        if order.status not in OPEN_STATUSES:
+            raise SimOrderRejected(603002, f"order is not open: {order.status}")
+        return order
+
+    # ---------- TradeContext 接口 ----------
+
+    def submit_order(self, symbol, order_type, side, submitted_quantity, time_in_force,
+                     submitted_price=None, **kwargs):
+        started = time.monotonic()
+        self._network()
+        with self.lock:
+            self.submitted += 1
+            quantity = Decimal(submitted_quantity)
+            reason = None
+            if self.rng.random() < self.reject_rate:
+                reason = "simulated reject"
+            elif side == OrderSide.Buy:
+                price = submitted_price if submitted_price is not None else Decimal(str(self._price(symbol)))
+                if price * quantity > self.cash:
+                    reason = "insufficient buying power"
+            else:
+                holding = self.positions.get(symbol, {}).get("quantity", Decimal(0))
+                committed = sum(o.quantity - o.executed_quantity for o in self.orders.values()
+                                if o.symbol == symbol and o.side == OrderSide.Sell and o.status in OPEN_STATUSES)
+                if quantity > holding - committed:
+                    reason = "insufficient available quantity"
+            if reason:
+                self.rejected += 1
+                self.ack_latency.append(time.monotonic() - started)
+                raise SimOrderRejected(602001, reason)
+
+            now = datetime.now()
+            order = SimpleNamespace(
+                order_id=str(next(self.ids)), symbol=symbol, side=side, order_type=order_type,
+                status=OrderStatus.New, quantity=quantity, executed_quantity=Decimal(0),
+                price=submitted_price, executed_price=None, time_in_force=time_in_force,
+                submitted_at=now, updated_at=now, msg="", created=started,
+            )
+            self.orders[order.order_id] = order
+            # 可立即成交的订单在受理时撮合一次, 与交易所即时成交一致
+            fill = self._match(order)
+        self.ack_latency.append(time.monotonic() - started)
+        if fill:
+            self._push(order, *fill)
+        return SimpleNamespace(order_id=order.order_id)
+
+    def cancel_order(self, order_id):
+        self._network()
+        with self.lock:
+            order = self._get_open(order_id)
+            order.status = OrderStatus.Canceled
+            order.updated_at = datetime.now()
+        self._push(order)
+
+    def replace_order(self, order_id, quantity, price=None, **kwargs):
+        self._network()
+        with self.lock:
+            order = self._get_open(order_id)
+            quantity = Decimal(quantity)
+            if quantity < order.executed_quantity:
+                raise SimOrderRejected(602003, "quantity below executed quantity")
+            order.quantity = quantity
+            if price is not None:
+                order.price = price
+            order.updated_at = datetime.now()
+            fill = self._match(order) if order.executed_quantity < quantity else None
+            if order.executed_quantity == quantity:
+                order.status = OrderStatus.Filled
+        if fill:
+            self._push(order, *fill)
+
+    def order_detail(self, order_id):
+        self._network()
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                raise SimOrderRejected(603001, f"order not found: {order_id}")
+            return SimpleNamespace(**vars(order))
+
+    def today_orders(self, symbol=None, status=None, side=None, market=None, order_id=None):
+        self._network()
+        with self.lock:
+            return [SimpleNamespace(**vars(o)) for o in self.orders.values()
+                    if (symbol is None or o.symbol == symbol)
+                    and (status is None or o.status in status)
+                    and (side is None or o.side == side)
+                    and (order_id is None or o.order_id == order_id)]
+
+    def stock_positions(self, symbols=None):
+        self._network()
+        with self.lock:
+            positions = []
+            for symbol, holding in self.positions.items():
+                if holding["quantity"] <= 0 or (symbols and symbol not in symbols):
+                    continue
+                committed = sum(o.quantity - o.executed_quantity for o in self.orders.values()
+                                if o.symbol == symbol and o.side == OrderSide.Sell and o.status in OPEN_STATUSES)
+                positions.append(SimpleNamespace(
+                    symbol=symbol, symbol_name=symbol, quantity=holding["quantity"],
+                    available_quantity=holding["quantity"] - committed, cost_price=holding["cost"],
+                    currency="USD", market="US",
+                ))
+        return SimpleNamespace(channels=[SimpleNamespace(account_channel="sim", positions=positions)])
+
+    def set_on_order_changed(self, callback):
+        self.on_order_changed = callback
+
+    def subscribe(self, topics):
+        pass
+
+    def unsubscribe(self, topics):
+        pass
+
+    # ---------- 统计 ----------
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join(timeout=self.fill_interval + 1)
+
+    def stats(self):
+        def pct(samples, q):
+            if not samples:
+                return 0.0
+            ordered = sorted(samples)
+            return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+        with self.lock:
+            ack, fill = list(self.ack_latency), list(self.fill_latency)
+            return {
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "fills": self.fills,
+                "partial_fills": self.partial_fills,
+                "open": sum(1 for o in self.orders.values() if o.status in OPEN_STATUSES),
+                "ack_p50_ms": pct(ack, 0.50),
+                "ack_p99_ms": pct(ack, 0.99),
+                "fill_p50_ms": pct(fill, 0.50),
+                "fill_p99_ms": pct(fill, 0.99),
+            }
@@ -0,0 +1,338 @@
+#!/usr/bin/python3
+"""
+交易状态持久化后端 (StateManager 通过 STATE_BACKEND 选择)
+
+两种后端接口一致: exists() / load() / record(symbol, fields) / save(snapshot_fn) / start() / stop()
+
+JournalStore: 追加写日志 (journal) + 定期压缩快照
+  * 热路径 record() 只把变更放入内存队列, 不做任何文件 I/O
+  * 后台线程每 flush_interval 秒批量追加到 journal 并 fsync
+  * journal 累计 compact_every 条后, 将完整状态写入临时文件再原子 rename 为快照, 并清空 journal
+  * 启动时 load() = 读取快照 + 按顺序重放 journal (末尾写了一半的行会被忽略)
+
+journal 每行一条变更: {"s": 代码, "set": {字段: 值}}
+所有变更都是字段覆盖, 重复重放结果不变, 因此压缩与清空 journal 之间崩溃也不会出错。
+
+SqliteStore: 嵌入式 SQLite (WAL 模式), 每个标的一行
+  * record() 只 UPSERT 该标的的一行中变更的列, 不再整体序列化
+  * 成交 / 冷却等变更同步写入; 只更新最高价的变更按标的合并, 由后台线程每 flush_interval 秒在一个事务中写入
+    (持仓创新高很频繁, 不在行情线程上逐笔提交); 同一标的随后的同步写入会带上尚未落盘的最高价
+  * WAL 模式下外部工具可随时只读查询持仓, 不会与写入互相阻塞
+  * 首次启动时自动从旧的 trade_state.json (+ journal) 迁移, 包括无后缀的旧代码 (DXYZ -> DXYZ.US);
+    迁移或首次写入后以 PRAGMA user_version 标记数据库已初始化, 之后不再读取旧文件 (清仓 / 重置后表为空也不会重新导入)
+
+命令行迁移: python state_store.py migrate trade_state.json trade_state.db
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class JournalStore:
+    def __init__(self, state_file, journal_file=None, flush_interval=1.0, compact_every=500):
+        self.state_file = state_file
+        self.journal_file = journal_file or os.path.splitext(state_file)[0] + ".journal"
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+
+        self.pending = []                 # 尚未落盘的变更
+        self.pending_lock = threading.Lock()
+        self.io_lock = threading.Lock()   # 串行化 journal 追加与快照压缩
+        self.journal_entries = 0          # 上次压缩后 journal 中的条数
+        self.snapshot_fn = None           # 返回当前完整状态 (副本), 由 start() 注入
+
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    # ---------- 读取 ----------
+
+    def exists(self):
+        return os.path.exists(self.state_file) or os.path.exists(self.journal_file)
+
+    def load(self):
+        """快照 + journal 重放, 返回状态 dict"""
+        state = {}
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+
+        replayed = 0
+        if os.path.exists(self.journal_file):
+            good_offset = 0
+            torn = False
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        torn = True
+                        break
+                    apply_entry(state, entry)
+                    replayed += 1
+                    good_offset += len(line)
+            if torn:
+                # 截掉写了一半的记录, 避免之后追加的变更与残行拼在一起
+                logger.warning("journal 末尾存在不完整记录 (上次异常退出)，已忽略")
+                with open(self.journal_file, 'r+b') as f:
+                    f.truncate(good_offset)
+        self.journal_entries = replayed
+        if replayed:
+            logger.info(f"已从 journal 重放 {replayed} 条状态变更。")
+        return state
+
+    # ---------- 写入 ----------
+
+    def record(self, symbol, fields):
+        """热路径: 记录一个标的的字段变更, 只入队不落盘"""
+        with self.pending_lock:
+            self.pending.append({"s": symbol, "set": dict(fields)})
+
+    def flush(self):
+        """把队列中的变更批量追加到 journal"""
+        with self.io_lock:
+            return self._flush_locked()
+
+    def _flush_locked(self):
+        with self.pending_lock:
+            batch, self.pending = self.pending, []
+        if not batch:
+            return 0
+        with open(self.journal_file, 'a') as f:
+            f.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in batch))
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_entries += len(batch)
+        return len(batch)
+
+    def save(self, snapshot_fn):
+        """压缩: 写入完整快照 (临时文件 + 原子 rename), 然后清空 journal
+
+        先落盘队列再取快照: 取快照之后才发生的变更仍留在队列里, 清空 journal 后再追加, 不会丢失。
+        """
+        with self.io_lock:
+            self._flush_locked()
+            state = snapshot_fn()
+            tmp_file = self.state_file + ".tmp"
+            with open(tmp_file, 'w') as f:
+                json.dump(state, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.state_file)
+            # 快照已包含全部变更; 若在此处崩溃, 重放旧 journal 也只是重复覆盖
+            open(self.journal_file, 'w').close()
+            self.journal_entries = 0
+
+    # ---------- 后台写线程 ----------
+
+    def start(self, snapshot_fn):
+        self.snapshot_fn = snapshot_fn
+        self.thread = threading.Thread(target=self._run, name="Thread-StateWriter", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                if self.journal_entries >= self.compact_every and self.snapshot_fn:
+                    started = time.monotonic()
+                    self.save(self.snapshot_fn)
+                    logger.debug(f"状态快照已压缩 ({(time.monotonic() - started) * 1000:.1f}ms)")
+            except Exception as e:
+                logger.error(f"状态落盘失败: {e}")
+
+
+def apply_entry(state, entry):
+    state.setdefault(entry["s"], {}).update(entry["set"])
+
+
+def normalize_symbols(state):
+    """【防重复买入修复】：自动将旧记录 "DXYZ" 转换为 "DXYZ.US"，返回转换的个数"""
+    old_keys = [key for key in state if "." not in key]
+    for key in old_keys:
+        state[f"{key}.US"] = state.pop(key)
+    return len(old_keys)
+
+
+class SqliteStore:
+    COLUMNS = ("quantity", "entry_price", "highest_price", "last_update", "cooldown_until")
+    DEFERRED_COLUMNS = frozenset({"highest_price"})   # 只含这些列的变更由后台批量写入
+    SCHEMA_VERSION = 1                                  # PRAGMA user_version; 0 = 尚未初始化 (可从旧 JSON 迁移)
+
+    def __init__(self, db_file, legacy_state_file=None, legacy_journal_file=None, flush_interval=1.0):
+        self.db_file = db_file
+        self.legacy_state_file = legacy_state_file
+        self.legacy_journal_file = legacy_journal_file
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()          # 串行化数据库访问
+        self.conn = None
+
+        self.pending = {}                     # 尚未落盘的最高价变更: 标的 -> {列: 值}
+        self.pending_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _connect(self):
+        if self.conn is None:
+            # isolation_level=None: 单条 UPSERT 自动提交; 批量写入显式 BEGIN
+            self.conn = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS positions ("
+                " symbol TEXT PRIMARY KEY,"
+                " quantity INTEGER, entry_price REAL, highest_price REAL,"
+                " last_update TEXT, cooldown_until REAL)"
+            )
+        return self.conn
+
+    def _legacy_exists(self):
+        return bool(self.legacy_state_file) and (
+            os.path.exists(self.legacy_state_file)
+            or bool(self.legacy_journal_file) and os.path.exists(self.legacy_journal_file))
+
+    def _initialized(self):
+        """数据库是否已是状态来源; 旧版本创建的数据库没有版本标记, 表中有数据即视为已初始化并补上标记"""
+        with self.lock:
+            conn = self._connect()
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= self.SCHEMA_VERSION:
+                return True
+            if conn.execute("SELECT COUNT(*) FROM positions").fetchone()[0] == 0:
+                return False
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            return True
+
+    def exists(self):
+        if os.path.exists(self.db_file) and self._initialized():
+            return True
+        return self._legacy_exists()
+
+    def load(self):
+        if not self._initialized() and self._legacy_exists():
+            self.migrate_from_json(self.legacy_state_file, self.legacy_journal_file)
+        with self.lock:
+            cursor = self._connect().execute(f"SELECT symbol, {', '.join(self.COLUMNS)} FROM positions")
+            state = {}
+            for row in cursor:
+                data = {col: value for col, value in zip(self.COLUMNS, row[1:]) if value is not None}
+                # 旧版本建表时 quantity 为 REAL, 读出 37.0; 还原为整数股数
+                if isinstance(data.get("quantity"), float) and data["quantity"].is_integer():
+                    data["quantity"] = int(data["quantity"])
+                state[row[0]] = data
+        return state
+
+    def migrate_from_json(self, state_file, journal_file=None):
+        """从旧的 JSON 快照 (+ journal) 导入, 同时修正无后缀代码"""
+        state = JournalStore(state_file, journal_file).load()
+        fixed = normalize_symbols(state)
+        self.save(lambda: state)
+        logger.info(f"已从 {state_file} 迁移 {len(state)} 个标的到 {self.db_file} (修正旧代码 {fixed} 个)。")
+        return state
+
+    def record(self, symbol, fields):
+        """只更新该标的一行中变更的列; 只更新最高价时入队, 由后台线程合并写入"""
+        fields = {col: value for col, value in fields.items() if col in self.COLUMNS}
+        if not fields:
+            return
+        if fields.keys() <= self.DEFERRED_COLUMNS and self.thread is not None:
+            with self.pending_lock:
+                self.pending.setdefault(symbol, {}).update(fields)
+            return
+        with self.lock:
+            with self.pending_lock:
+                fields = {**self.pending.pop(symbol, {}), **fields}
+            self._upsert(self._connect(), symbol, fields)
+
+    def _upsert(self, conn, symbol, fields):
+        columns = list(fields)
+        placeholders = ', '.join('?' for _ in columns)
+        updates = ', '.join(f"{col}=excluded.{col}" for col in columns)
+        sql = (f"INSERT INTO positions (symbol, {', '.join(columns)}) VALUES (?, {placeholders}) "
+               f"ON CONFLICT(symbol) DO UPDATE SET {updates}")
+        conn.execute(sql, [symbol] + [fields[col] for col in columns])
+
+    def flush(self):
+        """把合并后的最高价变更在一个事务中写入, 返回写入的标的数"""
+        with self.lock:
+            with self.pending_lock:
+                batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for symbol, fields in batch.items():
+                    self._upsert(conn, symbol, fields)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                with self.pending_lock:
+                    for symbol, fields in batch.items():
+                        self.pending[symbol] = {**fields, **self.pending.get(symbol, {})}
+                raise
+            return len(batch)
+
+    def save(self, snapshot_fn):
+        """整表替换为给定状态 (仅用于启动迁移 / 重置 / 退出)"""
+        with self.lock:
+            # 快照已包含队列中的最高价 (状态表先更新再入队), 先清空队列再取快照
+            with self.pending_lock:
+                self.pending = {}
+            state = snapshot_fn()
+            rows = [[symbol] + [data.get(col) for col in self.COLUMNS] for symbol, data in state.items()]
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM positions")
+                conn.executemany(
+                    f"INSERT INTO positions (symbol, {', '.join(self.COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)", rows)
+                # 整表写入后数据库即为状态来源, 旧 JSON 不再参与加载
+                conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def start(self, snapshot_fn):
+        self.thread = threading.Thread(target=self._run, name="Thread-StateWriter", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        with self.lock:
+            if self.conn is not None:
+                self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"状态落盘失败: {e}")
+
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] != "migrate":
+        print("用法: python state_store.py migrate trade_state.json trade_state.db")
+        sys.exit(1)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - [%(levelname)s] - %(message)s')
+    state = SqliteStore(sys.argv[3]).migrate_from_json(sys.argv[2])
+    print(json.dumps(state, indent=4, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
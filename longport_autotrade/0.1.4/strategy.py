@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+"""
+DXYZ 策略规则 (纯函数, 不下单 / 不读写状态)
+
+线程模式、asyncio 引擎和离线工具共用同一套规则, 保证决策一致。
+
+持仓时的卖出条件可预先换算为绝对价格 (sell_triggers): 入场价或最高价变化时算一次,
+普通报价只需与 (卖出触发价, 最高价] 区间比较一次; 创新高但未越过 next_high 时档位不变,
+raise_triggers 只按新最高价平移移动止盈价, 不再逐档匹配阶梯。
+"""
+
+# 动态阶梯移动止损: (最高浮盈阈值, 允许回撤), 按阈值从高到低匹配第一档
+DXYZ_TRAILING_LADDER = (
+    (0.20, 0.10),   # 超级行情: 最高浮盈 > 20%, 回撤 10% 止盈
+    (0.10, 0.06),   # 趋势确立: 最高浮盈 > 10%, 回撤 6% 止盈
+    (0.05, 0.03),   # [修改] 将原先的 0.03 改为 0.05，拉开梯度
+    (0.02, 0.015),  # [新增] 保本防线：只要盈利曾超过 2%，回撤 1.5% 就会强制止盈，保住 0.5% 的底线
+)
+
+# 触发价保护带 (相对值): 现价离卖出触发价这么近时仍按比例逐项判断, 避免浮点舍入与 dxyz_decide 结果不同
+TRIGGER_GUARD = 1e-9
+
+
+def normalize_ladder(ladder):
+    """校验阶梯表 [(最高浮盈阈值, 允许回撤), ...] 并按阈值从高到低排序"""
+    table = tuple(sorted(((float(threshold), float(limit)) for threshold, limit in ladder), reverse=True))
+    for threshold, limit in table:
+        if threshold < 0 or not 0 < limit < 1:
+            raise ValueError(f"阶梯档位无效: ({threshold}, {limit})")
+    return table
+
+
+def trailing_limit(max_pnl_pct, ladder=DXYZ_TRAILING_LADDER):
+    """根据最高浮盈返回当前允许的回撤比例, 未达任何一档返回 None"""
+    for threshold, limit in ladder:
+        if max_pnl_pct > threshold:
+            return limit
+    return None
+
+
+class SellTriggers:
+    """持仓的绝对触发价 (由 sell_triggers 计算, 入场价或最高价变化后需重算)"""
+    __slots__ = ("entry_price", "highest_price", "stop_price", "limit", "trail_price", "sell_below", "next_high",
+                 "quiet_low")
+
+    def __repr__(self):
+        return (f"SellTriggers(止损 {self.stop_price:.4f}, 移动止盈 {self.trail_price:.4f}, "
+                f"最高 {self.highest_price:.4f}, 阶梯上移 > {self.next_high:.4f})")
+
+
+def sell_triggers(entry_price, highest_price, stop_loss_pct, ladder=DXYZ_TRAILING_LADDER):
+    """
+    换算持仓的卖出触发价:
+      stop_price   硬止损价
+      limit        当前档位允许的回撤 (未达任何一档为 None)
+      trail_price  当前档位的移动止盈价 (未达任何一档为 0)
+      sell_below   二者较高者, 现价低于它即卖出
+      next_high    最高价超过该价即进入更高一档 (已在最高档为 inf)
+      quiet_low    sell_below 加保护带; 现价在 (quiet_low, highest_price] 内时无任何动作
+    """
+    triggers = SellTriggers()
+    triggers.entry_price = entry_price
+    triggers.highest_price = highest_price
+    triggers.stop_price = entry_price * (1 - stop_loss_pct)
+    max_pnl_pct = (highest_price - entry_price) / entry_price
+    triggers.limit = limit = trailing_limit(max_pnl_pct, ladder)
+    triggers.trail_price = highest_price * (1 - limit) if limit is not None else 0.0
+    triggers.sell_below = max(triggers.stop_price, triggers.trail_price)
+    higher = [threshold for threshold, _ in ladder if threshold >= max_pnl_pct]
+    triggers.next_high = entry_price * (1 + min(higher)) if higher else float("inf")
+    triggers.quiet_low = triggers.sell_below * (1 + TRIGGER_GUARD)
+    return triggers
+
+
+def raise_triggers(triggers, highest_price, stop_loss_pct, ladder=DXYZ_TRAILING_LADDER):
+    """
+    持仓创新高后的触发价: 新最高价低于 next_high (留保护带) 时档位不变, 只按新最高价重算移动止盈价;
+    越过 next_high 或接近档位边界时完整重算。结果与 sell_triggers(入场价, 新最高价) 相同。
+    """
+    if not highest_price < triggers.next_high * (1 - TRIGGER_GUARD):
+        return sell_triggers(triggers.entry_price, highest_price, stop_loss_pct, ladder)
+    raised = SellTriggers()
+    raised.entry_price = triggers.entry_price
+    raised.highest_price = highest_price
+    raised.stop_price = triggers.stop_price
+    raised.limit = limit = triggers.limit
+    raised.trail_price = highest_price * (1 - limit) if limit is not None else 0.0
+    raised.sell_below = max(raised.stop_price, raised.trail_price)
+    raised.next_high = triggers.next_high
+    raised.quiet_low = raised.sell_below * (1 + TRIGGER_GUARD)
+    return raised
+
+
+def sell_trigger_price(entry_price, highest_price, stop_loss_pct, ladder=DXYZ_TRAILING_LADDER):
+    """现价跌破该价格即触发卖出 (硬止损价与当前阶梯移动止盈价中较高者)"""
+    return sell_triggers(entry_price, highest_price, stop_loss_pct, ladder).sell_below
+
+
+def dxyz_poll_interval(quote, position, in_cooldown, stop_loss_pct, momentum_threshold,
+                       cadence, near_stop_pct, far_entry_pct, ladder=DXYZ_TRAILING_LADDER):
+    """
+    按标的状态给出轮询间隔 (秒), cadence = {"fast", "normal", "slow", "idle"}:
+      持仓且距卖出触发价 <= near_stop_pct  -> fast
+      冷却期                               -> idle
+      空仓且日涨幅距买入阈值 > far_entry_pct -> slow
+      其他                                 -> normal
+    """
+    current_price = float(quote.get('c', 0)) if quote else 0
+    if not current_price:
+        return cadence["normal"]
+
+    if position:
+        trigger = sell_trigger_price(position['entry_price'], max(position['highest_price'], current_price),
+                                     stop_loss_pct, ladder)
+        if (current_price - trigger) / current_price <= near_stop_pct:
+            return cadence["fast"]
+        return cadence["normal"]
+
+    if in_cooldown:
+        return cadence["idle"]
+
+    prev_close = float(quote.get('pc', 0))
+    day_change_pct = (current_price - prev_close) / prev_close if prev_close else 0
+    if momentum_threshold - day_change_pct > far_entry_pct:
+        return cadence["slow"]
+    return cadence["normal"]
+
+
+def dxyz_decide(current_price, prev_close, current_volume, position, in_cooldown,
+                stop_loss_pct, momentum_threshold, min_volume, ladder=DXYZ_TRAILING_LADDER, triggers=None):
+    """
+    对一次报价给出动作列表, 每项为 (动作, 参数):
+      ("raise_high", 新最高价)  持仓创新高, 需更新状态
+      ("sell", 原因)            触发硬止损或移动止盈
+      ("buy", 日涨幅)           触发买入信号
+      ("cooldown", None)        空仓但处于冷却期
+      ("low_volume", None)      价格达标但成交量不足
+    triggers 为该持仓的 sell_triggers() 结果时, 区间内的普通报价只做一次比较即返回
+    """
+    # --- 场景 A: 持有仓位 (监控卖出) ---
+    if position:
+        if triggers is not None and triggers.quiet_low < current_price <= triggers.highest_price:
+            return []
+        actions = []
+        entry_price = position['entry_price']
+        highest_price = position['highest_price']
+
+        if current_price > highest_price:
+            highest_price = current_price
+            actions.append(("raise_high", highest_price))
+
+        pnl_pct = (current_price - entry_price) / entry_price
+        max_pnl_pct = (highest_price - entry_price) / entry_price
+        drawdown_pct = (highest_price - current_price) / highest_price
+        current_trailing_limit = trailing_limit(max_pnl_pct, ladder)
+
+        if pnl_pct < -stop_loss_pct:
+            actions.append(("sell", f"触发硬止损 (当前 {pnl_pct:.2%})"))
+        elif current_trailing_limit is not None and drawdown_pct > current_trailing_limit:
+            actions.append(("sell", f"触发动态移动止盈 (最高浮盈 {max_pnl_pct:.2%}, 回撤 {drawdown_pct:.2%})"))
+        return actions
+
+    # --- 场景 B: 空仓 (监控买入) ---
+    if in_cooldown:
+        return [("cooldown", None)]
+
+    actions = []
+    day_change_pct = (current_price - prev_close) / prev_close if prev_close else 0
+    volume_ok = (current_volume > min_volume) or (current_volume == 0.0)
+    price_trend_ok = day_change_pct > momentum_threshold
+
+    if price_trend_ok and volume_ok:
+        actions.append(("buy", day_change_pct))
+    elif price_trend_ok and not volume_ok:
+        actions.append(("low_volume", None))
+    return actions
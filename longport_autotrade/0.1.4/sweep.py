@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+"""
+策略参数并行寻优 (网格 / 随机搜索)
+
+* 行情数据只加载一次, 放进 multiprocessing.shared_memory, 各子进程直接映射同一块内存,
+  任务只传参数组合, 不再按任务 pickle 整份数据
+* 每个组合调用 backtest.run_backtest (向量化), 进程池铺满全部 CPU 核心
+* 结果按盈亏 (或最大回撤 / 交易次数) 排序输出, 可另存 CSV
+
+用法:
+  python sweep.py --synthetic 98280 \\
+      --stop-loss 0.03,0.04,0.06,0.08 --slippage 0.005,0.01 --cooldown 10,30,60 \\
+      --min-volume 0,10000 --momentum 0.01,0.015,0.02 --ladder-scale 0.75,1,1.5 --trail-scale 0.75,1,1.5
+  python sweep.py --ticks ticks --symbol DXYZ.US --random 2000 ...   # 从网格中随机抽样 2000 组
+"""
+import os
+import csv
+import time
+import random
+import argparse
+import itertools
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+import backtest
+from strategy import DXYZ_TRAILING_LADDER
+
+COLUMNS = ("ts", "price", "prev_close", "volume")
+
+# 子进程内的数据视图 (由 init_worker 建立)
+_shm = None
+_data = None
+
+
+def init_worker(shm_name, n):
+    global _shm, _data
+    _shm = shared_memory.SharedMemory(name=shm_name)
+    block = np.ndarray((len(COLUMNS), n), dtype=np.float64, buffer=_shm.buf)
+    _data = dict(zip(COLUMNS, block))
+
+
+def run_one(task):
+    index, params = task
+    _, summary = backtest.run_backtest(_data["ts"], _data["price"], _data["prev_close"], _data["volume"], params)
+    return index, summary
+
+
+def scaled_ladder(ladder_scale, trail_scale):
+    """按比例缩放阶梯的盈利档位 (ladder_scale) 与允许回撤 (trail_scale)"""
+    return tuple((round(threshold * ladder_scale, 6), round(limit * trail_scale, 6))
+                 for threshold, limit in DXYZ_TRAILING_LADDER)
+
+
+def build_grid(args):
+    axes = {
+        "stop_loss_pct": args.stop_loss,
+        "slippage_pct": args.slippage,
+        "cooldown_minutes": args.cooldown,
+        "min_volume": args.min_volume,
+        "momentum_threshold": args.momentum,
+        "ladder_scale": args.ladder_scale,
+        "trail_scale": args.trail_scale,
+    }
+    names = list(axes)
+    combos = list(itertools.product(*(axes[name] for name in names)))
+    if args.random and args.random < len(combos):
+        combos = random.Random(args.seed).sample(combos, args.random)
+    grid = []
+    for combo in combos:
+        values = dict(zip(names, combo))
+        params = {key: value for key, value in values.items() if key not in ("ladder_scale", "trail_scale")}
+        params["ladder"] = scaled_ladder(values["ladder_scale"], values["trail_scale"])
+        grid.append((values, params))
+    return grid
+
+
+def float_list(text):
+    return [float(x) for x in text.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略参数并行寻优")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv")
+    source.add_argument("--ticks")
+    source.add_argument("--synthetic", type=int)
+    parser.add_argument("--symbol", default="DXYZ.US")
+    parser.add_argument("--bar-volume", action="store_true", help="volume 列为单根成交量, 需累加为当日成交量")
+
+    defaults = backtest.DEFAULT_PARAMS
+    parser.add_argument("--stop-loss", type=float_list, default=[defaults["stop_loss_pct"]])
+    parser.add_argument("--slippage", type=float_list, default=[defaults["slippage_pct"]])
+    parser.add_argument("--cooldown", type=float_list, default=[defaults["cooldown_minutes"]])
+    parser.add_argument("--min-volume", type=float_list, default=[defaults["min_volume"]])
+    parser.add_argument("--momentum", type=float_list, default=[defaults["momentum_threshold"]])
+    parser.add_argument("--ladder-scale", type=float_list, default=[1.0], help="阶梯盈利档位缩放")
+    parser.add_argument("--trail-scale", type=float_list, default=[1.0], help="阶梯允许回撤缩放")
+
+    parser.add_argument("--random", type=int, help="从网格中随机抽样的组合数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--sort", choices=["pnl", "max_drawdown", "trades"], default="pnl")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--out", help="全部结果另存为 CSV")
+    args = parser.parse_args()
+
+    if args.csv:
+        ts, price, prev_close, volume = backtest.load_csv(args.csv)
+    elif args.ticks:
+        ts, price, prev_close, volume = backtest.load_ticks(args.ticks, args.symbol)
+    else:
+        ts, price, volume = backtest.synthetic_minute_bars(args.synthetic)
+        prev_close = backtest.prev_close_from_days(ts, price)
+        args.bar_volume = True
+    if volume is None:
+        volume = np.zeros(len(price))
+    elif args.bar_volume:
+        volume = backtest.cumulative_day_volume(ts, volume)
+
+    grid = build_grid(args)
+    n = len(price)
+    print(f"数据: {n} 笔 | 参数组合: {len(grid)} | 进程数: {args.workers}")
+
+    shm = shared_memory.SharedMemory(create=True, size=len(COLUMNS) * n * 8)
+    try:
+        block = np.ndarray((len(COLUMNS), n), dtype=np.float64, buffer=shm.buf)
+        for row, column in zip(block, (ts, price, prev_close, volume)):
+            row[:] = column
+
+        started = time.perf_counter()
+        results = [None] * len(grid)
+        tasks = [(i, params) for i, (_, params) in enumerate(grid)]
+        chunksize = max(1, len(tasks) // (args.workers * 8))
+        with Pool(args.workers, initializer=init_worker, initargs=(shm.name, n)) as pool:
+            for index, summary in pool.imap_unordered(run_one, tasks, chunksize=chunksize):
+                results[index] = summary
+        elapsed = time.perf_counter() - started
+        del block
+    finally:
+        shm.close()
+        shm.unlink()
+
+    print(f"完成: {elapsed:.2f}s ({len(grid) / elapsed:.0f} 组/秒)\n")
+
+    rows = [dict(values, **summary) for (values, _), summary in zip(grid, results)]
+    reverse = args.sort in ("pnl", "trades")
+    rows.sort(key=lambda r: r[args.sort], reverse=reverse)
+
+    header = f"{'排名':>4} {'止损':>6} {'滑点':>6} {'冷却':>5} {'成交量':>7} {'动量':>6} {'档位':>5} {'回撤':>5} " \
+             f"{'盈亏':>9} {'最大回撤':>8} {'交易':>4} {'胜率':>6}"
+    print(header)
+    for rank, r in enumerate(rows[:args.top], 1):
+        print(f"{rank:>6} {r['stop_loss_pct']:>8.3f} {r['slippage_pct']:>8.3f} {r['cooldown_minutes']:>7.0f} "
+              f"{r['min_volume']:>10.0f} {r['momentum_threshold']:>8.3f} {r['ladder_scale']:>7.2f} "
+              f"{r['trail_scale']:>7.2f} {r['pnl']:>11.2f} {r['max_drawdown']:>12.2f} {r['trades']:>6} "
+              f"{r['win_rate']:>8.1%}")
+
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"\n全部结果已保存: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 0.1.4 下的模块按脚本同目录方式互相导入 (import market_data 等), 测试时同样加入搜索路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,32 @@
+import numpy as np
+
+import backtest
+
+
+def assert_same(got, expected):
+    (trades, summary), (ref_trades, ref_summary) = got, expected
+    assert summary == ref_summary
+    assert np.array_equal(trades[["entry_idx", "exit_idx", "reason"]], ref_trades[["entry_idx", "exit_idx", "reason"]])
+
+
+def test_zero_price_ticks_are_skipped():
+    price = np.array([10, 10.3, 10.3, 0, 10.3, 10.4, 10.2, 0, 10.5, 0.0])
+    ts = np.arange(len(price)) * 60.0
+    prev_close = np.full(len(price), 10.0)
+
+    trades, summary = backtest.run_backtest(ts, price, prev_close)
+    assert summary["stop_losses"] == 0
+    # 数据结束时按最后一笔有效价格估值, 下标指向原数组
+    assert list(trades[["entry_idx", "exit_idx"]][0]) == [1, 8]
+    assert trades["exit_price"][0] == 10.5
+    assert_same((trades, summary), backtest.run_reference(ts, price, prev_close))
+
+
+def test_vectorized_matches_reference_with_zero_prices():
+    ts, price, _ = backtest.synthetic_minute_bars(390 * 40)
+    prev_close = backtest.prev_close_from_days(ts, price)
+    rng = np.random.default_rng(3)
+    price[rng.choice(len(price), 200, replace=False)] = 0.0
+    got = backtest.run_backtest(ts, price, prev_close)
+    assert got[1]["trades"] > 5 and got[1]["stop_losses"] + got[1]["trailing_exits"] > 0
+    assert_same(got, backtest.run_reference(ts, price, prev_close))
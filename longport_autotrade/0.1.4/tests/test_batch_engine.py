@@ -0,0 +1,23 @@
+import time
+
+import batch_engine
+from batch_engine import BatchStrategyEngine, ReplayFeed, DEFAULT_PARAMS
+
+
+def test_batch_matches_per_symbol_decisions():
+    checked, mismatches, callbacks = batch_engine.replay_verify(60, 600, seed=11)
+    assert checked > 10000
+    assert callbacks > 0
+    assert mismatches == 0
+
+
+def test_cooldown_rows_are_reported_at_most_once_per_interval():
+    now = time.time()
+    state = {"A.US": {"quantity": 0, "cooldown_until": now + 3600}}
+    calls = []
+    engine = BatchStrategyEngine(ReplayFeed(), ["A.US"], lambda *args: calls.append(args[:2]),
+                                 lambda: 1, lambda: state, DEFAULT_PARAMS, cooldown_every=60)
+    for offset in (0, 10, 59, 61):
+        engine.on_quote("A.US", {"c": 10.0 + offset / 100, "pc": 9.0, "v": 0})
+        engine.run_once(now + offset)
+    assert calls == [("A.US", [("cooldown", None)])] * 2
@@ -0,0 +1,85 @@
+import time
+import socket
+import threading
+
+import pytest
+import requests
+
+from feed_server import MarketReplay, serve
+from http_transport import PooledSession
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def stub():
+    """本地 feed_server 替身: 返回 (MarketReplay, quote 接口地址)"""
+    replay = MarketReplay()
+    replay.seed("DXYZ", 26.5)
+    server = serve(replay, port=free_port())
+    server.handle_error = lambda request, client_address: None   # 客户端超时断开后服务端写入失败属预期
+    yield replay, f"http://127.0.0.1:{server.server_address[1]}/api/v1/quote?symbol=DXYZ"
+    server.shutdown()
+    server.server_close()
+
+
+def test_threads_share_a_bounded_pool(stub):
+    _, url = stub
+    session = PooledSession("test", pool_size=4, connect_timeout=1, read_timeout=2)
+    errors = []
+
+    def worker():
+        for _ in range(50):
+            try:
+                assert session.get(url).json()["c"] == 26.5
+            except Exception as e:
+                errors.append(e)
+
+    workers = [threading.Thread(target=worker) for _ in range(16)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    stats = session.stats()
+    assert errors == []
+    assert stats["calls"] == 800
+    assert 0 < stats["connections"] <= 4
+
+
+def test_read_timeout_is_enforced(stub):
+    replay, url = stub
+    replay.rest_delay = 2.0
+    session = PooledSession("test", pool_size=1, connect_timeout=1, read_timeout=0.3)
+    started = time.monotonic()
+    with pytest.raises(requests.ReadTimeout):
+        session.get(url)
+    assert time.monotonic() - started < 1.0
+    assert session.stats()["timeouts"] == 1
+
+
+def test_pool_wait_is_bounded(stub):
+    replay, url = stub
+    replay.rest_delay = 1.0
+    session = PooledSession("test", pool_size=1, connect_timeout=1, read_timeout=5, pool_timeout=0.2)
+    holder = threading.Thread(target=session.get, args=(url,))
+    holder.start()
+    time.sleep(0.2)                       # 唯一的连接被占用
+    started = time.monotonic()
+    with pytest.raises(requests.Timeout):
+        session.get(url)
+    assert time.monotonic() - started < 0.8
+    holder.join()
+    assert session.stats()["timeouts"] == 1
+
+
+def test_connection_refused_fails_fast():
+    session = PooledSession("test", pool_size=1, connect_timeout=1, read_timeout=5)
+    started = time.monotonic()
+    with pytest.raises(requests.ConnectionError):
+        session.get(f"http://127.0.0.1:{free_port()}/api/v1/quote?symbol=DXYZ")
+    assert time.monotonic() - started < 1.0
+    assert session.stats()["errors"] == 1
@@ -0,0 +1,61 @@
+import time
+import asyncio
+import threading
+
+from rate_limiter import RateLimiter, PRIORITY_HIGH, PRIORITY_NORMAL
+
+
+def test_cancelled_async_waiter_releases_its_slot():
+    limiter = RateLimiter("test", rate=20, per=1, burst=1)
+    assert limiter.acquire(timeout=1)            # 取走唯一的令牌, 下一个等待者排在队首
+
+    async def scenario():
+        head = asyncio.ensure_future(limiter.acquire_async(PRIORITY_HIGH))
+        await asyncio.sleep(0.01)
+        head.cancel()
+        try:
+            await head
+        except asyncio.CancelledError:
+            pass
+        return await limiter.acquire_async(PRIORITY_NORMAL, timeout=1)
+
+    assert asyncio.run(scenario())
+    assert limiter.stats()["queued"] == 0
+
+
+def test_cancelled_async_waiter_does_not_block_threads():
+    limiter = RateLimiter("test", rate=20, per=1, burst=1)
+    assert limiter.acquire(timeout=1)
+
+    async def cancel_head():
+        head = asyncio.ensure_future(limiter.acquire_async(PRIORITY_HIGH))
+        await asyncio.sleep(0.01)
+        head.cancel()
+        await asyncio.gather(head, return_exceptions=True)
+
+    asyncio.run(cancel_head())
+    results = []
+    worker = threading.Thread(target=lambda: results.append(limiter.acquire(PRIORITY_NORMAL, timeout=1)))
+    worker.start()
+    worker.join(timeout=2)
+    assert results == [True]
+
+
+def test_async_acquire_respects_rate():
+    limiter = RateLimiter("test", rate=20, per=1, burst=1)
+
+    async def take(n):
+        return [await limiter.acquire_async(timeout=2) for _ in range(n)]
+
+    started = time.monotonic()
+    assert all(asyncio.run(take(5)))
+    # 1 个初始令牌 + 4 个按 20/s 补充
+    assert time.monotonic() - started >= 4 / 20 * 0.9
+    assert limiter.stats()["throttled"] == 4
+
+
+def test_async_acquire_times_out():
+    limiter = RateLimiter("test", rate=1, per=60, burst=1)
+    assert limiter.acquire(timeout=1)
+    assert asyncio.run(limiter.acquire_async(timeout=0.05)) is False
+    assert limiter.stats() == {"granted": 1, "throttled": 0, "dropped": 1, "queued": 0, "tokens": 0.0}